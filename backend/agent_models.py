@@ -0,0 +1,324 @@
+import math
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np
+
+from fitting import DEFAULT_GRID, DEFAULT_START, DEFAULT_TEMPERATURE_GRID
+from simulation import BatchSimulator, BatchTrajectories, _BeliefState, _first_deck_values
+
+# --- MODELE AGENTÓW (rejestr) ---
+#
+# Model wyboru talii opisują trzy operacje na stanie N wierszy: stan początkowy, wartości
+# talii (logity softmax) i aktualizacja po wyniku wybranej talii. Z tego samego opisu
+# liczymy symulację i log-wiarygodność prawdziwych wyborów badanego. Pętla idzie po próbach,
+# a każdy krok to jedna operacja na wszystkich wierszach (badani x kandydaci parametrów).
+# Parametry to tablice (N,), więc dopasowanie sprawdza wiele wartości naraz.
+#
+# Wejście jak w metrics.py: próby ułożone od lewej, talie 0..3 = A..D, 4 = nieznana
+# (taką próbę pomijamy - nie wiemy, którą talię wybrano).
+
+OUTCOME_SCALE = 100.0  # modele uczenia liczą wyniki w setkach $ (jak Ahn i in. 2008)
+
+class AgentModel(ABC):
+    name = ""
+    description = ""
+    defaults: Dict[str, float] = {}
+    bounds: Dict[str, Tuple[float, float]] = {}  # dopuszczalne wartości parametrów (domknięte przedziały)
+    grid: Dict[str, List[float]] = {}  # wartości sprawdzane przy dopasowaniu (oś po osi)
+    options: Tuple[str, ...] = ()      # ustawienia modelu spoza parametrów (np. horyzont MPC)
+
+    @property
+    def n_params(self) -> int:
+        return len(self.defaults)
+
+    def parameters(self, values: Optional[Dict[str, float]], n: int) -> Dict[str, np.ndarray]:
+        """Parametry jako tablice (n,); brakujące - wartości domyślne."""
+        values = values or {}
+        unknown = [name for name in values if name not in self.defaults]
+        if unknown:
+            raise ValueError(f"Model {self.name} nie ma parametrów: {', '.join(unknown)}")
+        for name, value in values.items():
+            low, high = self.bounds.get(name, (-math.inf, math.inf))
+            if not low <= value <= high:
+                raise ValueError(f"Parametr {name} modelu {self.name} musi być w przedziale [{low}, {high}]")
+        return {
+            name: np.broadcast_to(np.asarray(values.get(name, default), dtype=float), (n,)).copy()
+            for name, default in self.defaults.items()
+        }
+
+    @abstractmethod
+    def init_state(self, params: Dict[str, np.ndarray], n: int): ...
+
+    @abstractmethod
+    def logits(self, state, params: Dict[str, np.ndarray], rows: np.ndarray, t: int) -> np.ndarray:
+        """(len(rows), 4) - P(talia) = softmax(logity)."""
+
+    @abstractmethod
+    def update(self, state, params: Dict[str, np.ndarray], rows: np.ndarray, deck, win, loss, t: int): ...
+
+    def log_likelihood(self, params: Dict[str, np.ndarray], decks, wins, losses, lengths) -> np.ndarray:
+        """log P(wybór badanego) w każdej próbie (wiersze x próby); 0 poza `lengths` i dla talii "?".
+
+        Pierwszej próby nie oceniamy (jak w fitting.py) - model nie ma jeszcze żadnej obserwacji.
+        """
+        n, width = decks.shape
+        state = self.init_state(params, n)
+        scores = np.zeros((n, width))
+        for t in range(width):
+            rows = np.flatnonzero((lengths > t) & (decks[:, t] < 4))
+            if not len(rows):
+                continue
+            deck = decks[rows, t]
+            if t > 0:
+                logits = self.logits(state, params, rows, t)
+                logits = logits - logits.max(axis=1, keepdims=True)
+                scores[rows, t] = logits[np.arange(len(rows)), deck] - np.log(np.exp(logits).sum(axis=1))
+            self.update(state, params, rows, deck, wins[rows, t], losses[rows, t], t)
+        return scores
+
+    def simulate(
+        self, decks: np.ndarray, n_trials: np.ndarray, first_actions: np.ndarray,
+        params: Dict[str, np.ndarray], rng: Optional[np.random.Generator] = None,
+    ) -> BatchTrajectories:
+        """Przebiegi na taliach (N, 4, MAX_TRIALS, 2) jak w BatchSimulator: pierwszy ruch od człowieka,
+        dalej talia o najwyższej wartości albo (z `rng`) losowana z softmax."""
+        n = len(decks)
+        n_trials = np.asarray(n_trials, dtype=int)
+        width = int(n_trials.max(initial=0))
+        actions = np.full((n, width), -1, dtype=np.int8)
+        gains = np.zeros((n, width), dtype=np.int64)
+        losses = np.zeros((n, width), dtype=np.int64)
+        counters = np.zeros((n, 4), dtype=int)
+        state = self.init_state(params, n)
+
+        for t in range(width):
+            rows = np.flatnonzero(n_trials > t)
+            if t == 0:
+                action = np.asarray(first_actions, dtype=int)[rows]
+            else:
+                action = _choose(self.logits(state, params, rows, t), rng)
+            idx = counters[rows, action]
+            idx = np.where(idx >= decks.shape[2], 0, idx)
+            counters[rows, action] += 1
+            card = decks[rows, action, idx].astype(np.int64)
+            self.update(state, params, rows, action, card[:, 0], card[:, 1], t)
+            actions[rows, t] = action
+            gains[rows, t] = card[:, 0]
+            losses[rows, t] = card[:, 1]
+        return BatchTrajectories(actions, gains, losses, n_trials)
+
+def _choose(logits: np.ndarray, rng: Optional[np.random.Generator]) -> np.ndarray:
+    if rng is None:
+        return np.argmax(logits, axis=1)
+    probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+    cumulative = np.cumsum(probs, axis=1)
+    draws = rng.random((len(logits), 1)) * cumulative[:, -1:]
+    return np.minimum((cumulative < draws).sum(axis=1), 3)
+
+MODELS: Dict[str, Type[AgentModel]] = {}
+
+def register_model(cls: Type[AgentModel]) -> Type[AgentModel]:
+    MODELS[cls.name] = cls
+    return cls
+
+def create_model(name: str, **options) -> AgentModel:
+    """Model z rejestru; ustawienia, których model nie zna, są pomijane."""
+    if name not in MODELS:
+        raise KeyError(name)
+    cls = MODELS[name]
+    return cls(**{key: value for key, value in options.items() if key in cls.options})
+
+# --- MODELE UCZENIA (reguła delta) ---
+
+class _DeltaLearner(AgentModel):
+    """Oczekiwane wartości talii uaktualniane regułą delta: ev += learning_rate * (u - ev)."""
+
+    def init_state(self, params, n):
+        return {"ev": np.zeros((n, 4))}
+
+    @abstractmethod
+    def utility(self, params, rows, win, loss) -> np.ndarray:
+        """Użyteczność wyniku (wygrana i strata w setkach $, strata dodatnia)."""
+
+    def update(self, state, params, rows, deck, win, loss, t):
+        u = self.utility(params, rows, win / OUTCOME_SCALE, np.abs(loss) / OUTCOME_SCALE)
+        ev = state["ev"]
+        ev[rows, deck] += params["learning_rate"][rows] * (u - ev[rows, deck])
+
+    def values(self, state, params, rows) -> np.ndarray:
+        return state["ev"][rows]
+
+    def sensitivity(self, params, rows, t: int) -> np.ndarray:
+        # Stała w czasie: 3^c - 1 (PVL, VPP)
+        return 3.0 ** params["consistency"][rows] - 1
+
+    def logits(self, state, params, rows, t):
+        return self.sensitivity(params, rows, t)[:, None] * self.values(state, params, rows)
+
+@register_model
+class EVModel(_DeltaLearner):
+    name = "ev"
+    description = "Expectancy-Valence (Busemeyer i Stout 2002)"
+    defaults = {"attention": 0.5, "learning_rate": 0.2, "consistency": 0.5}
+    bounds = {"attention": (0.0, 1.0), "learning_rate": (0.0, 1.0), "consistency": (-5.0, 5.0)}
+    grid = {
+        "attention": [0.0, 0.1, 0.3, 0.5, 0.7, 0.9, 1.0],       # waga strat względem wygranych
+        "learning_rate": [0.02, 0.05, 0.1, 0.2, 0.4, 0.7, 1.0],
+        "consistency": [-2.0, -1.0, -0.5, 0.0, 0.5, 1.0, 2.0],  # wzrost (c > 0) albo spadek determinizmu
+    }
+
+    def utility(self, params, rows, win, loss):
+        w = params["attention"][rows]
+        return (1 - w) * win - w * loss
+
+    def sensitivity(self, params, rows, t):
+        return ((t + 1) / 10.0) ** params["consistency"][rows]
+
+def _prospect_utility(params, rows, win, loss) -> np.ndarray:
+    # Funkcja wartości z teorii perspektywy dla wyniku netto
+    net = win - loss
+    magnitude = np.abs(net) ** params["shape"][rows]
+    return np.where(net >= 0, magnitude, -params["loss_aversion"][rows] * magnitude)
+
+@register_model
+class PVLDeltaModel(_DeltaLearner):
+    name = "pvl_delta"
+    description = "Prospect Valence Learning z regułą delta (Ahn i in. 2008)"
+    defaults = {"shape": 0.5, "loss_aversion": 1.0, "learning_rate": 0.2, "consistency": 1.0}
+    bounds = {"shape": (0.0, 1.0), "loss_aversion": (0.0, 10.0), "learning_rate": (0.0, 1.0), "consistency": (0.0, 5.0)}
+    grid = {
+        "shape": [0.1, 0.3, 0.5, 0.7, 0.9],
+        "loss_aversion": [0.1, 0.5, 1.0, 2.0, 3.0, 5.0],
+        "learning_rate": [0.02, 0.05, 0.1, 0.2, 0.4, 0.7, 1.0],
+        "consistency": [0.1, 0.5, 1.0, 1.5, 2.0, 3.0, 5.0],
+    }
+
+    def utility(self, params, rows, win, loss):
+        return _prospect_utility(params, rows, win, loss)
+
+@register_model
+class VPPModel(_DeltaLearner):
+    name = "vpp"
+    description = "Value-Plus-Perseverance (Worthy i in. 2013)"
+    defaults = {
+        **PVLDeltaModel.defaults,
+        # Domyślnie perseweracja ma udział w wyborze (ev_weight = 1 sprowadza VPP do PVL-Delta)
+        "gain_impact": 0.5, "loss_impact": -0.5, "decay": 0.5, "ev_weight": 0.5,
+    }
+    bounds = {
+        **PVLDeltaModel.bounds,
+        "gain_impact": (-5.0, 5.0), "loss_impact": (-5.0, 5.0), "decay": (0.0, 1.0), "ev_weight": (0.0, 1.0),
+    }
+    grid = {
+        **PVLDeltaModel.grid,
+        "gain_impact": [-1.0, -0.5, 0.0, 0.5, 1.0, 2.0],  # skłonność do powtórzenia talii po zysku
+        "loss_impact": [-1.0, -0.5, 0.0, 0.5, 1.0, 2.0],  # ... i po stracie
+        "decay": [0.0, 0.25, 0.5, 0.75, 0.95],
+        "ev_weight": [0.0, 0.25, 0.5, 0.75, 1.0],          # wartość vs perseweracja
+    }
+
+    def init_state(self, params, n):
+        return {"ev": np.zeros((n, 4)), "perseverance": np.zeros((n, 4))}
+
+    def utility(self, params, rows, win, loss):
+        return _prospect_utility(params, rows, win, loss)
+
+    def update(self, state, params, rows, deck, win, loss, t):
+        super().update(state, params, rows, deck, win, loss, t)
+        perseverance = state["perseverance"]
+        perseverance[rows] *= params["decay"][rows, None]
+        impact = np.where(win + loss >= 0, params["gain_impact"][rows], params["loss_impact"][rows])
+        perseverance[rows, deck] += impact
+
+    def values(self, state, params, rows):
+        w = params["ev_weight"][rows, None]
+        return w * state["ev"][rows] + (1 - w) * state["perseverance"][rows]
+
+# --- AGENT MPC ---
+
+@register_model
+class MPCModel(AgentModel):
+    """StochasticMPCAgent(strategy="human"): P(talia) = softmax(beta * wartość najlepszej ścieżki od talii).
+
+    Symulacja bez `rng` to deterministyczny planer (jak /analysis/compare).
+    """
+    name = "mpc"
+    description = "Agent MPC (planowanie na `planning_horizon` ruchów z wartością informacji)"
+    defaults = dict(DEFAULT_START)
+    bounds = {
+        "loss_aversion": (0.0, math.inf), "learning_rate": (0.0, 1.0), "info_value_weight": (0.0, math.inf),
+        "inverse_temperature": (0.0, math.inf),
+    }
+    grid = {**DEFAULT_GRID, "inverse_temperature": DEFAULT_TEMPERATURE_GRID}
+    options = ("planning_horizon",)
+
+    def __init__(self, planning_horizon: int = 2):
+        self.planning_horizon = planning_horizon
+
+    def init_state(self, params, n):
+        return _BeliefState(
+            (n,), "human", loss_aversion=params["loss_aversion"], learning_rate=params["learning_rate"],
+            info_value_weight=params["info_value_weight"],
+        )
+
+    def logits(self, state, params, rows, t):
+        values = _first_deck_values(
+            state.means[rows], state.variances[rows], state.counts[rows], state.info_value_weight[rows],
+            self.planning_horizon,
+        )
+        return params["inverse_temperature"][rows, None] * values
+
+    def update(self, state, params, rows, deck, win, loss, t):
+        state._observe((rows,), deck, win + loss)
+
+    def simulate(self, decks, n_trials, first_actions, params, rng=None):
+        simulator = BatchSimulator(
+            decks, n_trials=n_trials, first_actions=first_actions, strategy="human",
+            planning_horizon=self.planning_horizon, loss_aversion=params["loss_aversion"],
+            learning_rate=params["learning_rate"], info_value_weight=params["info_value_weight"],
+            inverse_temperature=params["inverse_temperature"] if rng is not None else None, rng=rng,
+        )
+        return simulator.run()
+
+# --- DOPASOWANIE I KRYTERIA INFORMACYJNE ---
+
+def fit_maximum_likelihood(
+    model: AgentModel, decks: np.ndarray, wins: np.ndarray, losses: np.ndarray, lengths: np.ndarray,
+    max_rounds: int = 3,
+) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """Parametry maksymalizujące log-wiarygodność każdego badanego: przeszukiwanie po współrzędnych
+    siatki `model.grid`, wszyscy badani i wszystkie wartości osi w jednym przebiegu (badani x wartości).
+
+    Zwraca (parametry (S,), log-wiarygodność (S,)).
+    """
+    n = len(decks)
+    current = model.parameters(None, n)
+    best = model.log_likelihood(current, decks, wins, losses, lengths).sum(axis=1)
+    for _ in range(max_rounds):
+        improved = False
+        for name, values in model.grid.items():
+            values = np.asarray(values, dtype=float)
+            size = len(values)
+            candidates = {key: np.repeat(value, size) for key, value in current.items()}
+            candidates[name] = np.tile(values, n)
+            scores = model.log_likelihood(
+                candidates, np.repeat(decks, size, axis=0), np.repeat(wins, size, axis=0),
+                np.repeat(losses, size, axis=0), np.repeat(lengths, size),
+            ).sum(axis=1).reshape(n, size)
+            pick = scores.argmax(axis=1)
+            score = scores[np.arange(n), pick]
+            better = score > best + 1e-9
+            current[name] = np.where(better, values[pick], current[name])
+            best = np.where(better, score, best)
+            improved = improved or bool(better.any())
+        if not improved:
+            break
+    return current, best
+
+def information_criteria(log_likelihood: np.ndarray, n_params: int, n_observations: np.ndarray) -> Dict[str, np.ndarray]:
+    """AIC = 2k - 2 lnL, BIC = k ln(n) - 2 lnL (n = liczba ocenionych wyborów)."""
+    return {
+        "aic": 2 * n_params - 2 * log_likelihood,
+        "bic": n_params * np.log(np.maximum(n_observations, 1)) - 2 * log_likelihood,
+    }
@@ -0,0 +1,124 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+# --- PULA PROCESÓW DLA ANALIZ (poza pętlą zdarzeń) ---
+
+class QueueFullError(Exception):
+    """Zbyt wiele analiz czeka lub trwa - klient powinien spróbować później (HTTP 429)."""
+
+class PoolBrokenError(Exception):
+    """Proces puli padł w trakcie zadania także po odtworzeniu puli (HTTP 503)."""
+
+class AnalysisPool:
+    """Pula procesów dla obliczeń CPU z ograniczoną kolejką i limitem czasu.
+
+    `workers=0` uruchamia zadania w jednym wątku (tryb deweloperski, bez procesów potomnych).
+    Slot w kolejce zwalniamy dopiero, gdy zadanie faktycznie się skończy - także po
+    przekroczeniu czasu - więc `pending` odpowiada rzeczywistemu obciążeniu puli.
+    Gdy proces potomny padnie (np. zabity przez OOM), ProcessPoolExecutor odrzuca już każde
+    zadanie - wtedy zastępujemy go nową pulą, a przerwane zadanie ponawiamy raz.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_pending: int,
+        timeout: Optional[float],
+        initializer: Optional[Callable[[], None]] = None,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.initializer = initializer
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.restarts = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self):
+        with self._lock:
+            if self._executor is not None:
+                return
+            if self.workers > 0:
+                # spawn zamiast fork - serwer ma już wątki (pętla zdarzeń, cache)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=self.initializer,
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Zadanie w tle bez limitu kolejki (np. rozgrzewanie cache)."""
+        return self._submit(fn, *args)[1]
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """Wykonuje `fn(*args)` w puli; QueueFullError przy pełnej kolejce, TimeoutError po czasie,
+        PoolBrokenError, gdy zadanie przerwała awaria procesu dwa razy z rzędu."""
+        limit = timeout or self.timeout
+        deadline = None if limit is None else time.monotonic() + limit
+        for attempt in range(2):
+            # Ponowienie zajmuje slot zwolniony przez przerwane zadanie - bez sprawdzania limitu
+            executor, future = self._submit_pending(fn, *args, check_limit=attempt == 0)
+            try:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                return await asyncio.wait_for(asyncio.wrap_future(future), remaining)
+            except asyncio.TimeoutError:
+                future.cancel()
+                raise
+            except BrokenExecutor:
+                self._replace(executor)
+        raise PoolBrokenError()
+
+    def _submit_pending(self, fn: Callable, *args, check_limit: bool) -> Tuple[Executor, Future]:
+        with self._lock:
+            if check_limit and self._pending >= self.max_pending:
+                raise QueueFullError()
+            self._pending += 1
+        try:
+            executor, future = self._submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return executor, future
+
+    def _submit(self, fn: Callable, *args) -> Tuple[Executor, Future]:
+        for attempt in range(2):
+            self.start()
+            executor = self._executor
+            try:
+                return executor, executor.submit(fn, *args)
+            except BrokenExecutor:
+                if attempt:
+                    raise
+                self._replace(executor)
+
+    def _replace(self, broken: Executor):
+        # Kilka zadań z tej samej puli zgłosi awarię naraz - nową pulę tworzy tylko pierwsze
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = None
+            self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
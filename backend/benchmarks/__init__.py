@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Moduły backendu są płaskie (main, simulation, ...) - benchmarki działają także po zmianie katalogu roboczego
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
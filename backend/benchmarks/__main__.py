@@ -0,0 +1,114 @@
+"""Benchmarki backendu IGT.
+
+Uruchamianie z katalogu backend/:
+
+    python -m benchmarks                          # micro + e2e, wynik w benchmark-results.json
+    python -m benchmarks --suite micro --subjects 10000
+    python -m benchmarks --suite e2e --requests 500 --concurrency 16
+    python -m benchmarks --compare poprzedni.json # porównanie z wynikiem innego commita
+    python -m benchmarks generate dane.txt --subjects 100000   # sam plik syntetyczny
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmarks import BACKEND_DIR
+from benchmarks.synthetic import write_long_format
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def _metric(result: dict):
+    # Mikrobenchmarki: mediana czasu wywołania, e2e: mediana opóźnienia
+    return result.get("median_s", result.get("p50_s"))
+
+def _regressions(results: dict) -> list:
+    # Wyniki z kluczem "reference" muszą być co najmniej tak szybkie jak wskazany wynik referencyjny
+    return [
+        name for name, result in results.items()
+        if "reference" in result and result["median_s"] > results[result["reference"]]["median_s"]
+    ]
+
+def _print_results(results: dict, baseline: dict = None):
+    for name, result in results.items():
+        value = _metric(result)
+        line = f"{name:40s} {value * 1e3:12.3f} ms" if value is not None else f"{name:40s} {'-':>12s}"
+        if "throughput_rps" in result and result["throughput_rps"]:
+            line += f" {result['throughput_rps']:10.1f} req/s"
+        old = _metric(baseline.get(name, {})) if baseline else None
+        if old and value:
+            line += f"   x{old / value:.2f} vs baseline"
+        if "reference" in result:
+            line += f"   x{_metric(results[result['reference']]) / value:.2f} vs reference"
+        print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("command", nargs="?", choices=["run", "generate"], default="run")
+    parser.add_argument("path", nargs="?", help="plik wyjściowy dla `generate`")
+    parser.add_argument("--suite", choices=["micro", "e2e", "all"], default="all")
+    parser.add_argument("--subjects", type=int, default=1000)
+    parser.add_argument("--trials", type=int, default=150)
+    parser.add_argument("--min-trials", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--analysis-workers", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="wcześniejszy plik JSON do porównania")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        if not args.path:
+            parser.error("generate wymaga ścieżki pliku")
+        rows = write_long_format(args.path, args.subjects, args.trials, args.min_trials, args.seed)
+        print(f"Zapisano {rows} wierszy ({args.subjects} badanych) do {args.path}")
+        return
+
+    results = {}
+    if args.suite in ("micro", "all"):
+        from benchmarks.micro import run_micro
+        results.update(run_micro(args.subjects, args.trials, args.repeat, args.seed))
+    if args.suite in ("e2e", "all"):
+        from benchmarks.e2e import run_e2e
+        results.update(run_e2e(
+            args.subjects, args.trials, args.requests, args.concurrency,
+            args.games, args.analysis_workers, args.seed,
+        ))
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("command", "path", "output", "compare")},
+        "results": results,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    _print_results(results, baseline)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wyniki zapisane do {args.output}")
+    regressions = _regressions(results)
+    if regressions:
+        print("Regresja względem implementacji referencyjnej: " + ", ".join(regressions))
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.synthetic import write_long_format
+from benchmarks.timing import latency_summary
+
+# --- BENCHMARKI END-TO-END (serwer uvicorn w tym samym procesie, klient urllib) ---
+
+def _request(url: str, payload: Optional[dict] = None, timeout: float = 120) -> dict:
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class LocalServer:
+    """Serwer aplikacji na syntetycznych danych w katalogu tymczasowym (kontekst `with`)."""
+
+    def __init__(self, n_subjects: int, trials: int = 150, analysis_workers: int = 2, seed: int = 0):
+        self.n_subjects = n_subjects
+        self.trials = trials
+        self.analysis_workers = analysis_workers
+        self.seed = seed
+        self.url = None
+
+    def __enter__(self) -> "LocalServer":
+        import uvicorn
+        import main
+
+        self._cwd = os.getcwd()
+        self._workdir = tempfile.mkdtemp(prefix="igt_bench_")
+        write_long_format(os.path.join(self._workdir, "cannabis_raw.txt"), self.n_subjects, self.trials, seed=self.seed)
+        # Workery puli (spawn) dziedziczą katalog roboczy - wczytają te same dane
+        os.chdir(self._workdir)
+        main.DATASET_CACHE_DIR = os.path.join(self._workdir, "cache")
+        main.DATA_STORE["choices"] = None
+        main.RESULT_CACHE.clear()
+        main.ANALYSIS_POOL.workers = self.analysis_workers
+
+        port = _free_port()
+        self.url = f"http://127.0.0.1:{port}"
+        self._server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        self._wait_ready()
+        return self
+
+    def _wait_ready(self, timeout: float = 600):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                _request(f"{self.url}/health/ready", timeout=5)
+                return
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.2)
+        raise RuntimeError("Serwer nie jest gotowy")
+
+    def __exit__(self, *exc):
+        self._server.should_exit = True
+        self._thread.join()
+        os.chdir(self._cwd)
+        shutil.rmtree(self._workdir, ignore_errors=True)
+
+def _load(tasks: List[Callable[[], None]], concurrency: int) -> dict:
+    """Wykonuje zadania (każde = jedno żądanie) w `concurrency` wątkach klienta."""
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def timed(task):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            task()
+        except (urllib.error.URLError, ConnectionError):
+            with lock:
+                errors += 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(timed, tasks))
+    return latency_summary(latencies, time.perf_counter() - start, errors)
+
+def run_e2e(
+    n_subjects: int = 1000, trials: int = 150, requests: int = 200, concurrency: int = 8,
+    games: int = 20, analysis_workers: int = 2, seed: int = 0,
+) -> Dict[str, dict]:
+    results = {}
+    with LocalServer(n_subjects, trials, analysis_workers, seed) as server:
+        indices = [i % n_subjects for i in range(requests)]
+        compare = [lambda i=i: _request(f"{server.url}/analysis/compare/{i}") for i in indices]
+        # Pierwszy przebieg liczy porównania, drugi trafia w cache wyników
+        results[f"compare.cold.c{concurrency}"] = _load(compare, concurrency)
+        results[f"compare.cached.c{concurrency}"] = _load(compare, concurrency)
+
+        sessions = [_request(f"{server.url}/game/start", {})["session_id"] for _ in range(games)]
+        # Każda sesja dostaje dokładnie 100 ruchów (pełna gra), sesje grają równolegle
+        choose = [
+            lambda sid=sid, deck="ABCD"[turn % 4]: _request(f"{server.url}/game/choose", {"session_id": sid, "deck_id": deck})
+            for turn in range(100) for sid in sessions
+        ]
+        results[f"game.choose.c{min(concurrency, games)}"] = _load(choose, min(concurrency, games))
+    return results
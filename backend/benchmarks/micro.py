@@ -0,0 +1,157 @@
+import os
+import shutil
+import tempfile
+from typing import Dict
+
+import numpy as np
+
+from benchmarks.synthetic import generate_trials, write_long_format
+from benchmarks.timing import measure
+from metrics import similarity_metrics
+from simulation import (
+    BatchSimulator,
+    StochasticMPCAgent,
+    _BeliefState,
+    _plan_first_deck,
+    _reconstruct_environment_from_human,
+    build_replay_decks,
+)
+
+# --- MIKROBENCHMARKI (planer, aktualizacje, rekonstrukcja, metryki, ładowanie danych) ---
+
+PLANNER_HORIZONS = (1, 2, 3, 5, 8)
+ENUMERATE_HORIZONS = (2, 3)
+
+def _trained_agent(data: Dict[str, np.ndarray], horizon: int, planner: str = "counts") -> StochasticMPCAgent:
+    # Przekonania po 50 próbach - planer nie startuje z samych priorów
+    agent = StochasticMPCAgent(strategy="human", planning_horizon=horizon, planner=planner)
+    for c, w, l in zip(data["choices"][0, :50], data["wins"][0, :50], data["losses"][0, :50]):
+        agent.update_model("ABCD"[c - 1], int(w) + int(l))
+    return agent
+
+def _batch_beliefs(n: int, data: Dict[str, np.ndarray]) -> _BeliefState:
+    beliefs = _BeliefState(
+        (n,), "human", loss_aversion=np.full(n, 4.9), learning_rate=np.full(n, 0.3), info_value_weight=np.full(n, 0.8)
+    )
+    rows = np.arange(n)
+    for t in range(50):
+        beliefs._observe((rows,), data["choices"][:n, t] - 1, data["wins"][:n, t] + data["losses"][:n, t])
+    return beliefs
+
+class _ReferenceHumanUpdates:
+    """update_model agenta "human" sprzed statystyk bieżących (historia + np.var okna) - punkt odniesienia."""
+
+    def __init__(self, loss_aversion: float = 4.9, learning_rate: float = 0.3):
+        self.loss_aversion = loss_aversion
+        self.learning_rate = learning_rate
+        self.means = np.zeros(4)
+        self.variances = np.ones(4) * 1000
+        self.counts = np.zeros(4)
+        self.history = {deck: [] for deck in "ABCD"}
+
+    def update_model(self, deck_id, net_result):
+        idx = "ABCD".index(deck_id)
+        self.counts[idx] += 1
+        gain = 100 if deck_id in ["A", "B"] else 50
+        utility = gain - ((gain - net_result) * self.loss_aversion)
+        self.history[deck_id].append(utility)
+        old_mean = self.means[idx]
+        self.means[idx] = old_mean + self.learning_rate * (utility - old_mean)
+        window = self.history[deck_id][-20:]
+        self.variances[idx] = np.var(window, ddof=1) if len(window) > 1 else 1000
+
+def run_micro(n_subjects: int = 1000, trials: int = 150, repeat: int = 5, seed: int = 0) -> Dict[str, dict]:
+    data = generate_trials(n_subjects, trials, seed=seed)
+    results = {}
+
+    for horizon in PLANNER_HORIZONS:
+        agent = _trained_agent(data, horizon)
+        results[f"planner.counts.h{horizon}"] = measure(agent.select_action, repeat)
+    for horizon in ENUMERATE_HORIZONS:
+        agent = _trained_agent(data, horizon, "enumerate")
+        results[f"planner.enumerate.h{horizon}"] = measure(agent.select_action, repeat)
+
+    beliefs = _batch_beliefs(n_subjects, data)
+    for horizon in (2, 3, 5):
+        results[f"planner.batch.h{horizon}.n{n_subjects}"] = measure(lambda: _plan_first_deck(
+            beliefs.means, beliefs.variances, beliefs.counts, beliefs.info_value_weight, horizon
+        ), repeat)
+
+    c_row, w_row, l_row = data["choices"][0], data["wins"][0], data["losses"][0]
+    moves = ["ABCD"[c - 1] for c in c_row]
+    nets = (w_row + l_row).tolist()
+
+    def agent_updates():
+        agent = StochasticMPCAgent(strategy="human")
+        for move, net in zip(moves, nets):
+            agent.update_model(move, net)
+
+    def reference_updates():
+        agent = _ReferenceHumanUpdates()
+        for move, net in zip(moves, nets):
+            agent.update_model(move, net)
+
+    # Ścieżka "human" agenta nie może być wolniejsza od implementacji referencyjnej (patrz __main__)
+    reference_name = f"agent.update_model.reference.x{trials}"
+    results[reference_name] = measure(reference_updates, repeat)
+    results[f"agent.update_model.x{trials}"] = {**measure(agent_updates, repeat), "reference": reference_name}
+    rows = np.arange(n_subjects)
+    deck_idx = data["choices"][:, 60] - 1
+    net = data["wins"][:, 60] + data["losses"][:, 60]
+    results[f"agent.batch_observe.n{n_subjects}"] = measure(lambda: beliefs._observe((rows,), deck_idx, net), repeat)
+
+    results["env.reconstruct.single"] = measure(lambda: _reconstruct_environment_from_human(c_row, w_row, l_row), repeat)
+    results[f"env.build_replay_decks.n{n_subjects}"] = measure(
+        lambda: build_replay_decks(data["choices"], data["wins"], data["losses"]), repeat
+    )
+
+    decks = build_replay_decks(data["choices"], data["wins"], data["losses"])
+    n_trials = (data["choices"] != 0).sum(axis=1)
+    first_actions = data["choices"][:, 0] - 1
+    results[f"simulate.batch.h2.n{n_subjects}"] = measure(
+        lambda: BatchSimulator(decks, n_trials, first_actions, strategy="human", planning_horizon=2).run(), repeat
+    )
+
+    trajectories = BatchSimulator(decks, n_trials, first_actions, strategy="human", planning_horizon=2).run()
+    human_decks = data["choices"] - 1
+    human_nets = data["wins"] + data["losses"]
+    human_totals = 2000 + np.cumsum(human_nets, axis=1)
+    results["metrics.single"] = measure(lambda: similarity_metrics(
+        human_decks[0], human_nets[0], human_totals[0],
+        trajectories.actions[0], trajectories.nets[0], trajectories.totals[0],
+    ), repeat)
+    results[f"metrics.batch.n{n_subjects}"] = measure(lambda: similarity_metrics(
+        human_decks, human_nets, human_totals,
+        trajectories.actions, trajectories.nets, trajectories.totals, lengths=n_trials,
+    ), repeat)
+
+    results.update(run_data_load(n_subjects, trials, repeat=min(repeat, 3), seed=seed))
+    return results
+
+def run_data_load(n_subjects: int, trials: int = 150, repeat: int = 3, seed: int = 0) -> Dict[str, dict]:
+    """`_ensure_data_loaded` na syntetycznym cannabis_raw.txt: od zera (parsowanie + kompilacja) i z cache."""
+    import main
+
+    workdir = tempfile.mkdtemp(prefix="igt_bench_")
+    cwd = os.getcwd()
+    saved_cache_dir = main.DATASET_CACHE_DIR
+    try:
+        write_long_format(os.path.join(workdir, "cannabis_raw.txt"), n_subjects, trials, seed=seed)
+        os.chdir(workdir)
+        main.DATASET_CACHE_DIR = os.path.join(workdir, "cache")
+
+        def load(cold: bool):
+            if cold:
+                shutil.rmtree(main.DATASET_CACHE_DIR, ignore_errors=True)
+            main.DATA_STORE["choices"] = None
+            main._ensure_data_loaded()
+
+        return {
+            f"data.load.cold.n{n_subjects}": measure(lambda: load(True), repeat, min_time=0),
+            f"data.load.warm.n{n_subjects}": measure(lambda: load(False), repeat),
+        }
+    finally:
+        os.chdir(cwd)
+        main.DATASET_CACHE_DIR = saved_cache_dir
+        main.DATA_STORE["choices"] = None
+        shutil.rmtree(workdir, ignore_errors=True)
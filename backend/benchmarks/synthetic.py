@@ -0,0 +1,64 @@
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from simulation import _get_standard_scheme_cards
+
+# --- SYNTETYCZNE DANE IGT (format długi jak cannabis_raw.txt) ---
+#
+# Wybory: softmax z preferencją dobrych talii (C, D) rosnącą w trakcie gry, z losową
+# "umiejętnością" badanego; wygrane/straty z cyklicznego schematu Bechary, zgodnie
+# z tym, którą kartę z danej talii badany akurat ciągnie.
+
+COLUMNS = ["trial", "deck", "deckCopy", "gain", "loss", "subjID"]
+SCHEME = np.array([_get_standard_scheme_cards(d, 0, 40) for d in "ABCD"], dtype=np.int64)  # (4, 40, 2)
+
+def generate_trials(
+    n_subjects: int, trials: int = 150, min_trials: Optional[int] = None, seed: int = 0
+) -> Dict[str, np.ndarray]:
+    """Macierze (badani x próby): choices 1..4 (0 = brak próby), wins, losses (ujemne)."""
+    rng = np.random.default_rng(seed)
+    min_trials = trials if min_trials is None else min_trials
+    lengths = rng.integers(min_trials, trials + 1, n_subjects)
+
+    skill = rng.uniform(-0.5, 1.5, (n_subjects, 1))
+    progress = np.arange(trials) / max(trials - 1, 1)
+    good = skill * progress  # (N, T) - logit preferencji talii C/D
+    logits = np.stack([-good, -good, good, good], axis=-1) + rng.normal(0, 0.5, (n_subjects, 1, 4))
+    probs = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    cumulative = np.cumsum(probs / probs.sum(axis=-1, keepdims=True), axis=-1)
+    decks = np.minimum((rng.random((n_subjects, trials, 1)) > cumulative).sum(axis=-1), 3)
+
+    # Numer karty = ile razy badany wybrał już tę talię
+    onehot = decks[..., None] == np.arange(4)
+    counters = np.take_along_axis(np.cumsum(onehot, axis=1), decks[..., None], axis=2)[..., 0] - 1
+    cards = SCHEME[decks, counters % SCHEME.shape[1]]
+
+    valid = np.arange(trials) < lengths[:, None]
+    return {
+        "choices": np.where(valid, decks + 1, 0),
+        "wins": np.where(valid, cards[..., 0], 0),
+        "losses": np.where(valid, cards[..., 1], 0),
+    }
+
+def write_long_format(
+    path: str, n_subjects: int, trials: int = 150, min_trials: Optional[int] = None,
+    seed: int = 0, chunk_subjects: int = 10000,
+) -> int:
+    """Zapisuje plik tekstowy (tabulatory) kolumnami cannabis_raw.txt; zwraca liczbę wierszy."""
+    rows = 0
+    with open(path, "w") as f:
+        for start in range(0, n_subjects, chunk_subjects):
+            size = min(chunk_subjects, n_subjects - start)
+            data = generate_trials(size, trials, min_trials, seed + start)
+            subject, trial = np.nonzero(data["choices"])
+            deck = data["choices"][subject, trial]
+            frame = pd.DataFrame({
+                "trial": trial + 1, "deck": deck, "deckCopy": deck,
+                "gain": data["wins"][subject, trial], "loss": -data["losses"][subject, trial],
+                "subjID": start + subject + 1,
+            }, columns=COLUMNS)
+            frame.to_csv(f, sep="\t", index=False, header=start == 0)
+            rows += len(frame)
+    return rows
@@ -0,0 +1,43 @@
+import statistics
+import time
+from typing import Callable, Iterable, List
+
+def measure(fn: Callable[[], object], repeat: int = 5, min_time: float = 0.05) -> dict:
+    """Czas jednego wywołania `fn`: liczba wywołań na pomiar dobierana tak, by trwał >= min_time."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    median = statistics.median(samples)
+    return {
+        "median_s": median, "min_s": min(samples), "max_s": max(samples),
+        "ops_per_s": 1 / median if median > 0 else None, "number": number, "repeat": repeat,
+    }
+
+def latency_summary(latencies: Iterable[float], duration: float, errors: int = 0) -> dict:
+    """Statystyki opóźnień (sekundy) i przepustowość serii żądań."""
+    values: List[float] = sorted(latencies)
+    if not values:
+        return {"requests": 0, "errors": errors, "duration_s": duration}
+
+    def percentile(q: float) -> float:
+        return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+    return {
+        "requests": len(values), "errors": errors, "duration_s": duration,
+        "throughput_rps": len(values) / duration if duration > 0 else None,
+        "mean_s": statistics.fmean(values), "p50_s": percentile(0.5),
+        "p90_s": percentile(0.9), "p99_s": percentile(0.99), "max_s": values[-1],
+    }
@@ -0,0 +1,72 @@
+from typing import Dict, List
+
+import numpy as np
+
+from ensemble import summarize
+from metrics import METRIC_FIELDS
+
+# --- STATYSTYKI GRUP BADANYCH (np. całego badania) ---
+#
+# Wszystkie grupy naraz: każda próba dostaje indeks (grupa, blok, talia) albo (grupa, próba)
+# i sumy liczymy jednym np.bincount po całej macierzy. Wejście jak w metrics.py - ważne
+# próby ułożone od lewej, talie 0..3 = A..D, 4 = nieznana.
+
+GOOD_DECKS = (2, 3)  # C, D
+
+def group_statistics(
+    decks: np.ndarray, totals: np.ndarray, lengths: np.ndarray,
+    codes: np.ndarray, n_groups: int, block_size: int = 20,
+) -> List[dict]:
+    """Dla każdej grupy: udział talii A-D w blokach po `block_size` prób, udział dobrych
+    talii (C+D) w blokach i łącznie oraz średni kapitał po każdej próbie (krzywa uczenia)."""
+    n_subjects, trials = decks.shape
+    n_blocks = -(-trials // block_size)
+    valid = np.arange(trials) < lengths[:, None]
+    group = np.broadcast_to(codes[:, None], decks.shape)[valid]
+    trial = np.broadcast_to(np.arange(trials), decks.shape)[valid]
+
+    deck_index = (group * n_blocks + trial // block_size) * 5 + np.minimum(decks[valid], 4)
+    counts = np.bincount(deck_index, minlength=n_groups * n_blocks * 5).reshape(n_groups, n_blocks, 5)
+    known = counts[..., :4].sum(axis=-1)
+    good = counts[..., list(GOOD_DECKS)].sum(axis=-1)
+
+    curve_index = group * trials + trial
+    capital = np.bincount(curve_index, weights=totals[valid], minlength=n_groups * trials).reshape(n_groups, trials)
+    present = np.bincount(curve_index, minlength=n_groups * trials).reshape(n_groups, trials)
+
+    subjects = np.bincount(codes, minlength=n_groups)
+    trial_sums = np.bincount(codes, weights=lengths, minlength=n_groups)
+
+    results = []
+    for g in range(n_groups):
+        blocks = int(np.count_nonzero(present[g, ::block_size])) if trials else 0
+        width = int(np.count_nonzero(present[g]))
+        results.append({
+            "subjects": int(subjects[g]),
+            "mean_trials": float(trial_sums[g] / max(subjects[g], 1)),
+            "blocks": [
+                {
+                    "block": b + 1, "first_trial": b * block_size + 1, "trials": int(counts[g, b].sum()),
+                    "proportions": (counts[g, b, :4] / max(known[g, b], 1)).tolist(),
+                    "good_deck_ratio": float(good[g, b] / max(known[g, b], 1)),
+                }
+                for b in range(blocks)
+            ],
+            "good_deck_ratio": float(good[g].sum() / max(known[g].sum(), 1)),
+            "learning_curve": (capital[g, :width] / np.maximum(present[g, :width], 1)).tolist(),
+            "curve_subjects": present[g, :width].tolist(),
+        })
+    return results
+
+def metric_distributions(metrics: Dict[str, np.ndarray], codes: np.ndarray, n_groups: int) -> List[Dict[str, dict]]:
+    """Średnia, odchylenie i kwantyle każdej metryki podobieństwa w każdej grupie."""
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(n_groups + 1))
+    distributions = []
+    for g in range(n_groups):
+        rows = order[bounds[g]:bounds[g + 1]]
+        distributions.append({
+            name: {key: float(value) for key, value in summarize(metrics[name][rows]).items()}
+            for name in METRIC_FIELDS
+        } if len(rows) else {})
+    return distributions
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# --- SKOMPILOWANY CACHE DANYCH (kolumnowy, mapowany w pamięci) ---
+#
+# Układ katalogu:
+#   index.json       - metadane: podpisy plików źródłowych, kształt, typy, etykiety badanych
+#   <wersja>/*.npy   - macierze choices (int8, 0 = brak wyboru), wins/losses (int16/int32)
+#                      oraz tablice pochodne (odtworzone talie replay_decks, sygnatury zachowania,
+#                      skróty prób badanych)
+# Workery mapują pliki .npy tylko do odczytu, więc dzielą te same strony pamięci.
+
+INDEX_FILE = "index.json"
+FORMAT_VERSION = 5
+MISSING_CHOICE = 0
+
+def compact_trials(choices, wins, losses) -> Dict[str, np.ndarray]:
+    """Macierze float z NaN (pandas) -> zwarte macierze całkowite.
+
+    Brak wyboru to MISSING_CHOICE, brakujące wygrane/straty to 0 - tak samo jak
+    traktowała je dotychczasowa analiza (pd.isna -> 0).
+    """
+    choices = np.asarray(choices, dtype=float)
+    compact = {"choices": np.nan_to_num(choices, nan=MISSING_CHOICE).astype(np.int8)}
+    for name, values in (("wins", wins), ("losses", losses)):
+        values = np.nan_to_num(np.asarray(values, dtype=float), nan=0.0)
+        dtype = np.int16 if np.abs(values).max(initial=0) <= np.iinfo(np.int16).max else np.int32
+        compact[name] = values.astype(dtype)
+    return compact
+
+def source_signature(paths: List[str]) -> Dict[str, dict]:
+    signature = {}
+    for path in paths:
+        if os.path.exists(path):
+            st = os.stat(path)
+            signature[path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    return signature
+
+def _file_sha1(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _content_fingerprint(hashes: Dict[str, str], meta: List[str]) -> str:
+    # Etykiety w kolejności wierszy: te same pliki po przyroście i po pełnej przebudowie mogą
+    # dać inny układ wierszy, a indeksy badanych są kluczami cache wyników i zadań
+    digest = hashlib.sha1(json.dumps(sorted(hashes.items())).encode())
+    digest.update(json.dumps(list(meta)).encode())
+    return digest.hexdigest()[:16]
+
+@contextmanager
+def _build_lock(cache_dir: str):
+    """Blokada międzyprocesowa - tylko jeden worker kompiluje cache naraz."""
+    os.makedirs(cache_dir, exist_ok=True)
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(cache_dir, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _read_index(cache_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILE)) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return index if index.get("format") == FORMAT_VERSION else None
+
+def _write_index(cache_dir: str, index: dict):
+    tmp_path = os.path.join(cache_dir, f"{INDEX_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, os.path.join(cache_dir, INDEX_FILE))
+
+def _is_current(cache_dir: str, index: dict, paths: List[str]) -> bool:
+    """Szybko po mtime/rozmiarze; przy różnicy porównujemy skróty zawartości zmienionych plików."""
+    signature = source_signature(paths)
+    if signature == index["sources"]:
+        return True
+    if set(signature) != set(index["hashes"]):
+        return False
+    touched = [path for path in signature if signature[path] != index["sources"].get(path)]
+    if any(_file_sha1(path) != index["hashes"][path] for path in touched):
+        return False
+    # Tylko "dotknięte" pliki - odświeżamy podpisy, dane zostają
+    index["sources"] = signature
+    _write_index(cache_dir, index)
+    return True
+
+def _open(cache_dir: str, index: dict) -> Dict[str, object]:
+    data_dir = os.path.join(cache_dir, index["data_dir"])
+    dataset = {name: np.load(os.path.join(data_dir, f"{name}.npy"), mmap_mode="r") for name in index["arrays"]}
+    dataset["meta"] = index["meta"]
+    dataset["fingerprint"] = index["fingerprint"]
+    return dataset
+
+def load_compiled_dataset(cache_dir: str, paths: List[str]) -> Optional[Dict[str, object]]:
+    """Mapuje aktualny cache tylko do odczytu albo zwraca None, gdy trzeba go przebudować."""
+    for attempt in range(2):
+        index = _read_index(cache_dir)
+        if index is None or not _is_current(cache_dir, index, paths):
+            return None
+        try:
+            return _open(cache_dir, index)
+        except FileNotFoundError:
+            # Między odczytem indeksu a np.load inny worker zapisał dwie nowe wersje i usunął
+            # tę ze starego indeksu - nowy indeks wskazuje już istniejące pliki
+            if attempt:
+                raise
+
+def load_or_build_dataset(
+    cache_dir: str,
+    paths: List[str],
+    parse: Callable[[], Optional[Tuple[Dict[str, np.ndarray], List[str], dict]]],
+    derive: Optional[Callable[..., Dict[str, np.ndarray]]] = None,
+    update: Optional[Callable[[Dict[str, object], Optional[dict]], Optional[tuple]]] = None,
+) -> Optional[Dict[str, object]]:
+    """Zmapowany cache; gdy go brak lub jest nieaktualny - parsuje źródła i zapisuje nową wersję.
+
+    Parsowanie odbywa się pod blokadą, więc przy kilku workerach robi je tylko pierwszy,
+    a pozostałe po odczekaniu mapują gotowe pliki. `derive` liczy z macierzy prób dodatkowe
+    tablice, zapisywane i mapowane razem z nimi. `parse` zwraca (tablice, etykiety, stan);
+    stan trafia do indeksu i dostaje go `update(poprzednia wersja, stan)`, który może dołączyć
+    same zmiany zamiast parsować wszystko - zwraca (tablice, etykiety, stan, zmienione wiersze)
+    albo None. Wtedy `derive(tablice, poprzednia wersja, zmienione wiersze)` przelicza tylko je.
+    """
+    dataset = load_compiled_dataset(cache_dir, paths)
+    if dataset is not None:
+        return dataset
+    with _build_lock(cache_dir):
+        dataset = load_compiled_dataset(cache_dir, paths)
+        if dataset is not None:
+            return dataset
+        # Podpisy i skróty sprzed parsowania - plik dopisany w trakcie zostanie wykryty przy następnym sprawdzeniu
+        previous = _read_index(cache_dir)
+        signature = source_signature(paths)
+        hashes = _source_hashes(previous, signature)
+        if update is not None and previous is not None:
+            base = _open(cache_dir, previous)
+            updated = update(base, previous.get("state"))
+            if updated is not None:
+                arrays, meta, state, changed = updated
+                if not len(changed) and len(meta) == len(previous["meta"]):
+                    # Nic nowego w danych (np. tylko ruchy niedokończonych gier) - te same pliki
+                    # i odcisk danych (cache wyników zostaje), nowe podpisy źródeł i stan
+                    index = {**previous, "sources": signature, "hashes": hashes, "state": state}
+                    _write_index(cache_dir, index)
+                    return _open(cache_dir, index)
+                if derive is not None:
+                    arrays = {**arrays, **derive(arrays, base, changed)}
+                return _write(cache_dir, previous, signature, hashes, arrays, meta, state)
+        parsed = parse()
+        if parsed is None:
+            return None
+        arrays, meta, state = parsed
+        if derive is not None:
+            arrays = {**arrays, **derive(arrays)}
+        return _write(cache_dir, previous, signature, hashes, arrays, meta, state)
+
+def _source_hashes(previous: Optional[dict], signature: Dict[str, dict]) -> Dict[str, str]:
+    # Skrótów plików, które się nie zmieniły, nie liczymy ponownie
+    known = previous or {"sources": {}, "hashes": {}}
+    return {
+        path: known["hashes"][path] if known["sources"].get(path) == stat and path in known["hashes"] else _file_sha1(path)
+        for path, stat in signature.items()
+    }
+
+def _write(
+    cache_dir: str, previous: Optional[dict], signature: Dict[str, dict], hashes: Dict[str, str],
+    arrays: Dict[str, np.ndarray], meta: List[str], state: Optional[dict] = None,
+) -> Dict[str, object]:
+    data_dir = f"v{FORMAT_VERSION}-{uuid.uuid4().hex[:12]}"
+    os.makedirs(os.path.join(cache_dir, data_dir))
+    for name in arrays:
+        np.save(os.path.join(cache_dir, data_dir, f"{name}.npy"), np.ascontiguousarray(arrays[name]))
+
+    index = {
+        "format": FORMAT_VERSION,
+        "sources": signature,
+        "hashes": hashes,
+        "fingerprint": _content_fingerprint(hashes, meta),
+        "data_dir": data_dir,
+        "shape": list(arrays["choices"].shape),
+        "arrays": list(arrays),
+        "dtypes": {name: str(arrays[name].dtype) for name in arrays},
+        "meta": list(meta),
+        "state": state,
+    }
+    _write_index(cache_dir, index)
+
+    # Starsze wersje można usunąć - procesy, które je zmapowały, zachowują dostęp. Poprzednią
+    # zostawiamy do następnej przebudowy: worker mógł przeczytać stary indeks i jeszcze nie zmapować plików
+    keep = {data_dir, previous["data_dir"] if previous is not None else None}
+    for name in os.listdir(cache_dir):
+        if name.startswith("v") and name not in keep and os.path.isdir(os.path.join(cache_dir, name)):
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+    return _open(cache_dir, index)
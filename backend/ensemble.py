@@ -0,0 +1,69 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+from metrics import METRIC_FIELDS, similarity_metrics
+from simulation import BatchSimulator, BatchTrajectories
+
+# --- ZESPÓŁ PRZEBIEGÓW MONTE CARLO ---
+#
+# N przebiegów agenta dla jednego badanego to N wierszy jednego BatchSimulator w trybie
+# stochastycznym (softmax po wartościach ścieżek, opcjonalny szum przekonań); odtworzone
+# talie badanego są tylko rozgłaszane. Z przebiegów liczymy pasma kapitału próba po próbie
+# i rozkłady metryk podobieństwa.
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+DEFAULT_INVERSE_TEMPERATURE = 0.01  # jak punkt startowy dopasowania (fitting.DEFAULT_START)
+
+def run_ensemble(
+    decks: np.ndarray,
+    n_trials: int,
+    first_action: int,
+    n_rollouts: int,
+    seed: int,
+    horizon: int = 2,
+    inverse_temperature: Optional[float] = DEFAULT_INVERSE_TEMPERATURE,
+    belief_noise: float = 0.0,
+    params: Optional[dict] = None,
+) -> BatchTrajectories:
+    """`n_rollouts` przebiegów na taliach (4, MAX_TRIALS, 2); wynik zależy tylko od argumentów i `seed`."""
+    simulator = BatchSimulator(
+        np.broadcast_to(decks, (n_rollouts,) + decks.shape),
+        n_trials=np.full(n_rollouts, n_trials),
+        first_actions=np.full(n_rollouts, first_action),
+        strategy="human",
+        planning_horizon=horizon,
+        inverse_temperature=inverse_temperature,
+        belief_noise=belief_noise,
+        rng=np.random.default_rng(seed),
+        **(params or {}),
+    )
+    return simulator.run()
+
+def quantile_name(q: float) -> str:
+    return f"q{round(q * 100):02d}"
+
+def summarize(values: np.ndarray, axis: int = 0) -> Dict[str, np.ndarray]:
+    """Średnia, odchylenie i kwantyle QUANTILES wzdłuż osi przebiegów."""
+    values = np.asarray(values, dtype=float)
+    summary = {"mean": values.mean(axis=axis), "std": values.std(axis=axis)}
+    for q, band in zip(QUANTILES, np.quantile(values, QUANTILES, axis=axis)):
+        summary[quantile_name(q)] = band
+    return summary
+
+def ensemble_statistics(trajectories: BatchTrajectories, human: Dict[str, np.ndarray]) -> dict:
+    """Pasma kapitału AI (próba po próbie) i rozkłady metryk względem człowieka.
+
+    `human` - tablice jednego badanego (deck, net, total_score) przycięte do `n_trials` przebiegów.
+    """
+    n_rollouts, n = trajectories.actions.shape
+    shape = (n_rollouts, n)
+    metrics = similarity_metrics(
+        np.broadcast_to(human["deck"], shape), np.broadcast_to(human["net"], shape),
+        np.broadcast_to(human["total_score"], shape),
+        trajectories.actions, trajectories.nets, trajectories.totals,
+    )
+    return {
+        "capital": summarize(trajectories.totals),
+        "metrics": {name: summarize(metrics[name]) for name in METRIC_FIELDS},
+    }
@@ -0,0 +1,192 @@
+import itertools
+from typing import Dict, List, Literal, Optional
+
+import numpy as np
+
+from simulation import BatchSimulator, _BeliefState, _first_deck_values
+
+# --- DOPASOWANIE PARAMETRÓW AGENTA MPC DO BADANEGO ---
+#
+# Wszyscy kandydaci jednego badanego liczeni są jednym przebiegiem wsadowym:
+# wiersze BatchSimulator to kandydaci, a odtworzone talie badanego są tylko
+# rozgłaszane (broadcast) - środowisko budujemy raz na badanego.
+
+FitObjective = Literal["match", "likelihood"]
+FitMethod = Literal["grid", "coordinate"]
+
+DEFAULT_GRID: Dict[str, List[float]] = {
+    "loss_aversion": [0.5, 1.0, 2.0, 3.0, 4.9, 7.0],
+    "learning_rate": [0.05, 0.1, 0.2, 0.3, 0.5, 0.8],
+    "info_value_weight": [0.0, 0.4, 0.8, 1.5, 2.5],
+}
+# Tylko dla celu "likelihood": softmax(beta * wartość ścieżki) jako model wyboru
+DEFAULT_TEMPERATURE_GRID = [0.002, 0.005, 0.01, 0.02, 0.05, 0.1]
+DEFAULT_START = {"loss_aversion": 4.9, "learning_rate": 0.3, "info_value_weight": 0.8, "inverse_temperature": 0.01}
+
+class SubjectTrials:
+    """Dane jednego badanego potrzebne do dopasowania."""
+
+    def __init__(self, decks: np.ndarray, choices: np.ndarray, nets: np.ndarray, first_action: int):
+        self.decks = decks              # (4, MAX_TRIALS, 2) - odtworzone środowisko
+        self.choices = choices          # (n,) talie 0..3 kolejnych ważnych prób, 4 = nieznana
+        self.nets = nets                # (n,) wynik netto człowieka w tych próbach
+        self.first_action = first_action
+
+    @property
+    def n_trials(self) -> int:
+        return len(self.choices)
+
+def parameter_names(objective: FitObjective) -> List[str]:
+    names = list(DEFAULT_GRID)
+    return names + ["inverse_temperature"] if objective == "likelihood" else names
+
+def evaluate_candidates(
+    subject: SubjectTrials,
+    params: Dict[str, np.ndarray],
+    objective: FitObjective,
+    horizon: int = 2,
+    prefix: Optional[int] = None,
+) -> np.ndarray:
+    """Wynik każdego kandydata (większy = lepszy) na pierwszych `prefix` próbach.
+
+    "match" - exact_match_ratio (%) swobodnej symulacji, jak w /analysis/compare;
+    "likelihood" - suma log P(wybór człowieka) przy agencie uczącym się na wynikach człowieka.
+    """
+    n = subject.n_trials if prefix is None else min(prefix, subject.n_trials)
+    if objective == "match":
+        return _match_ratio(subject, params, horizon, n)
+    return _log_likelihood(subject, params, horizon, n)
+
+def _match_ratio(subject: SubjectTrials, params: Dict[str, np.ndarray], horizon: int, n: int) -> np.ndarray:
+    size = len(params["loss_aversion"])
+    if n == 0:
+        return np.zeros(size)
+    simulator = BatchSimulator(
+        np.broadcast_to(subject.decks, (size,) + subject.decks.shape),
+        n_trials=np.full(size, n),
+        first_actions=np.full(size, subject.first_action),
+        strategy="human",
+        planning_horizon=horizon,
+        loss_aversion=params["loss_aversion"],
+        learning_rate=params["learning_rate"],
+        info_value_weight=params["info_value_weight"],
+    )
+    actions = simulator.run().actions
+    return (actions[:, :n] == subject.choices[:n]).mean(axis=1) * 100
+
+def _log_likelihood(subject: SubjectTrials, params: Dict[str, np.ndarray], horizon: int, n: int) -> np.ndarray:
+    size = len(params["loss_aversion"])
+    rows = np.arange(size)
+    beliefs = _BeliefState(
+        (size,), "human",
+        loss_aversion=np.asarray(params["loss_aversion"], dtype=float),
+        learning_rate=np.asarray(params["learning_rate"], dtype=float),
+        info_value_weight=np.asarray(params["info_value_weight"], dtype=float),
+    )
+    beta = np.asarray(params["inverse_temperature"], dtype=float)[:, None]
+    total = np.zeros(size)
+    for t in range(n):
+        deck = subject.choices[t]
+        if deck > 3:
+            # Nieznana talia - nie oceniamy wyboru i nie wiemy, której talii dotyczy wynik
+            continue
+        # Pierwszy ruch w porównaniu jest kopiowany od człowieka - nie oceniamy go
+        if t > 0:
+            logits = beta * _first_deck_values(
+                beliefs.means, beliefs.variances, beliefs.counts, beliefs.info_value_weight, horizon
+            )
+            logits -= logits.max(axis=1, keepdims=True)
+            total += logits[:, deck] - np.log(np.exp(logits).sum(axis=1))
+        beliefs._observe((rows,), np.full(size, deck), subject.nets[t])
+    return total
+
+def _grid_candidates(grid: Dict[str, List[float]], names: List[str]) -> Dict[str, np.ndarray]:
+    combos = np.array(list(itertools.product(*(grid[name] for name in names))), dtype=float)
+    return {name: combos[:, i] for i, name in enumerate(names)}
+
+def _take(params: Dict[str, np.ndarray], idx) -> Dict[str, np.ndarray]:
+    return {name: values[idx] for name, values in params.items()}
+
+def grid_search(
+    subject: SubjectTrials,
+    grid: Dict[str, List[float]],
+    objective: FitObjective,
+    horizon: int = 2,
+    successive_halving: bool = False,
+    eta: int = 3,
+    min_prefix: int = 20,
+) -> dict:
+    """Pełna siatka albo successive halving: słabe kandydaty odpadają po krótszych prefiksach prób.
+
+    Halving ma sens dla celu "likelihood", gdzie log-wiarygodność prefiksu dobrze przewiduje
+    wynik całości; dla "match" prefiksy swobodnej symulacji są zbyt zaszumione.
+    """
+    candidates = _grid_candidates(grid, parameter_names(objective))
+    size = len(candidates["loss_aversion"])
+    evaluations = 0
+
+    prefixes = [subject.n_trials]
+    if successive_halving and size > 1:
+        rungs = min(2, int(np.log(size) / np.log(eta)))
+        prefixes = [max(min_prefix, int(np.ceil(subject.n_trials / eta ** (rungs - r)))) for r in range(rungs + 1)]
+
+    for rung, prefix in enumerate(prefixes):
+        scores = evaluate_candidates(subject, candidates, objective, horizon, prefix)
+        evaluations += len(scores)
+        if rung < len(prefixes) - 1:
+            # Zostawiamy najlepszą 1/eta oraz wszystkich remisujących z progiem - na krótkich
+            # prefiksach wielu kandydatów ma identyczny wynik i nie ma podstaw, by ich odrzucić
+            keep = max(1, int(np.ceil(len(scores) / eta)))
+            threshold = np.sort(scores)[::-1][keep - 1]
+            candidates = _take(candidates, scores >= threshold)
+
+    best = int(np.argmax(scores))
+    return {
+        "params": {name: float(values[best]) for name, values in candidates.items()},
+        "score": float(scores[best]),
+        "evaluations": evaluations,
+    }
+
+def coordinate_search(
+    subject: SubjectTrials,
+    grid: Dict[str, List[float]],
+    objective: FitObjective,
+    horizon: int = 2,
+    max_rounds: int = 4,
+) -> dict:
+    """Przeszukiwanie po współrzędnych: każdą oś siatki sprawdzamy wektorowo przy ustalonych pozostałych."""
+    names = parameter_names(objective)
+    current = {name: DEFAULT_START[name] for name in names}
+    best_score = float(evaluate_candidates(subject, {k: np.array([v]) for k, v in current.items()}, objective, horizon)[0])
+    evaluations = 1
+
+    for _ in range(max_rounds):
+        improved = False
+        for name in names:
+            values = np.asarray(grid[name], dtype=float)
+            candidates = {k: np.full(len(values), v) for k, v in current.items()}
+            candidates[name] = values
+            scores = evaluate_candidates(subject, candidates, objective, horizon)
+            evaluations += len(values)
+            best = int(np.argmax(scores))
+            if scores[best] > best_score:
+                best_score = float(scores[best])
+                current[name] = float(values[best])
+                improved = True
+        if not improved:
+            break
+
+    return {"params": current, "score": best_score, "evaluations": evaluations}
+
+def fit_subject(subject: SubjectTrials, config: dict) -> dict:
+    """Dopasowanie jednego badanego wg konfiguracji zadania (słownik z pól FitJobRequest)."""
+    objective = config.get("objective", "match")
+    grid = {**DEFAULT_GRID, "inverse_temperature": DEFAULT_TEMPERATURE_GRID, **(config.get("grid") or {})}
+    horizon = config.get("horizon", 2)
+    if config.get("method", "grid") == "coordinate":
+        return coordinate_search(subject, grid, objective, horizon)
+    return grid_search(
+        subject, grid, objective, horizon,
+        successive_halving=config.get("successive_halving", False),
+        eta=config.get("eta", 3),
+    )
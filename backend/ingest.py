@@ -0,0 +1,214 @@
+import glob
+import hashlib
+import io
+import os
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# --- IMPORT LOGÓW PRÓB W FORMACIE "DŁUGIM" (jeden wiersz = jedna próba) ---
+#
+# Wymagane kolumny: subjID, trial, deck, gain, loss (pozostałe pomijamy), separator - białe znaki.
+# Plik czytamy blokami parserem C i wpisujemy próby od razu do macierzy badani x próby
+# (wiersz = badany, kolumna = trial - 1) - bez pivotów i bez wczytywania całości.
+# Dla każdego pliku pamiętamy przeczytaną długość i wiersze jego badanych, więc dopisane
+# linie i nowe pliki dołączamy przyrostowo. Nowi badani trafiają zawsze na koniec zbioru,
+# dzięki czemu indeksy już widocznych badanych się nie zmieniają.
+
+REQUIRED_COLUMNS = ("subjID", "trial", "deck", "gain", "loss")
+BLOCK_BYTES = 16 << 20
+TAIL_BYTES = 4096  # końcówka przeczytanej części - po niej poznajemy, że plik tylko urósł
+MAX_TRIAL = 1000   # dłuższe próby traktujemy jako błąd danych (chroni przed ogromnymi macierzami)
+
+class LongFormatSource(NamedTuple):
+    pattern: str  # ścieżka albo wzorzec glob - później dodane pasujące pliki też są wczytywane
+    label: str    # etykieta badania; badany dostaje "<label> <subjID>"
+
+def expand_sources(sources: List[LongFormatSource]) -> List[Tuple[str, str]]:
+    """(ścieżka, etykieta) zarejestrowanych plików; pierwsza pasująca rejestracja wygrywa."""
+    paths: Dict[str, str] = {}
+    for source in sources:
+        matches = sorted(glob.glob(source.pattern)) if glob.has_magic(source.pattern) else [source.pattern]
+        for path in matches:
+            paths.setdefault(path, source.label)
+    return list(paths.items())
+
+def parse_sources(spec: str) -> List[LongFormatSource]:
+    """Rejestracja z konfiguracji: "ścieżka=Etykieta;logi/*.txt=Inna etykieta"."""
+    sources = []
+    for entry in spec.split(";"):
+        if entry.strip():
+            pattern, _, label = entry.partition("=")
+            sources.append(LongFormatSource(pattern.strip(), label.strip() or os.path.basename(pattern.strip())))
+    return sources
+
+def _tail_digest(path: str, end: int) -> str:
+    start = max(0, end - TAIL_BYTES)
+    with open(path, "rb") as f:
+        f.seek(start)
+        return hashlib.sha1(f.read(end - start)).hexdigest()
+
+def read_blocks(
+    path: str, offset: int = 0, header: Optional[List[str]] = None, block_bytes: int = BLOCK_BYTES,
+) -> Iterator[Tuple[pd.DataFrame, List[str], int]]:
+    """Kolejne bloki linii od bajtu `offset`: (ramka z REQUIRED_COLUMNS, nagłówek, przesunięcie po bloku).
+
+    Przesunięcie wskazuje początek linii bez znaku końca - ostatnia, niezakończona linia
+    jest wczytywana (jeśli ma wszystkie pola), ale przy następnym odczycie czytamy ją ponownie,
+    na wypadek gdyby była właśnie dopisywana.
+    """
+    with open(path, "rb") as f:
+        if offset == 0:
+            header = f.readline().decode().split()
+            missing = [col for col in REQUIRED_COLUMNS if col not in header]
+            if missing:
+                raise ValueError(f"{path}: brak kolumn {', '.join(missing)}")
+            offset = f.tell()
+        f.seek(offset)
+        pending = b""
+        while True:
+            block = f.read(block_bytes)
+            data = pending + block
+            if not block:
+                # Koniec pliku - niezakończona linia zostaje w `pending`
+                if data.strip() and len(data.split()) == len(header):
+                    yield _parse_block(data, header), header, offset
+                return
+            cut = data.rfind(b"\n") + 1
+            pending = data[cut:]
+            if cut:
+                offset += cut
+                yield _parse_block(data[:cut], header), header, offset
+
+def _parse_block(data: bytes, header: List[str]) -> pd.DataFrame:
+    return pd.read_csv(
+        io.BytesIO(data), sep=r"\s+", engine="c", header=None, names=header,
+        usecols=list(REQUIRED_COLUMNS), dtype={"subjID": str}, on_bad_lines="skip",
+    )
+
+TRIAL_ARRAYS = ("choices", "wins", "losses")
+
+class TrialMatrices:
+    """Macierze prób zbioru (badani x próby) z dopisywaniem badanych i prób.
+
+    Wejściowe tablice (np. zmapowane pliki cache) kopiujemy dopiero przy pierwszym zapisie,
+    więc przyrost bez nowych danych nic nie kosztuje. Wierszy przybywa z zapasem (podwajanie,
+    jak w liście), kolumn - dokładnie do najdłuższej próby.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: List[str]):
+        self._arrays = {name: arrays[name] for name in TRIAL_ARRAYS}
+        self._copied = False
+        self.meta = list(meta)
+        self._changed: List[np.ndarray] = []
+
+    @property
+    def rows(self) -> int:
+        return len(self.meta)
+
+    def add_subject(self, label: str) -> int:
+        self.meta.append(label)
+        return self.rows - 1
+
+    def scatter(self, subject_rows: np.ndarray, columns: np.ndarray, choices, wins, losses):
+        """Wpisuje próby (wiersz, kolumna) -> talia 1..4, wygrana, strata (ujemna)."""
+        if not len(subject_rows):
+            return
+        self._reserve(self.rows, int(columns.max()) + 1)
+        for name, values in (("wins", wins), ("losses", losses)):
+            # int16 wystarcza dla danych IGT; większe kwoty podnoszą typ całej macierzy
+            if self._arrays[name].dtype == np.int16 and np.abs(values).max(initial=0) > np.iinfo(np.int16).max:
+                self._arrays[name] = self._arrays[name].astype(np.int32)
+        self._arrays["choices"][subject_rows, columns] = np.asarray(choices).astype(np.int8)
+        self._arrays["wins"][subject_rows, columns] = wins
+        self._arrays["losses"][subject_rows, columns] = losses
+        self._changed.append(np.unique(subject_rows))
+
+    def _reserve(self, rows: int, width: int):
+        current_rows, current_width = self._arrays["choices"].shape
+        if self._copied and rows <= current_rows and width <= current_width:
+            return
+        new_rows = max(rows, 2 * current_rows) if rows > current_rows else current_rows
+        new_width = max(width, current_width)
+        for name, values in self._arrays.items():
+            target = np.zeros((new_rows, new_width), dtype=values.dtype)
+            target[:current_rows, :current_width] = values
+            self._arrays[name] = target
+        self._copied = True
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {name: values[:self.rows] for name, values in self._arrays.items()}
+
+    def changed(self) -> np.ndarray:
+        """Wiersze dodane albo zmienione (do przeliczenia tablic pochodnych)."""
+        return np.unique(np.concatenate(self._changed)) if self._changed else np.zeros(0, dtype=np.int64)
+
+def ingest_long_format(
+    sources: List[LongFormatSource], matrices: TrialMatrices, state: Optional[dict] = None,
+) -> Optional[dict]:
+    """Dopisuje do `matrices` nowe próby zarejestrowanych plików; zwraca nowy stan.
+
+    `state` to stan z poprzedniego wywołania (None = od początku). Zwraca None, gdy przyrost
+    nie wystarczy - plik skrócono, nadpisano, usunięto albo zmieniono jego etykietę;
+    wtedy trzeba zbudować cały zbiór od nowa.
+    """
+    state = {path: dict(entry, subjects=dict(entry["subjects"])) for path, entry in (state or {}).items()}
+    registered = expand_sources(sources)
+    if any(path not in dict(registered) and entry["subjects"] for path, entry in state.items()):
+        return None
+    for path, label in registered:
+        entry = state.setdefault(path, {"label": label, "offset": 0, "header": None, "tail": "", "subjects": {}})
+        if entry["label"] != label:
+            return None
+        if not os.path.exists(path):
+            if entry["subjects"]:
+                return None
+            continue
+        offset = entry["offset"]
+        if os.path.getsize(path) < offset or (offset and _tail_digest(path, offset) != entry["tail"]):
+            return None
+
+        subjects = entry["subjects"]
+        added = 0
+        try:
+            for frame, header, offset in read_blocks(path, entry["offset"], entry["header"]):
+                trial = pd.to_numeric(frame["trial"], errors="coerce").to_numpy(dtype=float)
+                keep = frame["subjID"].notna().to_numpy() & (trial >= 1) & (trial <= MAX_TRIAL)
+                sids = frame["subjID"].to_numpy()[keep]
+                values = {
+                    col: np.nan_to_num(pd.to_numeric(frame[col], errors="coerce").to_numpy(dtype=float)[keep])
+                    for col in ("deck", "gain", "loss")
+                }
+
+                # Badani mapowani na wiersze raz na blok (factorize - w kolejności pierwszego wystąpienia)
+                codes, unique = pd.factorize(sids)
+                for sid in unique:
+                    if sid not in subjects:
+                        subjects[sid] = matrices.add_subject(f"{label} {sid}")
+                        added += 1
+                subject_rows = np.array([subjects[sid] for sid in unique], dtype=np.int64)[codes]
+                matrices.scatter(
+                    subject_rows, trial[keep].astype(np.int64) - 1,
+                    values["deck"], values["gain"], -np.abs(values["loss"]),  # straty zawsze ujemne
+                )
+                entry.update(header=header, offset=offset)
+        except (OSError, ValueError, pd.errors.ParserError) as e:
+            # Zostają próby z bloków przeczytanych przed błędem; resztę spróbujemy po zmianie pliku
+            print(f"Błąd {path}: {e}")
+        entry["tail"] = _tail_digest(path, entry["offset"])
+        if added:
+            print(f" -> {path}: {added} nowych badanych ({label}).")
+    return state
+
+def stack_trials(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """Łączy zwarte macierze kilku źródeł; krótsze wiersze dopełnia brakiem próby (0)."""
+    width = max(part["choices"].shape[1] for part in parts)
+    stacked = {}
+    for name in TRIAL_ARRAYS:
+        dtype = np.result_type(*(part[name].dtype for part in parts))
+        stacked[name] = np.concatenate([
+            np.pad(part[name].astype(dtype), ((0, 0), (0, width - part[name].shape[1])), constant_values=0)
+            for part in parts
+        ])
+    return stacked
@@ -1,23 +1,80 @@
+import asyncio
+import hashlib
+import json
+import math
 import random
+import time
 import uuid
 import os
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Literal, Optional, Tuple, Any
-import itertools
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.datastructures import MutableHeaders
+from pydantic import BaseModel, Field
+
+from simulation import (
+    MAX_ENUMERATE_HORIZON,
+    MAX_PLANNING_HORIZON,
+    BatchSimulator,
+    PlannerName,
+    ReplayedEnvironment,
+    StochasticMPCAgent,
+    build_replay_decks,
+    planner_evaluations,
+)
+from result_cache import ResultCache
+from dataset_cache import MISSING_CHOICE, compact_trials, load_or_build_dataset, source_signature
+from ingest import LongFormatSource, TrialMatrices, expand_sources, ingest_long_format, parse_sources, stack_trials
+from triallog import TrialLog, finished_marker, ingest_trial_log
+from analysis_pool import AnalysisPool, PoolBrokenError, QueueFullError
+from metrics import rounded_metrics, similarity_metrics
+from sessions import DECK_IDS, LiveOpponent, SessionState, create_session_store
+from telemetry import (
+    MetricsRegistry, SamplingProfiler, StageTimer, WindowedSampler, current_timer, fan_out, stage, use_timer, write_profile,
+)
+from fitting import FitMethod, FitObjective, SubjectTrials, fit_subject
+from ensemble import DEFAULT_INVERSE_TEMPERATURE, ensemble_statistics, run_ensemble
+from cohort import group_statistics, metric_distributions
+from agent_models import MODELS, create_model, fit_maximum_likelihood, information_criteria
+import payloads
+from similarity import SIGNATURE_SIZE, SignatureIndex, behaviour_signatures
+from payloads import ResponseFormat
 
 try:
     import pyreadr
 except ImportError:
     pyreadr = None
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Dane ładujemy w tle - serwer od razu przyjmuje ruch gry, /health/ready mówi kiedy analizy są gotowe
+    ANALYSIS_POOL.start()
+    if LOOP_PROFILER is not None:
+        LOOP_PROFILER.thread_id = threading.get_ident()
+        LOOP_PROFILER.start()
+    loader = asyncio.create_task(asyncio.to_thread(_load_data_on_startup))
+    flusher = asyncio.create_task(_flush_trial_log()) if TRIAL_LOG is not None else None
+    yield
+    loader.cancel()
+    if flusher is not None:
+        flusher.cancel()
+        TRIAL_LOG.flush()
+    ANALYSIS_POOL.shutdown()
+    FIT_POOL.shutdown()
+    if LOOP_PROFILER is not None:
+        LOOP_PROFILER.stop()
+
 app = FastAPI(
     title="IGT Analyser Backend",
-    description="API do analizy IGT (RData + Cannabis Dataset) z modułem AI (MPC).",
+    description="API do analizy IGT (RData + logi prób: Cannabis, HC) z modułem AI (MPC).",
     version="4.0.0",
+    lifespan=lifespan,
 )
 
 origins = ["http://localhost:3000", "http://localhost"]
@@ -27,13 +84,132 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+class RequestTelemetry:
+    """Czas żądania do /metrics, etapy w nagłówku Server-Timing, opcjonalny profil wolnych żądań.
+
+    Czysty middleware ASGI: aplikacja działa w tym samym zadaniu, a odpowiedź (także strumieniowa)
+    nie przechodzi przez dodatkowe kolejki. Czas i etapy mierzymy do wysłania nagłówków odpowiedzi.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timer = StageTimer()
+        start = time.perf_counter()
+        response = {"status": 500, "elapsed": None}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["elapsed"] = elapsed = time.perf_counter() - start
+                if timer.stages:
+                    MutableHeaders(scope=message).append("Server-Timing", timer.server_timing(elapsed))
+            await send(message)
+
+        try:
+            with use_timer(timer):
+                await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = response["elapsed"] if response["elapsed"] is not None else time.perf_counter() - start
+            endpoint = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.observe(elapsed, scope["method"], endpoint, str(response["status"]))
+            for name, seconds in timer.stages.items():
+                STAGE_LATENCY.observe(seconds, name)
+        if PROFILE_THRESHOLD is None or elapsed < PROFILE_THRESHOLD:
+            return
+        # Próbki pętli zdarzeń z okna tego żądania + próbki z workera (dołączone w _run_analysis)
+        if LOOP_PROFILER is not None:
+            timer.merge({}, LOOP_PROFILER.between(start, time.perf_counter()))
+        if timer.samples:
+            write_profile(PROFILE_DIR, endpoint.strip("/").replace("/", "_").replace("{", "").replace("}", ""), timer.samples, {
+                "path": scope["path"], "query": scope.get("query_string", b"").decode("latin-1"),
+                "duration_ms": f"{elapsed * 1000:.1f}", "server_timing": timer.server_timing(elapsed),
+            })
+
+app.add_middleware(RequestTelemetry)
+
 # --- GLOBALNY MAGAZYN DANYCH ---
+# choices: int8 (MISSING_CHOICE = brak próby), wins/losses: int16/int32 - macierze (badani x próby)
+# zmapowane tylko do odczytu ze skompilowanego cache (patrz dataset_cache.py)
+# replay_decks: (badani x 4 x 150 x 2) odtworzone talie, prekomputowane w cache danych
+# trial_counts, meta_labels/meta_codes - indeksy liczone raz przy ładowaniu (lista badanych, filtry)
+# study_labels/study_codes - badanie (grupa) każdego badanego, np. "Cannabis User" dla "Cannabis User 201"
+# signatures: (badani x SIGNATURE_SIZE) sygnatury zachowania do wyszukiwania podobnych (similarity.py)
+# row_digests: (badani x 20) SHA1 prób każdego badanego, study_digests - skróty grup (cache statystyk grup)
 DATA_STORE = {
-    "choices": None, "wins": None, "losses": None, "meta": []
+    "choices": None, "wins": None, "losses": None, "meta": [], "fingerprint": None, "source_stats": None,
+    "trial_counts": None, "meta_labels": None, "meta_codes": None, "replay_decks": None,
+    "study_labels": None, "study_codes": None, "signatures": None, "row_digests": None, "study_digests": None,
 }
 
+# Pliki, których zmiana (rozmiar / mtime / zawartość) unieważnia załadowane dane i cache wyników.
+# Logi w formacie długim (subjID, trial, deck, gain, loss) rejestrujemy z etykietą badania;
+# dopisane linie i nowe pliki pasujące do wzorca są dołączane w locie (patrz ingest.py).
+# IGT_LONG_SOURCES - dodatkowe pliki: "ścieżka=Etykieta;logi/*.txt=Inna etykieta"
+STATIC_SOURCES = ["IGTdata.rdata", "choice_95.csv"]
+LONG_FORMAT_SOURCES = [
+    LongFormatSource("cannabis_raw.txt", "Cannabis User"),
+    LongFormatSource("IGTdata_HC.txt", "Healthy Control"),
+] + parse_sources(os.getenv("IGT_LONG_SOURCES", ""))
+
+# Dziennik prób gry na żywo (triallog.py); ukończone gry dołączane jako badani "Live Game <sesja>".
+# IGT_TRIAL_LOG - plik dziennika (domyślnie "" = wyłączony), IGT_TRIAL_LOG_INTERVAL - co ile sekund zapis
+# bufora, IGT_TRIAL_LOG_BATCH - liczba ruchów, po której zapisujemy od razu
+TRIAL_LOG_PATH = os.getenv("IGT_TRIAL_LOG", "")
+TRIAL_LOG_INTERVAL = float(os.getenv("IGT_TRIAL_LOG_INTERVAL", "1.0"))
+TRIAL_LOG = TrialLog(TRIAL_LOG_PATH, int(os.getenv("IGT_TRIAL_LOG_BATCH", "4096"))) if TRIAL_LOG_PATH else None
+LIVE_GAME_LABEL = "Live Game"
+
+def _data_sources() -> List[str]:
+    # Z dziennika obserwujemy tylko znacznik ukończonych gier (patrz triallog.py)
+    live = [finished_marker(TRIAL_LOG_PATH)] if TRIAL_LOG_PATH else []
+    return STATIC_SOURCES + [path for path, _ in expand_sources(LONG_FORMAT_SOURCES)] + live
+
+DATASET_CACHE_DIR = os.getenv("IGT_DATASET_CACHE_DIR", ".igt_dataset")
+DATA_STATUS = {"error": None}
+_DATA_LOCK = threading.Lock()
+
+# --- PULA ANALIZ ---
+# IGT_ANALYSIS_WORKERS - liczba procesów (0 = jeden wątek), IGT_ANALYSIS_MAX_PENDING - limit
+# zadań w toku i w kolejce (powyżej -> 429), IGT_ANALYSIS_TIMEOUT - limit czasu żądania w sekundach
+_IS_ANALYSIS_WORKER = False
+
+def _init_analysis_worker():
+    global _IS_ANALYSIS_WORKER
+    _IS_ANALYSIS_WORKER = True
+    try:
+        _ensure_data_loaded()
+    except HTTPException:
+        pass
+
+ANALYSIS_WORKERS = int(os.getenv("IGT_ANALYSIS_WORKERS", "2"))
+ANALYSIS_POOL = AnalysisPool(
+    workers=ANALYSIS_WORKERS,
+    max_pending=int(os.getenv("IGT_ANALYSIS_MAX_PENDING", str(4 * max(1, ANALYSIS_WORKERS)))),
+    timeout=float(os.getenv("IGT_ANALYSIS_TIMEOUT", "30")),
+    initializer=_init_analysis_worker,
+)
+
+# Osobna pula dla zadań dopasowania, żeby długie dopasowania całej kohorty nie blokowały
+# interaktywnych porównań. IGT_FIT_WORKERS, IGT_FIT_MAX_JOBS, IGT_FIT_DIR (zapis wyników)
+FIT_POOL = AnalysisPool(
+    workers=int(os.getenv("IGT_FIT_WORKERS", "2")),
+    max_pending=2**31,
+    timeout=None,
+    initializer=_init_analysis_worker,
+)
+FIT_MAX_JOBS = int(os.getenv("IGT_FIT_MAX_JOBS", "2"))
+FIT_DIR = os.getenv("IGT_FIT_DIR", ".igt_fits")
+FIT_JOBS: Dict[str, "FitJobStatus"] = {}
+_background_tasks = set()
+
 # --- MODELE DANYCH ---
 DeckId = Literal["A", "B", "C", "D"]
 
@@ -47,13 +223,54 @@ class GameStateResponse(BaseModel):
     session_id: str; score: int; turn: int
     last_move: Optional[LastMove] = None; is_game_ended: bool
 
-class GameSession(BaseModel):
-    session_id: str; score: int = 2000; turn: int = 0
-    decks: Dict[DeckId, List[Tuple[int, int]]]
-    deck_counters: Dict[DeckId, int] = {"A": 0, "B": 0, "C": 0, "D": 0}
-    last_move: Optional[LastMove] = None; is_game_ended: bool = False
+# --- SESJE GRY ---
+# IGT_SESSION_BACKEND=memory|sqlite (sqlite - wspólne dla kilku workerów uvicorn), IGT_SESSION_DB - plik bazy,
+# IGT_SESSION_TTL - wygaśnięcie po tylu sekundach bez ruchu, IGT_SESSION_MAX - limit sesji (LRU)
+SESSION_STORE = create_session_store(
+    os.getenv("IGT_SESSION_BACKEND", "memory"),
+    path=os.getenv("IGT_SESSION_DB", ".igt_sessions.sqlite"),
+    max_sessions=int(os.getenv("IGT_SESSION_MAX", "10000")),
+    ttl=float(os.getenv("IGT_SESSION_TTL", "3600")),
+)
 
-game_sessions: Dict[str, GameSession] = {}
+# --- TELEMETRIA ---
+# IGT_PROFILE_THRESHOLD_MS - włącza profiler próbkujący: profile żądań dłuższych niż próg trafiają
+# do IGT_PROFILE_DIR (format "folded"); IGT_PROFILE_INTERVAL_MS - odstęp próbek
+PROFILE_THRESHOLD = float(os.environ["IGT_PROFILE_THRESHOLD_MS"]) / 1000 if os.getenv("IGT_PROFILE_THRESHOLD_MS") else None
+PROFILE_INTERVAL = float(os.getenv("IGT_PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_DIR = os.getenv("IGT_PROFILE_DIR", ".igt_profiles")
+# Pętlę zdarzeń próbkuje jeden profiler na proces (żądania dostają próbki ze swojego okna czasu,
+# więc równoległe żądania dzielą próbki); kod w workerach puli profilowany jest osobno dla żądania
+LOOP_PROFILER = WindowedSampler(interval=PROFILE_INTERVAL, prefix="main") if PROFILE_THRESHOLD is not None else None
+
+METRICS = MetricsRegistry()
+REQUEST_LATENCY = METRICS.histogram(
+    "igt_http_request_duration_seconds", "Czas obsługi żądania HTTP", ["method", "endpoint", "status"]
+)
+STAGE_LATENCY = METRICS.histogram("igt_analysis_stage_seconds", "Czas etapów analizy (Server-Timing)", ["stage"])
+PLANNER_EVALUATIONS = METRICS.histogram(
+    "igt_planner_evaluations_per_trial", "Ścieżki oceniane przez planer MPC na jedną decyzję", ["planner"],
+    buckets=(4, 16, 64, 256, 1024, 4096, 16384, 65536),
+)
+PLANNER_EVALUATIONS_TOTAL = METRICS.counter(
+    "igt_planner_evaluations_total", "Ścieżki ocenione przez planer MPC (porównania liczone od nowa)", ["planner"]
+)
+DATASET_LOADS = METRICS.counter("igt_dataset_loads_total", "Załadowania zbioru danych")
+DATASET_LOAD_SECONDS = METRICS.gauge("igt_dataset_load_seconds", "Czas ostatniego ładowania zbioru danych")
+# Liczona w /metrics przez _session_call - COUNT w SQLite może czekać na blokadę innego workera
+SESSION_GAUGE = {"active": 0}
+METRICS.callback("igt_active_game_sessions", "Aktywne sesje gry", "gauge", lambda: [((), SESSION_GAUGE["active"])])
+GAME_MOVES = METRICS.counter("igt_game_moves_total", "Ruchy graczy w grze na żywo", ["transport"])
+GAME_SOCKETS = METRICS.gauge("igt_game_websockets", "Otwarte połączenia WebSocket gry")
+if TRIAL_LOG is not None:
+    METRICS.callback("igt_trial_log_written_total", "Ruchy gry zapisane w dzienniku prób", "counter", lambda: [((), TRIAL_LOG.written)])
+    METRICS.callback("igt_trial_log_buffered", "Ruchy gry czekające w buforze dziennika", "gauge", lambda: [((), len(TRIAL_LOG))])
+METRICS.callback("igt_result_cache_requests_total", "Odczyty cache wyników porównań", "counter", lambda: [
+    (("memory",), RESULT_CACHE.hits), (("disk",), RESULT_CACHE.disk_hits), (("miss",), RESULT_CACHE.misses),
+], ["result"])
+METRICS.callback("igt_result_cache_entries", "Wpisy cache wyników w pamięci", "gauge", lambda: [((), len(RESULT_CACHE))])
+METRICS.callback("igt_analysis_pending", "Analizy w toku i w kolejce", "gauge", lambda: [((), ANALYSIS_POOL.pending)])
+METRICS.callback("igt_analysis_pool_restarts_total", "Pule analiz odtworzone po awarii procesu", "counter", lambda: [((), ANALYSIS_POOL.restarts)])
 
 class TrialData(BaseModel):
     trial: int; deck: str
@@ -76,228 +293,275 @@ class ComparisonResponse(BaseModel):
     mpc_data: List[TrialData]
     metrics: SimilarityMetrics
 
+class BatchComparisonRequest(BaseModel):
+    indices: Optional[List[int]] = None
+    source_study: Optional[str] = None
+    horizon: int = Field(2, ge=1, le=MAX_PLANNING_HORIZON)
+
+class BatchComparisonResponse(BaseModel):
+    total: int; results: List[ComparisonResponse]
+
+class CapitalBand(BaseModel):
+    trial: int; mean: float; std: float
+    q05: float; q25: float; q50: float; q75: float; q95: float
+
+class MetricDistribution(BaseModel):
+    mean: float; std: float
+    q05: float; q25: float; q50: float; q75: float; q95: float
+
+class EnsembleResponse(BaseModel):
+    subject_index: int; source_study: str
+    n_rollouts: int; seed: int; horizon: int
+    selection: Literal["softmax", "argmax"]; inverse_temperature: Optional[float]; belief_noise: float
+    human_capital: List[int]
+    capital_bands: List[CapitalBand]            # kapitał AI po każdej próbie: średnia i kwantyle
+    metrics: Dict[str, MetricDistribution]     # rozkład każdej metryki SimilarityMetrics
+
+MAX_ENSEMBLE_ROLLOUTS = 2000
+
+class BlockProportions(BaseModel):
+    block: int; first_trial: int; trials: int
+    proportions: List[float]  # udział talii A, B, C, D wśród prób bloku
+    good_deck_ratio: float    # C + D
+
+class CohortAggregate(BaseModel):
+    source_study: str; subjects: int; mean_trials: float
+    blocks: List[BlockProportions]
+    good_deck_ratio: float
+    learning_curve: List[float]   # średni kapitał po każdej próbie
+    curve_subjects: List[int]     # ilu badanych ma daną próbę
+    metrics: Dict[str, MetricDistribution]
+
+class AggregatesResponse(BaseModel):
+    block_size: int; horizon: int; groups: List[CohortAggregate]
+
+class SimilarSubject(BaseModel):
+    subject_index: int; source_study: str; total_trials: int
+    distance: float  # odległość euklidesowa sygnatur zachowania
+
+class SimilarSubjectsResponse(BaseModel):
+    subject_index: int; source_study: str
+    method: Literal["flat", "ivf"]
+    neighbours: List[SimilarSubject]
+
+MAX_SIMILAR = 100
+
+class AgentModelInfo(BaseModel):
+    name: str; description: str
+    params: Dict[str, float]  # wartości domyślne
+    bounds: Dict[str, List[Optional[float]]]  # [min, max] parametru, None = bez ograniczenia
+
+class ModelFit(BaseModel):
+    params: Dict[str, float]
+    log_likelihood: float; aic: float; bic: float
+
+class SubjectModelFits(BaseModel):
+    subject_index: int; source_study: str
+    n_trials: int               # ocenione wybory (bez talii "?")
+    fits: Dict[str, ModelFit]
+    best_model: str             # najniższe BIC
+
+class ModelSummary(BaseModel):
+    model: str; n_params: int
+    total_aic: float; total_bic: float
+    best_subjects: int          # u ilu badanych model ma najniższe BIC
+
+class ModelComparisonResponse(BaseModel):
+    models: List[str]; horizon: int
+    summary: List[ModelSummary]
+    subjects: List[SubjectModelFits]
+
+# --- CACHE WYNIKÓW PORÓWNAŃ ---
+# Wyniki w układzie kolumnowym (payloads.comparison), kodowane do formatu odpowiedzi przy wysyłce.
+# IGT_CACHE_MAX_ENTRIES / IGT_CACHE_MAX_BYTES - limity LRU w pamięci,
+# IGT_CACHE_DIR - opcjonalny katalog na dysku, IGT_CACHE_NAMESPACE_TTL - po ilu sekundach bez użycia
+# usuwamy z dysku wpisy innej wersji danych, IGT_CACHE_WARMUP=1 - prekomputacja po załadowaniu danych
+RESULT_CACHE = ResultCache(
+    dumps=payloads.dumps,
+    loads=payloads.load_comparison,
+    max_entries=int(os.getenv("IGT_CACHE_MAX_ENTRIES", "1024")),
+    max_bytes=int(os.environ["IGT_CACHE_MAX_BYTES"]) if os.getenv("IGT_CACHE_MAX_BYTES") else None,
+    disk_dir=os.getenv("IGT_CACHE_DIR") or None,
+    namespace_ttl=float(os.getenv("IGT_CACHE_NAMESPACE_TTL", "3600")),
+)
+CACHE_WARMUP = os.getenv("IGT_CACHE_WARMUP", "0") == "1"
+
+# --- EKSPORT ---
+# IGT_EXPORT_DIR - katalog plików zapisywanych przez /analysis/export?output=...
+EXPORT_DIR = os.getenv("IGT_EXPORT_DIR", ".igt_exports")
+EXPORT_RETRY_DELAY = 0.5
+
+class FitJobRequest(BaseModel):
+    indices: Optional[List[int]] = None
+    source_study: Optional[str] = None
+    objective: FitObjective = "match"
+    method: FitMethod = "grid"
+    successive_halving: bool = False
+    eta: int = Field(3, ge=2)
+    horizon: int = Field(2, ge=1, le=MAX_PLANNING_HORIZON)
+    grid: Optional[Dict[str, List[float]]] = None  # nadpisuje wybrane osie siatki domyślnej
+
+class SubjectFit(BaseModel):
+    subject_index: int; params: Dict[str, float]; score: float; evaluations: int
+
+class FitJobStatus(BaseModel):
+    job_id: str
+    status: Literal["queued", "running", "finished", "failed", "interrupted"]
+    request: FitJobRequest
+    total: int; completed: int = 0
+    created_at: float; finished_at: Optional[float] = None
+    error: Optional[str] = None
+    results: List[SubjectFit] = []
+
+class FitJobSummary(BaseModel):
+    job_id: str; status: str; total: int; completed: int; created_at: float
+
 class SubjectListElement(BaseModel):
     index: int; source_study: str; total_trials: int
 
 class AnalysisResponse(BaseModel):
     total_subjects: int; subjects_list: List[SubjectListElement]
+    total_matching: int; next_cursor: Optional[int] = None
 
-def _get_standard_scheme_cards(deck_id: str, start_index: int, count: int) -> List[Tuple[int, int]]:
-    # Deck A Losses (40 trials sequence)
-    # T3=-150, T5=-300, T7=-200, T9=-250, T10=-350, T12=-350, T14=-250, T15=-200
-    # T17=-300, T18=-150, T22=-300, T24=-350, T26=-200, T27=-250, T28=-150
-    # T31=-350, T32=-200, T33=-250, T37=-150, T38=-300
-    A_losses = [0] * 40
-    for idx, val in [
-        (3, -150), (5, -300), (7, -200), (9, -250), (10, -350), 
-        (12, -350), (14, -250), (15, -200), (17, -300), (18, -150),
-        (22, -300), (24, -350), (26, -200), (27, -250), (28, -150),
-        (31, -350), (32, -200), (33, -250), (37, -150), (38, -300)
-    ]:
-        A_losses[idx-1] = val 
-
-    # Deck B Losses (40 trials sequence)
-    # T9=-1250, T14=-1250, T21=-1250, T32=-1250
-    B_losses = [0] * 40
-    for idx, val in [(9, -1250), (14, -1250), (21, -1250), (32, -1250)]:
-        B_losses[idx-1] = val
-
-    # Deck C Losses (40 trials sequence)
-    # T3=-50, T5=-50, T7=-50, T9=-50, T10=-50, T12=-25, T13=-75, T17=-25, T18=-75
-    # T20=-50, T24=-50, T25=-25, T26=-50, T29=-75, T30=-50, T34=-25, T35=-25
-    # T37=-75, T39=-50, T40=-75
-    C_losses = [0] * 40
-    for idx, val in [
-        (3, -50), (5, -50), (7, -50), (9, -50), (10, -50), (12, -25), (13, -75),
-        (17, -25), (18, -75), (20, -50), (24, -50), (25, -25), (26, -50),
-        (29, -75), (30, -50), (34, -25), (35, -25), (37, -75), (39, -50), (40, -75)
-    ]:
-        C_losses[idx-1] = val
-
-    # Deck D Losses (40 trials sequence)
-    # T10=-250, T20=-250, T29=-250, T35=-250
-    D_losses = [0] * 40
-    for idx, val in [(10, -250), (20, -250), (29, -250), (35, -250)]:
-        D_losses[idx-1] = val
-
-    schemes = {
-        "A": [(100, l) for l in A_losses],
-        "B": [(100, l) for l in B_losses],
-        "C": [(50, l) for l in C_losses],
-        "D": [(50, l) for l in D_losses],
-    }
-    
-    source_seq = schemes.get(deck_id, [(0,0)])
-    seq_len = len(source_seq)
-    
-    result = []
-    for i in range(count):
-        curr_idx = (start_index + i) % seq_len
-        result.append(source_seq[curr_idx])
-        
-    return result
+SUBJECTS_PAGE_LIMIT = 5000
 
-def _reconstruct_environment_from_human(c_row, w_row, l_row) -> Dict[str, List[Tuple[int, int]]]:
-    deck_map_inv = {1: "A", 2: "B", 3: "C", 4: "D"}
-    
-    human_cards = {"A": [], "B": [], "C": [], "D": []}
-    
-    for i in range(len(c_row)):
-        c = c_row.get(i)
-        if pd.isna(c): continue
-        d_char = deck_map_inv.get(int(c))
-        if d_char:
-            w = int(w_row.get(i)) if not pd.isna(w_row.get(i)) else 0
-            l = int(l_row.get(i)) if not pd.isna(l_row.get(i)) else 0
-            human_cards[d_char].append((w, l))
-            
-    ai_decks = {}
-    max_trials = 150
-    
-    for d_char in ["A", "B", "C", "D"]:
-        real_segment = human_cards[d_char]
-        already_drawn = len(real_segment)
-        
-        needed = max_trials - already_drawn
-        if needed > 0:
-            filler_segment = _get_standard_scheme_cards(d_char, already_drawn, needed)
-            ai_decks[d_char] = real_segment + filler_segment
-        else:
-            ai_decks[d_char] = real_segment[:max_trials]
-            
-    return ai_decks
+# --- ŁADOWANIE DANYCH ---
 
-class ReplayedEnvironment:
-    def __init__(self, reconstructed_decks):
-        self.decks = reconstructed_decks
-        self.counters = {"A": 0, "B": 0, "C": 0, "D": 0}
-        
-    def step(self, deck_id):
-        idx = self.counters[deck_id]
-        if idx >= len(self.decks[deck_id]):
-            idx = 0
-        gain, loss = self.decks[deck_id][idx]
-        self.counters[deck_id] += 1
-        return gain, loss, gain + loss
-
-class StochasticMPCAgent:
-    def __init__(self, strategy: str = "optimal"):
-        self.deck_ids = ["A", "B", "C", "D"]
-        self.strategy = strategy
-        
-        self.means = np.zeros(4)
-        self.variances = np.ones(4) * 1000 
-        self.counts = np.zeros(4) 
-        self.history = {d: [] for d in self.deck_ids}
-        
-        self.loss_aversion = 4.9 if strategy == "human" else 1.0
-        self.learning_rate = 0.3 if strategy == "human" else None
-        
-        self.planning_horizon = 2
-        self.info_value_weight = 0.8 # ciekawosc
+def _ensure_data_loaded():
+    sources = _data_sources()
+    source_stats = source_signature(sources)
+    if DATA_STORE["choices"] is not None and DATA_STORE["source_stats"] == source_stats: return
 
-        # self.loss_aversion = 0.9 if strategy == "human" else 1.0
-        # self.learning_rate = 0.3 if strategy == "human" else None
-        
-        # self.planning_horizon = 3
-        # self.info_value_weight = 2 # ciekawosc
+    with _DATA_LOCK:
+        if DATA_STORE["choices"] is not None and DATA_STORE["source_stats"] == source_stats: return
+        previous = DATA_STORE["fingerprint"]
+        start = time.perf_counter()
+        with stage("load"):
+            dataset = load_or_build_dataset(
+                DATASET_CACHE_DIR, sources, _parse_data_sources, _derive_arrays, _update_data_sources,
+            )
+        if dataset is None: raise HTTPException(404, "Nie znaleziono danych.")
+        DATA_STORE.update(dataset)
+        DATA_STORE.update(_subject_index(dataset))
+        DATA_STORE["source_stats"] = source_stats
+        if not _IS_ANALYSIS_WORKER:
+            # Indeks uzupełniamy tylko o nowych i zmienionych badanych
+            SIMILARITY_INDEX.sync(DATA_STORE["signatures"])
+        DATASET_LOADS.inc()
+        DATASET_LOAD_SECONDS.set(time.perf_counter() - start)
+        fingerprint = DATA_STORE["fingerprint"]
+        # Ten sam odcisk = zmieniły się tylko pliki (np. ruchy niedokończonych gier), dane nie
+        if fingerprint == previous: return
+        print(f"Baza gotowa. {len(DATA_STORE['meta'])} badanych.")
 
-    def select_action(self):
+    RESULT_CACHE.set_namespace(fingerprint)
+    if CACHE_WARMUP and not _IS_ANALYSIS_WORKER:
+        threading.Thread(target=_warm_result_cache, args=(fingerprint,), daemon=True).start()
 
-        best_first_action = self.deck_ids[0]
-        best_path_value = -float('inf')
+def _subject_index(dataset: dict) -> dict:
+    """Liczby prób i kody etykiet badań - jednym przebiegiem po macierzach."""
+    labels, codes = np.unique(np.asarray(dataset["meta"], dtype=object).astype(str), return_inverse=True)
+    studies, study_of_label = np.unique([_study_of(label) for label in labels], return_inverse=True)
+    study_codes = study_of_label[codes]
+    return {
+        "trial_counts": (np.asarray(dataset["choices"]) != MISSING_CHOICE).sum(axis=1),
+        "meta_labels": labels.tolist(), "meta_codes": codes,
+        "study_labels": studies.tolist(), "study_codes": study_codes,
+        "study_digests": {
+            study: _group_digest(np.flatnonzero(study_codes == code), dataset["row_digests"])
+            for code, study in enumerate(studies.tolist())
+        },
+    }
 
-        trajectories = itertools.product(range(4), repeat=self.planning_horizon)
+def _group_digest(rows: np.ndarray, row_digests: np.ndarray) -> str:
+    """Skrót wierszy grupy i ich prób - ze skrótów wierszy, bez ponownego czytania macierzy prób."""
+    digest = hashlib.sha1(rows.tobytes())
+    digest.update(np.ascontiguousarray(row_digests[rows]).tobytes())
+    return digest.hexdigest()
 
-        for path in trajectories:
-            sim_means = self.means.copy()
-            sim_vars = self.variances.copy()
-            sim_counts = self.counts.copy()
-            
-            cumulative_utility = 0
-            
-            for deck_idx in path:
-                expected_reward = sim_means[deck_idx]
-                
-                info_gain = np.sqrt(sim_vars[deck_idx])
-                
-                step_value = expected_reward + (self.info_value_weight * info_gain)
-                cumulative_utility += step_value
-                
-                sim_counts[deck_idx] += 1
-                n = max(1, sim_counts[deck_idx])
-                
-                sim_vars[deck_idx] *= (n / (n + 1)) 
+def _study_of(meta: str) -> str:
+    # Badani z plików w formacie długim i gier na żywo mają etykietę "<badanie> <id>"
+    for prefix in sorted({source.label for source in LONG_FORMAT_SOURCES} | {LIVE_GAME_LABEL}, key=len, reverse=True):
+        if meta.startswith(prefix + " "):
+            return prefix
+    return meta
 
-            if cumulative_utility > best_path_value:
-                best_path_value = cumulative_utility
-                best_first_action = self.deck_ids[path[0]]
+def _load_data_on_startup():
+    try:
+        _ensure_data_loaded()
+        DATA_STATUS["error"] = None
+    except Exception as e:
+        DATA_STATUS["error"] = str(getattr(e, "detail", e))
+        print(f"Błąd ładowania danych: {DATA_STATUS['error']}")
 
-        return best_first_action
+async def _require_data():
+    # W wątku - ewentualne przeładowanie po zmianie plików nie blokuje pętli zdarzeń
+    await asyncio.to_thread(_ensure_data_loaded)
 
-    def update_model(self, deck_id, net_result):
-        idx = self.deck_ids.index(deck_id)
-        self.counts[idx] += 1
-        
-        gain = 100 if deck_id in ["A", "B"] else 50
-        real_loss = gain - net_result
-        utility = gain - (real_loss * self.loss_aversion)
-        
-        self.history[deck_id].append(utility)
-        current_data = self.history[deck_id]
-        
-        if self.strategy == "optimal":
-            self.means[idx] = np.mean(current_data)
-            if len(current_data) > 1:
-                self.variances[idx] = np.var(current_data, ddof=1)
-            else:
-                self.variances[idx] = 1000
-        else:
-            old_mean = self.means[idx]
-            self.means[idx] = old_mean + self.learning_rate * (utility - old_mean)
-            if len(current_data) > 1:
-                window = current_data[-20:]
-                self.variances[idx] = np.var(window, ddof=1) if len(window) > 1 else 1000
-            else:
-                self.variances[idx] = 1000
+async def _run_analysis(fn, *args):
+    start = time.perf_counter()
+    try:
+        result, stages, samples = await ANALYSIS_POOL.run(_timed_job, fn, PROFILE_THRESHOLD is not None, *args)
+    except QueueFullError:
+        raise HTTPException(429, "Zbyt wiele analiz w kolejce, spróbuj ponownie", headers={"Retry-After": "1"})
+    except PoolBrokenError:
+        raise HTTPException(503, "Awaria procesu analiz, spróbuj ponownie", headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        raise HTTPException(504, "Przekroczono limit czasu analizy")
+    timer = current_timer()
+    if timer is not None:
+        # Etapy zmierzone w workerze + czas oczekiwania w kolejce i przesyłania wyniku
+        timer.merge(stages, samples)
+        timer.add("queue", max(0.0, time.perf_counter() - start - sum(stages.values())))
+    return result
 
-# --- ŁADOWANIE DANYCH ---
+def _timed_job(fn, profile: bool, *args):
+    """Uruchamiane w workerze: wynik `fn(*args)`, czasy jego etapów i (opcjonalnie) próbki profilera."""
+    timer = StageTimer()
+    with use_timer(timer):
+        if not profile:
+            return fn(*args), timer.stages, {}
+        with SamplingProfiler(interval=PROFILE_INTERVAL, prefix="worker") as profiler:
+            result = fn(*args)
+    return result, timer.stages, dict(profiler.samples)
 
-def _load_cannabis_data() -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, List[str]]:
-    if not os.path.exists("cannabis_raw.txt"):
-        return None, None, None, []
-    
-    print("Wykryto cannabis_raw.txt - przetwarzanie...")
-    try:
-        df = pd.read_csv("cannabis_raw.txt", sep=r'\s+', engine='python')
-        required = ['subjID', 'trial', 'deck', 'gain', 'loss']
-        if not all(col in df.columns for col in required):
-            return None, None, None, []
-
-        c_pivot = df.pivot(index='subjID', columns='trial', values='deck')
-        w_pivot = df.pivot(index='subjID', columns='trial', values='gain')
-        l_pivot = df.pivot(index='subjID', columns='trial', values='loss')
-        
-        # Konwersja strat na ujemne
-        l_pivot = -l_pivot.abs()
-        
-        meta_list = [f"Cannabis User {sid}" for sid in c_pivot.index]
-        
-        # Reset indeksów
-        for p in [c_pivot, w_pivot, l_pivot]:
-            p.reset_index(drop=True, inplace=True)
-            p.columns = range(p.shape[1])
-        
-        print(f" -> Załadowano {len(c_pivot)} użytkowników konopii.")
-        return c_pivot, w_pivot, l_pivot, meta_list
-    except Exception as e:
-        print(f"Błąd cannabis_raw.txt: {e}")
-        return None, None, None, []
+def _derive_arrays(arrays: Dict[str, np.ndarray], previous: Optional[dict] = None, changed=None) -> Dict[str, np.ndarray]:
+    # Środowiska i sygnatury wszystkich badanych liczone raz, przy kompilacji danych;
+    # po dołączeniu nowych prób - tylko zmienionych badanych
+    builders = {"replay_decks": build_replay_decks, "signatures": _behaviour_signatures, "row_digests": _row_digests}
+    if previous is None:
+        return {name: build(arrays["choices"], arrays["wins"], arrays["losses"]) for name, build in builders.items()}
+    derived = {}
+    for name, build in builders.items():
+        rebuilt = build(arrays["choices"][changed], arrays["wins"][changed], arrays["losses"][changed])
+        kept = previous[name]
+        values = np.empty((len(arrays["choices"]),) + kept.shape[1:], dtype=np.result_type(kept.dtype, rebuilt.dtype))
+        values[:len(kept)] = kept
+        values[changed] = rebuilt
+        derived[name] = values
+    return derived
 
-def _ensure_data_loaded():
-    if DATA_STORE["choices"] is not None: return
+def _behaviour_signatures(choices, wins, losses, chunk_size: int = 4096) -> np.ndarray:
+    parts = [np.zeros((0, SIGNATURE_SIZE), dtype=np.float32)]
+    for start in range(0, len(choices), chunk_size):
+        rows = slice(start, start + chunk_size)
+        human = _human_trial_arrays(choices[rows], wins[rows], losses[rows])
+        parts.append(behaviour_signatures(human["deck"], human["net"], human["total_score"], human["lengths"]))
+    return np.concatenate(parts)
+
+def _row_digests(choices, wins, losses, chunk_size: int = 4096) -> np.ndarray:
+    digests = np.zeros((len(choices), 20), dtype=np.uint8)
+    for start in range(0, len(choices), chunk_size):
+        rows = slice(start, start + chunk_size)
+        # Stałe typy - skrót nie zależy od tego, czy wins/losses zapisano jako int16 czy int32
+        trials = np.concatenate([np.asarray(m[rows], dtype=np.int32) for m in (choices, wins, losses)], axis=1)
+        for offset, row in enumerate(trials):
+            digests[start + offset] = np.frombuffer(hashlib.sha1(row.tobytes()).digest(), dtype=np.uint8)
+    return digests
 
-    list_choices, list_wins, list_losses, list_meta = [], [], [], []
+def _parse_data_sources() -> Optional[Tuple[Dict[str, np.ndarray], List[str], dict]]:
+    static = source_signature(STATIC_SOURCES)
+    parts, list_meta = [], []
 
     # 1. RData
     file_path = "IGTdata.rdata"
@@ -310,246 +574,1001 @@ def _ensure_data_loaded():
         
         for nm, kc, kw, kl in studies:
             if kc in r_objects:
-                c, w, l = r_objects[kc].copy(), r_objects[kw].copy(), r_objects[kl].copy()
-                c.columns = range(c.shape[1]); w.columns = range(w.shape[1]); l.columns = range(l.shape[1])
-                list_choices.append(c); list_wins.append(w); list_losses.append(l)
-                list_meta.extend([f"Study {nm}"]*len(c))
+                parts.append(compact_trials(r_objects[kc], r_objects[kw], r_objects[kl]))
+                list_meta.extend([f"Study {nm}"]*len(r_objects[kc]))
 
-    # 2. Cannabis
-    c_can, w_can, l_can, m_can = _load_cannabis_data()
-    if c_can is not None:
-        list_choices.append(c_can); list_wins.append(w_can); list_losses.append(l_can); list_meta.extend(m_can)
+    # 2. Logi w formacie długim (Cannabis, HC, ...) i ukończone gry na żywo - dopisywane za RData
+    base = stack_trials(parts) if parts else {
+        "choices": np.zeros((0, 0), dtype=np.int8), "wins": np.zeros((0, 0), dtype=np.int16),
+        "losses": np.zeros((0, 0), dtype=np.int16),
+    }
+    matrices = TrialMatrices(base, list_meta)
+    state = {"static": static, "long_format": ingest_long_format(LONG_FORMAT_SOURCES, matrices)}
+    if TRIAL_LOG_PATH:
+        state["trial_log"] = ingest_trial_log(TRIAL_LOG_PATH, LIVE_GAME_LABEL, matrices, abandon_after=SESSION_STORE.ttl)
 
     # 3. CSV Fallback
-    if not list_choices:
+    if not matrices.meta:
         if os.path.exists("choice_95.csv"):
              df = pd.read_csv("choice_95.csv")
              numeric = [c for c in df.columns if "choice" in str(c).lower()]
              if numeric: df = df[numeric]
-             df.columns = range(df.shape[1])
-             DATA_STORE["choices"] = df
-             DATA_STORE["wins"] = pd.DataFrame(np.zeros(df.shape), columns=df.columns)
-             DATA_STORE["losses"] = pd.DataFrame(np.zeros(df.shape), columns=df.columns)
-             DATA_STORE["meta"] = ["csv_import"] * len(df)
-             return
-        raise HTTPException(404, "Nie znaleziono danych.")
-
-    DATA_STORE["choices"] = pd.concat(list_choices, ignore_index=True)
-    DATA_STORE["wins"] = pd.concat(list_wins, ignore_index=True)
-    DATA_STORE["losses"] = pd.concat(list_losses, ignore_index=True)
-    DATA_STORE["meta"] = list_meta
-    print(f"Baza gotowa. {len(DATA_STORE['meta'])} badanych.")
+             zeros = np.zeros(df.shape)
+             return compact_trials(df, zeros, zeros), ["csv_import"] * len(df), {"static": static, "fallback": True}
+        return None
+
+    return matrices.arrays(), matrices.meta, state
+
+def _update_data_sources(dataset: dict, state: Optional[dict]):
+    """Przyrost: nowe linie i pliki w formacie długim, nowe ukończone gry. Zmiana RData/CSV -> pełna przebudowa (None)."""
+    if not state or state.get("fallback") or state["static"] != source_signature(STATIC_SOURCES):
+        return None
+    if bool(TRIAL_LOG_PATH) != ("trial_log" in state):
+        return None
+    matrices = TrialMatrices(dataset, dataset["meta"])
+    updated = {**state, "long_format": ingest_long_format(LONG_FORMAT_SOURCES, matrices, state["long_format"])}
+    if TRIAL_LOG_PATH:
+        updated["trial_log"] = ingest_trial_log(
+            TRIAL_LOG_PATH, LIVE_GAME_LABEL, matrices, state["trial_log"], abandon_after=SESSION_STORE.ttl,
+        )
+    if any(value is None for value in updated.values()):
+        return None
+    return matrices.arrays(), matrices.meta, updated, matrices.changed()
+
+def _subject_rows(subject_index: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    return (
+        DATA_STORE["choices"][subject_index],
+        DATA_STORE["wins"][subject_index],
+        DATA_STORE["losses"][subject_index],
+    )
+
+def _human_trial_arrays(choices, wins, losses) -> Dict[str, np.ndarray]:
+    """Ważne próby badanych (macierze badani x próby) przesunięte do lewej.
+
+    deck: 0..3 = A..D, 4 = nieznana talia ("?"); `lengths` - liczba ważnych prób w wierszu.
+    """
+    choices = np.asarray(choices)
+    valid = choices != MISSING_CHOICE
+    order = np.argsort(~valid, axis=1, kind="stable")
+    lengths = valid.sum(axis=1)
+    # Szerokość = najdłuższy wiersz, tak jak trajektorie BatchSimulator
+    order = order[:, :int(lengths.max(initial=0))]
+    packed = np.arange(order.shape[1]) < lengths[:, None]
+
+    c = np.take_along_axis(choices, order, axis=1).astype(np.int64)
+    win = np.where(packed, np.take_along_axis(np.asarray(wins), order, axis=1), 0).astype(np.int64)
+    loss = np.where(packed, np.take_along_axis(np.asarray(losses), order, axis=1), 0).astype(np.int64)
+    net = win + loss
+    return {
+        "trial": order + 1, "deck": np.where((c >= 1) & (c <= 4), c - 1, 4), "win": win, "loss": loss,
+        "net": net, "total_score": 2000 + np.cumsum(net, axis=1), "lengths": lengths,
+    }
+
+def _matches_study(meta: str, source_study: str) -> bool:
+    # "Cannabis User" pasuje do "Cannabis User 201", "Study 1" nie pasuje do "Study 100"
+    return meta == source_study or meta.startswith(source_study + " ")
+
+def _study_mask(source_study: str) -> np.ndarray:
+    """Maska badanych z danego badania - dopasowanie liczone raz na etykietę, nie na badanego."""
+    matched = np.array([_matches_study(label, source_study) for label in DATA_STORE["meta_labels"]], dtype=bool)
+    return matched[DATA_STORE["meta_codes"]]
+
+def _select_subjects(indices: Optional[List[int]], source_study: Optional[str]) -> List[int]:
+    total = len(DATA_STORE["choices"])
+    selected = list(range(total)) if indices is None else indices
+    if any(i < 0 or i >= total for i in selected): raise HTTPException(404, "Zły indeks")
+    if source_study is not None:
+        mask = _study_mask(source_study)
+        selected = [i for i in selected if mask[i]]
+    return selected
+
+def _simulate_subjects(indices: List[int], horizon: int = 2):
+    """Symulacja AI dla wielu badanych jednym przebiegiem `BatchSimulator`."""
+    choices = DATA_STORE["choices"][indices]
+
+    first = choices[:, 0] if choices.shape[1] else np.zeros(len(indices), dtype=int)
+    first_actions = np.where(np.isin(first, [1, 2, 3, 4]), first - 1, 0)
+    with stage("reconstruct"):
+        decks = DATA_STORE["replay_decks"][indices]
+    simulator = BatchSimulator(
+        decks,
+        n_trials=(choices != MISSING_CHOICE).sum(axis=1),
+        first_actions=first_actions,
+        strategy="human",
+        planning_horizon=horizon,
+    )
+    with stage("simulate"):
+        return simulator.run()
+
+def _ai_columns_from_batch(trajectories, row: int) -> Dict[str, list]:
+    arrays = {
+        "trial": np.broadcast_to(np.arange(1, trajectories.actions.shape[1] + 1), trajectories.actions.shape),
+        "deck": trajectories.actions, "win": trajectories.gains, "loss": trajectories.losses,
+        "net": trajectories.nets, "total_score": trajectories.totals,
+    }
+    return payloads.trial_columns(arrays, row, int(trajectories.n_trials[row]))
 
 # --- ENDPOINTY ---
 
+@app.get("/health/ready")
+async def readiness():
+    if DATA_STORE["choices"] is None:
+        detail = DATA_STATUS["error"] or "Dane są jeszcze ładowane"
+        raise HTTPException(503, detail)
+    return {
+        "status": "ready",
+        "subjects": len(DATA_STORE["meta"]),
+        "analysis_pending": ANALYSIS_POOL.pending,
+        "analysis_capacity": ANALYSIS_POOL.max_pending,
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    SESSION_GAUGE["active"] = await _session_call(len, SESSION_STORE)
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/analysis/subjects", response_model=AnalysisResponse)
-async def get_subjects_list():
-    _ensure_data_loaded()
-    limit = min(len(DATA_STORE["choices"]), 5000)
-    subs = [SubjectListElement(index=i, source_study=DATA_STORE["meta"][i], total_trials=int(DATA_STORE["choices"].iloc[i].count())) for i in range(limit)]
-    return AnalysisResponse(total_subjects=len(DATA_STORE["choices"]), subjects_list=subs)
+async def get_subjects_list(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(SUBJECTS_PAGE_LIMIT, ge=1, le=SUBJECTS_PAGE_LIMIT),
+    cursor: Optional[int] = Query(None, ge=0),
+    source_study: Optional[str] = None,
+    min_trials: Optional[int] = Query(None, ge=0),
+    max_trials: Optional[int] = Query(None, ge=0),
+    if_none_match: Optional[str] = Header(None),
+):
+    await _require_data()
+    # Odpowiedź zależy tylko od wersji danych i parametrów - ETag bez budowania listy
+    query = json.dumps([offset, limit, cursor, source_study, min_trials, max_trials])
+    etag = f'"{DATA_STORE["fingerprint"]}-{hashlib.sha1(query.encode()).hexdigest()[:16]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match is not None and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    # cursor = indeks badanego, od którego zaczyna się strona (next_cursor z poprzedniej strony)
+    counts = DATA_STORE["trial_counts"]
+    mask = np.ones(len(counts), dtype=bool)
+    if source_study is not None: mask &= _study_mask(source_study)
+    if min_trials is not None: mask &= counts >= min_trials
+    if max_trials is not None: mask &= counts <= max_trials
+    if cursor is not None: mask[:cursor] = False
+
+    matching = np.flatnonzero(mask)
+    page = matching[offset:offset + limit]
+    next_cursor = int(page[-1]) + 1 if offset + limit < len(matching) else None
+
+    meta = DATA_STORE["meta"]
+    body = {
+        "total_subjects": len(counts),
+        "total_matching": len(matching),
+        "next_cursor": next_cursor,
+        "subjects_list": [
+            {"index": i, "source_study": meta[i], "total_trials": n}
+            for i, n in zip(page.tolist(), counts[page].tolist())
+        ],
+    }
+    return Response(json.dumps(body), media_type="application/json", headers=headers)
 
 @app.get("/analysis/compare/{subject_index}", response_model=ComparisonResponse)
-async def compare_subject(subject_index: int):
-    _ensure_data_loaded()
+async def compare_subject(
+    request: Request,
+    subject_index: int,
+    horizon: int = Query(2, ge=1, le=MAX_PLANNING_HORIZON),
+    planner: PlannerName = "counts",
+    loss_aversion: Optional[float] = Query(None, ge=0),
+    learning_rate: Optional[float] = Query(None, gt=0, le=1),
+    info_value_weight: Optional[float] = Query(None, ge=0),
+    model: str = "mpc",
+    format: Optional[ResponseFormat] = None,
+    accept: Optional[str] = Header(None),
+):
+    """Człowiek vs agent. `model` - model z rejestru (/analysis/models); modele inne niż "mpc"
+    grają deterministycznie (talia o najwyższej wartości) na parametrach domyślnych lub podanych
+    w zapytaniu pod nazwami z /analysis/models (np. ?model=ev&attention=0.3).
+    `format` (albo nagłówek Accept) - układ odpowiedzi, patrz payloads.py."""
+    response_format = _response_format(format, accept)
+    with stage("data"):
+        await _require_data()
     c_df = DATA_STORE["choices"]
     if subject_index < 0 or subject_index >= len(c_df): raise HTTPException(404, "Zły indeks")
-    
+    if planner == "enumerate" and horizon > MAX_ENUMERATE_HORIZON:
+        raise HTTPException(400, f"Enumerator obsługuje horyzont co najwyżej {MAX_ENUMERATE_HORIZON}")
+    if model not in MODELS: raise HTTPException(400, f"Nieznany model: {model}")
+
+    # Np. parametry dopasowane przez /fitting/jobs
+    params = {"loss_aversion": loss_aversion, "learning_rate": learning_rate, "info_value_weight": info_value_weight}
+    if model != "mpc":
+        model_params = {k: v for k, v in params.items() if v is not None}
+        for name, value in request.query_params.items():
+            if name in COMPARE_QUERY_PARAMS: continue
+            try:
+                model_params[name] = float(value)
+            except ValueError:
+                raise HTTPException(400, f"Parametr {name} musi być liczbą")
+        return await _compare_with_model(subject_index, model, model_params, response_format)
+    key = _comparison_cache_key(subject_index, horizon, planner, params)
+    with stage("cache"):
+        result = RESULT_CACHE.get(key)
+    if result is None:
+        result = await _run_analysis(_comparison_job, subject_index, horizon, planner, params)
+        with stage("cache"):
+            RESULT_CACHE.put(key, result)
+        _record_planner_evaluations(planner, horizon, len(result["mpc"]["trial"]))
+    return _comparison_response([result], response_format)
+
+def _response_format(format: Optional[str], accept: Optional[str]) -> str:
+    response_format = payloads.negotiate(format, accept)
+    if response_format == "arrow" and payloads.pa is None:
+        raise HTTPException(406, "Format arrow wymaga pakietu pyarrow")
+    return response_format
+
+def _comparison_response(results: List[dict], response_format: str, batch: bool = False) -> Response:
+    with stage("serialize"):
+        body = payloads.encode(results, response_format, batch)
+    return Response(body, media_type=payloads.MEDIA_TYPES[response_format])
+
+# Parametry zapytania obsługiwane przez samo /analysis/compare - pozostałe to parametry modelu
+COMPARE_QUERY_PARAMS = {"horizon", "planner", "loss_aversion", "learning_rate", "info_value_weight", "model", "format"}
+
+async def _compare_with_model(subject_index: int, model: str, params: dict, response_format: str) -> Response:
+    try:
+        create_model(model).parameters(params, 1)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    key = (subject_index, model, tuple(sorted(params.items())), DATA_STORE["fingerprint"])
+    with stage("cache"):
+        result = RESULT_CACHE.get(key)
+    if result is None:
+        result = await _run_analysis(_model_comparison_job, subject_index, model, params)
+        with stage("cache"):
+            RESULT_CACHE.put(key, result)
+    return _comparison_response([result], response_format)
+
+def _model_comparison_job(subject_index: int, model: str, params: dict) -> dict:
+    _ensure_data_loaded()
+    indices = [subject_index]
+    agent = create_model(model)
+    with stage("human"):
+        human = _human_trial_arrays(*(values[None] for values in _subject_rows(subject_index)))
+    first = DATA_STORE["choices"][subject_index, :1]
+    with stage("simulate"):
+        trajectories = agent.simulate(
+            DATA_STORE["replay_decks"][indices], human["lengths"],
+            np.where(np.isin(first, [1, 2, 3, 4]), first - 1, 0), agent.parameters(params, 1),
+        )
+    with stage("metrics"):
+        metrics = similarity_metrics(
+            human["deck"], human["net"], human["total_score"],
+            trajectories.actions, trajectories.nets, trajectories.totals, lengths=human["lengths"],
+        )
+    return _comparison_responses(indices, trajectories, human, metrics)[0]
+
+def _record_planner_evaluations(planner: str, horizon: int, trials: int):
+    # Pierwszy ruch agenta jest kopiowany od człowieka - planer decyduje od drugiej próby
+    per_trial = planner_evaluations(horizon, planner)
+    PLANNER_EVALUATIONS.observe(per_trial, planner)
+    PLANNER_EVALUATIONS_TOTAL.inc(planner, amount=per_trial * max(0, trials - 1))
+
+def _comparison_cache_key(subject_index: int, horizon: int, planner: str, params: Optional[dict] = None) -> tuple:
+    agent = StochasticMPCAgent(strategy="human", planning_horizon=horizon, planner=planner, **(params or {}))
+    return (
+        subject_index, agent.strategy, agent.loss_aversion, agent.learning_rate,
+        agent.info_value_weight, agent.planning_horizon, agent.planner, DATA_STORE["fingerprint"],
+    )
+
+def _comparison_job(subject_index: int, horizon: int, planner: str, params: Optional[dict] = None) -> dict:
+    _ensure_data_loaded()
+    return _run_comparison(subject_index, horizon, planner, params)
+
+def _run_comparison(subject_index: int, horizon: int, planner: str, params: Optional[dict] = None) -> dict:
     # 1. Dane człowieka
-    c_row = c_df.iloc[subject_index]
-    w_row = DATA_STORE["wins"].iloc[subject_index] if DATA_STORE["wins"] is not None else pd.Series([0]*len(c_row))
-    l_row = DATA_STORE["losses"].iloc[subject_index] if DATA_STORE["losses"] is not None else pd.Series([0]*len(c_row))
-    
-    human_history = []
-    current_score = 2000
+    c_row, w_row, l_row = _subject_rows(subject_index)
+    with stage("human"):
+        human = _human_trial_arrays(c_row[None], w_row[None], l_row[None])
+        valid_trials_count = int(human["lengths"][0])
     deck_map = {1: "A", 2: "B", 3: "C", 4: "D"}
-    
-    valid_trials_count = 0
-    for i in range(len(c_row)):
-        c, w, l = c_row.get(i), w_row.get(i), l_row.get(i)
-        if pd.isna(c): continue
-        if pd.isna(w): w = 0
-        if pd.isna(l): l = 0
-        valid_trials_count += 1
-        
-        net = int(w) + int(l)
-        current_score += net
-        human_history.append(TrialData(
-            trial=i+1, deck=deck_map.get(int(c), "?"), win=int(w), loss=int(l), net=net, total_score=current_score
-        ))
 
     # 2. Rekonstrukcja środowiska (Historia + Bechara Schema)
-    reconstructed_decks = _reconstruct_environment_from_human(c_row, w_row, l_row)
-    env = ReplayedEnvironment(reconstructed_decks)
+    with stage("reconstruct"):
+        env = ReplayedEnvironment(DATA_STORE["replay_decks"][subject_index])
     
     # 3. Symulacja AI
-    agent = StochasticMPCAgent(strategy="human")
+    agent = StochasticMPCAgent(strategy="human", planning_horizon=horizon, planner=planner, **(params or {}))
     ai_history = []
+    ai_decks, ai_nets, ai_totals = [], [], []
     ai_score = 2000
     
     # Pierwszy ruch identyczny dla synchronizacji
-    first_human_move = deck_map.get(int(c_row.get(0)), "A")
+    first_human_move = deck_map.get(int(c_row[0]), "A")
     
-    for t in range(valid_trials_count):
-        if t == 0:
-            action = first_human_move
-        else:
-            action = agent.select_action()
+    with stage("simulate"):
+        for t in range(valid_trials_count):
+            if t == 0:
+                action = first_human_move
+            else:
+                action = agent.select_action()
+                
+            gain, loss, net_res = env.step(action)
             
-        gain, loss, net_res = env.step(action)
-        
-        agent.update_model(action, net_res)
-        ai_score += net_res
-        
-        ai_history.append(TrialData(
-            trial=t+1, deck=action, win=gain, loss=loss, net=net_res, total_score=ai_score
-        ))
+            agent.update_model(action, net_res)
+            ai_score += net_res
+            
+            ai_history.append((t+1, action, gain, loss, net_res, ai_score))
+            ai_decks.append("ABCD".index(action)); ai_nets.append(net_res); ai_totals.append(ai_score)
 
     # 4. Obliczanie metryk
-    matches = 0
-    good_bad_matches = 0
-    squared_diff_sum = 0
-    total_regret = 0
-    
-    # Do WSLS (Win-Stay, Lose-Shift)
-    wsls_matches = 0
-    wsls_opportunities = 0
-    
-    # Do Entropii (liczniki wyborów)
-    human_counts = {"A":0, "B":0, "C":0, "D":0}
-    ai_counts = {"A":0, "B":0, "C":0, "D":0}
-    
-    bad_decks = ["A", "B"]
-    
-    for i in range(len(human_history)):
-        h = human_history[i]
-        ai = ai_history[i]
-        
-        # 1. Podstawowe
-        if h.deck == ai.deck: matches += 1
-        human_bad = h.deck in bad_decks
-        ai_bad = ai.deck in bad_decks
-        if human_bad == ai_bad: good_bad_matches += 1
-        
-        # 2. RMSE & Regret
-        diff = h.total_score - ai.total_score
-        squared_diff_sum += (h.total_score - ai.total_score) ** 2
-        
-        # Regret: O ile mniej zarobił człowiek w tej turze niż AI?
-        # (Liczymy różnicę w wynikach netto w danej turze, a nie total)
-        turn_regret = ai.net - h.net
-        total_regret += turn_regret
-        
-        # 3. Zbieranie danych do entropii
-        if h.deck in human_counts: human_counts[h.deck] += 1
-        if ai.deck in ai_counts: ai_counts[ai.deck] += 1
-        
-        # 4. WSLS (Analiza poprzedniej tury)
-        if i > 0:
-            prev_h = human_history[i-1]
-            prev_ai = ai_history[i-1]
-            
-            # Sprawdzamy człowieka: Czy zastosował się do zasady WSLS?
-            # Win-Stay: Poprzednio zysk (>0) ORAZ teraz ta sama talia
-            h_stayed = (h.deck == prev_h.deck)
-            h_should_stay = (prev_h.net >= 0) # Wygrał lub 0
-            
-            # Lose-Shift: Poprzednio strata (<0) ORAZ teraz inna talia
-            h_shifted = (h.deck != prev_h.deck)
-            h_should_shift = (prev_h.net < 0) # Przegrał
-            
-            human_followed_wsls = (h_should_stay and h_stayed) or (h_should_shift and h_shifted)
-            
-            # Sprawdzamy AI:
-            ai_stayed = (ai.deck == prev_ai.deck)
-            ai_should_stay = (prev_ai.net >= 0)
-            ai_shifted = (ai.deck != prev_ai.deck)
-            ai_should_shift = (prev_ai.net < 0)
-            
-            ai_followed_wsls = (ai_should_stay and ai_stayed) or (ai_should_shift and ai_shifted)
-            
-            wsls_opportunities += 1
-            if human_followed_wsls == ai_followed_wsls:
-                wsls_matches += 1
-
-    # Obliczanie Entropii Shannona: H = -sum(p * log(p))
-    def calc_entropy(counts, total):
-        if total == 0: return 0
-        entropy = 0
-        for k in counts:
-            p = counts[k] / total
-            if p > 0:
-                entropy -= p * np.log2(p)
-        return entropy
-
-    n = len(human_history)
-    
-    metrics = SimilarityMetrics(
-        exact_match_ratio=round((matches / n) * 100, 2) if n > 0 else 0,
-        good_bad_match_ratio=round((good_bad_matches / n) * 100, 2) if n > 0 else 0,
-        capital_rmse=round((squared_diff_sum / n) ** 0.5, 2) if n > 0 else 0,
-        
-        human_entropy=round(calc_entropy(human_counts, n), 2),
-        ai_entropy=round(calc_entropy(ai_counts, n), 2),
-        cumulative_regret=total_regret,
-        wsls_ratio=round((wsls_matches / wsls_opportunities) * 100, 2) if wsls_opportunities > 0 else 0
+    n = valid_trials_count
+    with stage("metrics"):
+        metrics = similarity_metrics(
+            human["deck"][0, :n], human["net"][0, :n], human["total_score"][0, :n],
+            np.array(ai_decks, dtype=np.int64), np.array(ai_nets, dtype=np.int64), np.array(ai_totals, dtype=np.int64),
+        )
+
+    with stage("build"):
+        return payloads.comparison(
+            subject_index, DATA_STORE["meta"][subject_index], payloads.trial_columns(human, 0, n),
+            {name: [trial[i] for trial in ai_history] for i, name in enumerate(payloads.TRIAL_FIELDS)},
+            rounded_metrics(metrics),
+        )
+
+@app.post("/analysis/compare/batch", response_model=BatchComparisonResponse)
+async def compare_subjects_batch(
+    request: BatchComparisonRequest,
+    format: Optional[ResponseFormat] = None,
+    accept: Optional[str] = Header(None),
+):
+    response_format = _response_format(format, accept)
+    with stage("data"):
+        await _require_data()
+    indices = _select_subjects(request.indices, request.source_study)
+    keys = [_comparison_cache_key(i, request.horizon, "counts") for i in indices]
+    with stage("cache"):
+        results = [RESULT_CACHE.get(key) for key in keys]
+    missing = [row for row, result in enumerate(results) if result is None]
+    if missing:
+        computed = await _run_analysis(_batch_comparison_job, [indices[row] for row in missing], request.horizon)
+        with stage("cache"):
+            for row, result in zip(missing, computed):
+                results[row] = result
+                RESULT_CACHE.put(keys[row], result)
+                _record_planner_evaluations("counts", request.horizon, len(result["mpc"]["trial"]))
+    return _comparison_response(results, response_format, batch=True)
+
+def _simulate_with_metrics(indices: List[int], horizon: int):
+    trajectories = _simulate_subjects(indices, horizon)
+    with stage("human"):
+        human = _human_trial_arrays(
+            DATA_STORE["choices"][indices], DATA_STORE["wins"][indices], DATA_STORE["losses"][indices]
+        )
+    # Metryki wszystkich badanych jedną operacją na macierzach (badani x próby)
+    with stage("metrics"):
+        metrics = similarity_metrics(
+            human["deck"], human["net"], human["total_score"],
+            trajectories.actions, trajectories.nets, trajectories.totals, lengths=human["lengths"],
+        )
+    return trajectories, human, metrics
+
+def _batch_comparison_job(indices: List[int], horizon: int) -> List[dict]:
+    """Porównania wielu badanych jednym przebiegiem symulacji wsadowej (bez cache)."""
+    _ensure_data_loaded()
+    trajectories, human, metrics = _simulate_with_metrics(indices, horizon)
+    return _comparison_responses(indices, trajectories, human, metrics)
+
+def _comparison_responses(indices: List[int], trajectories, human, metrics) -> List[dict]:
+    with stage("build"):
+        return [
+            payloads.comparison(
+                subject_index, DATA_STORE["meta"][subject_index],
+                payloads.trial_columns(human, row, int(human["lengths"][row])),
+                _ai_columns_from_batch(trajectories, row), rounded_metrics(metrics, row),
+            )
+            for row, subject_index in enumerate(indices)
+        ]
+
+def _batch_metrics_job(indices: List[int], horizon: int) -> List[dict]:
+    """Same metryki (bez historii prób) - wiersze eksportu `metrics_only`."""
+    _ensure_data_loaded()
+    _, _, metrics = _simulate_with_metrics(indices, horizon)
+    return [
+        {"subject_index": i, "source_study": DATA_STORE["meta"][i], "metrics": rounded_metrics(metrics, row)}
+        for row, i in enumerate(indices)
+    ]
+
+# --- ZESPÓŁ PRZEBIEGÓW (MONTE CARLO) ---
+
+@app.get("/analysis/ensemble/{subject_index}", response_model=EnsembleResponse)
+async def ensemble_subject(
+    subject_index: int,
+    n: int = Query(100, ge=1, le=MAX_ENSEMBLE_ROLLOUTS),
+    seed: Optional[int] = Query(None, ge=0),
+    horizon: int = Query(2, ge=1, le=MAX_PLANNING_HORIZON),
+    selection: Literal["softmax", "argmax"] = "softmax",
+    inverse_temperature: float = Query(DEFAULT_INVERSE_TEMPERATURE, gt=0),
+    belief_noise: float = Query(0.0, ge=0),
+    loss_aversion: Optional[float] = Query(None, ge=0),
+    learning_rate: Optional[float] = Query(None, gt=0, le=1),
+    info_value_weight: Optional[float] = Query(None, ge=0),
+):
+    """N przebiegów agenta z losowym wyborem ruchu; ten sam `seed` daje ten sam wynik (bez seeda - losowy, zwracany)."""
+    with stage("data"):
+        await _require_data()
+    if subject_index < 0 or subject_index >= len(DATA_STORE["choices"]): raise HTTPException(404, "Zły indeks")
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    config = {
+        "n_rollouts": n, "seed": seed, "horizon": horizon, "selection": selection,
+        "inverse_temperature": inverse_temperature if selection == "softmax" else None, "belief_noise": belief_noise,
+    }
+    params = {"loss_aversion": loss_aversion, "learning_rate": learning_rate, "info_value_weight": info_value_weight}
+    result = await _run_analysis(_ensemble_job, subject_index, config, params)
+    trials = len(result.human_capital)
+    PLANNER_EVALUATIONS_TOTAL.inc("counts", amount=planner_evaluations(horizon, "counts") * max(0, trials - 1) * n)
+    with stage("serialize"):
+        body = result.model_dump_json()
+    return Response(body, media_type="application/json")
+
+def _ensemble_job(subject_index: int, config: dict, params: dict) -> EnsembleResponse:
+    _ensure_data_loaded()
+    subject = _subject_trials(subject_index)
+    c_row, w_row, l_row = _subject_rows(subject_index)
+    with stage("human"):
+        human = _human_trial_arrays(c_row[None], w_row[None], l_row[None])
+        n = int(human["lengths"][0])
+        human = {name: values[0, :n] for name, values in human.items() if name != "lengths"}
+    with stage("simulate"):
+        trajectories = run_ensemble(
+            subject.decks, n, subject.first_action, config["n_rollouts"], config["seed"], config["horizon"],
+            config["inverse_temperature"], config["belief_noise"],
+            {name: value for name, value in params.items() if value is not None},
+        )
+    with stage("metrics"):
+        stats = ensemble_statistics(trajectories, human)
+    with stage("build"):
+        capital = {name: np.round(values, 2).tolist() for name, values in stats["capital"].items()}
+        return EnsembleResponse(
+            subject_index=subject_index, source_study=DATA_STORE["meta"][subject_index], **config,
+            human_capital=human["total_score"].tolist(),
+            capital_bands=[
+                CapitalBand(trial=t + 1, **{name: values[t] for name, values in capital.items()}) for t in range(n)
+            ],
+            metrics={
+                metric: MetricDistribution(**{name: round(float(value), 2) for name, value in summary.items()})
+                for metric, summary in stats["metrics"].items()
+            },
+        )
+
+# --- STATYSTYKI BADAŃ (GRUP BADANYCH) ---
+# Wyniki grup pamiętamy pod skrótem danych ich badanych - po dołączeniu nowych badanych
+# (np. ukończonych gier) liczymy od nowa tylko grupy, które się zmieniły.
+
+AGGREGATE_CACHE: "OrderedDict[tuple, CohortAggregate]" = OrderedDict()
+AGGREGATE_CACHE_MAX = 256
+
+@app.get("/analysis/aggregates", response_model=AggregatesResponse)
+async def cohort_aggregates(
+    source_study: Optional[str] = None,
+    block_size: int = Query(20, ge=1, le=150),
+    horizon: int = Query(2, ge=1, le=MAX_PLANNING_HORIZON),
+):
+    with stage("data"):
+        await _require_data()
+    studies = [s for s in DATA_STORE["study_labels"] if source_study is None or _matches_study(s, source_study)]
+    if not studies: raise HTTPException(404, "Brak badanych z tego badania")
+    with stage("cache"):
+        keys = {study: (study, DATA_STORE["study_digests"][study], block_size, horizon) for study in studies}
+        missing = [study for study in studies if keys[study] not in AGGREGATE_CACHE]
+    if missing:
+        computed = await _run_analysis(_aggregate_job, missing, block_size, horizon)
+        for study, result in zip(missing, computed):
+            AGGREGATE_CACHE[keys[study]] = CohortAggregate(**result)
+    with stage("cache"):
+        groups = []
+        for study in studies:
+            AGGREGATE_CACHE.move_to_end(keys[study])
+            groups.append(AGGREGATE_CACHE[keys[study]])
+        while len(AGGREGATE_CACHE) > AGGREGATE_CACHE_MAX:
+            AGGREGATE_CACHE.popitem(last=False)
+    with stage("serialize"):
+        body = AggregatesResponse(block_size=block_size, horizon=horizon, groups=groups).model_dump_json()
+    return Response(body, media_type="application/json")
+
+def _study_rows(study: str) -> np.ndarray:
+    return np.flatnonzero(DATA_STORE["study_codes"] == DATA_STORE["study_labels"].index(study))
+
+def _aggregate_job(studies: List[str], block_size: int, horizon: int) -> List[dict]:
+    """Statystyki kilku grup naraz: jedna symulacja wsadowa i sumy grupowe po wszystkich ich badanych."""
+    _ensure_data_loaded()
+    rows = [_study_rows(study) for study in studies]
+    indices = np.concatenate(rows).tolist()
+    codes = np.repeat(np.arange(len(studies)), [len(r) for r in rows])
+    _, human, metrics = _simulate_with_metrics(indices, horizon)
+    with stage("aggregate"):
+        stats = group_statistics(human["deck"], human["total_score"], human["lengths"], codes, len(studies), block_size)
+        distributions = metric_distributions(metrics, codes, len(studies))
+    return [
+        {"source_study": study, **group, "metrics": metric}
+        for study, group, metric in zip(studies, stats, distributions)
+    ]
+
+# --- PODOBNI BADANI ---
+# IGT_SIMILAR_FLAT_BELOW - do tylu badanych przeszukujemy wszystkich, powyżej indeks IVF;
+# IGT_SIMILAR_PROBES - ile list IVF przeglądamy przy zapytaniu (więcej = dokładniej, wolniej)
+SIMILARITY_INDEX = SignatureIndex(
+    flat_below=int(os.getenv("IGT_SIMILAR_FLAT_BELOW", "4096")), n_probe=int(os.getenv("IGT_SIMILAR_PROBES", "8")),
+)
+
+@app.get("/analysis/similar/{subject_index}", response_model=SimilarSubjectsResponse)
+async def similar_subjects(subject_index: int, k: int = Query(10, ge=1, le=MAX_SIMILAR)):
+    """Badani o najbliższej sygnaturze zachowania (bloki talii, WSLS, entropia, przebieg kapitału)."""
+    with stage("data"):
+        await _require_data()
+    if subject_index < 0 or subject_index >= len(DATA_STORE["meta"]): raise HTTPException(404, "Zły indeks")
+    with stage("search"):
+        ids, distances = SIMILARITY_INDEX.search(DATA_STORE["signatures"][subject_index], k, exclude=subject_index)
+    meta, counts = DATA_STORE["meta"], DATA_STORE["trial_counts"]
+    return SimilarSubjectsResponse(
+        subject_index=subject_index, source_study=meta[subject_index], method=SIMILARITY_INDEX.method,
+        neighbours=[
+            SimilarSubject(subject_index=i, source_study=meta[i], total_trials=int(counts[i]), distance=round(d, 4))
+            for i, d in zip(ids.tolist(), distances.tolist())
+        ],
     )
 
-    return ComparisonResponse(
-        subject_data=SubjectHistoryResponse(
-            subject_index=subject_index, source_study=DATA_STORE["meta"][subject_index], history=human_history
-        ), mpc_data=ai_history, metrics=metrics
+# --- PORÓWNANIE MODELI (AIC/BIC) ---
+# Każdy model z rejestru (agent_models.py) dopasowany do każdego badanego metodą największej
+# wiarygodności; badanych liczymy partiami na workerach puli, a wynik pamiętamy dla wersji danych.
+
+MODEL_FIT_CHUNK = 128
+MODEL_COMPARISON_CACHE: "OrderedDict[tuple, ModelComparisonResponse]" = OrderedDict()
+MODEL_COMPARISON_CACHE_MAX = 16
+
+@app.get("/analysis/models", response_model=List[AgentModelInfo])
+async def list_agent_models():
+    return [
+        AgentModelInfo(
+            name=name, description=cls.description, params=cls.defaults,
+            bounds={param: [None if math.isinf(v) else v for v in bounds] for param, bounds in cls.bounds.items()},
+        )
+        for name, cls in MODELS.items()
+    ]
+
+@app.get("/analysis/model-comparison", response_model=ModelComparisonResponse)
+async def compare_models(
+    models: Optional[List[str]] = Query(None),
+    source_study: Optional[str] = None,
+    horizon: int = Query(2, ge=1, le=MAX_PLANNING_HORIZON),
+):
+    """AIC i BIC każdego modelu dla każdego badanego (parametry dopasowane osobno dla badanego)."""
+    with stage("data"):
+        await _require_data()
+    names = models or list(MODELS)
+    unknown = [name for name in names if name not in MODELS]
+    if unknown: raise HTTPException(400, f"Nieznany model: {', '.join(unknown)}")
+    indices = _select_subjects(None, source_study)
+    if not indices: raise HTTPException(404, "Brak badanych z tego badania")
+
+    key = (DATA_STORE["fingerprint"], source_study, tuple(names), horizon)
+    result = MODEL_COMPARISON_CACHE.get(key)
+    if result is None:
+        chunks = [indices[i:i + MODEL_FIT_CHUNK] for i in range(0, len(indices), MODEL_FIT_CHUNK)]
+        with fan_out("fit"):
+            parts = await asyncio.gather(*(_export_analysis(_model_fit_job, chunk, names, horizon) for chunk in chunks))
+        subjects = [SubjectModelFits(**row) for part in parts for row in part]
+        summary = [
+            ModelSummary(
+                model=name, n_params=create_model(name).n_params,
+                total_aic=round(sum(s.fits[name].aic for s in subjects), 2),
+                total_bic=round(sum(s.fits[name].bic for s in subjects), 2),
+                best_subjects=sum(s.best_model == name for s in subjects),
+            )
+            for name in names
+        ]
+        result = ModelComparisonResponse(models=names, horizon=horizon, summary=summary, subjects=subjects)
+        MODEL_COMPARISON_CACHE[key] = result
+        while len(MODEL_COMPARISON_CACHE) > MODEL_COMPARISON_CACHE_MAX:
+            MODEL_COMPARISON_CACHE.popitem(last=False)
+    MODEL_COMPARISON_CACHE.move_to_end(key)
+    with stage("serialize"):
+        body = result.model_dump_json()
+    return Response(body, media_type="application/json")
+
+def _model_fit_job(indices: List[int], names: List[str], horizon: int) -> List[dict]:
+    """Dopasowanie modeli do partii badanych - każdy model jednym przebiegiem po (badani x próby)."""
+    _ensure_data_loaded()
+    with stage("human"):
+        human = _human_trial_arrays(
+            DATA_STORE["choices"][indices], DATA_STORE["wins"][indices], DATA_STORE["losses"][indices]
+        )
+        width = human["deck"].shape[1]
+        # Obserwacje do AIC/BIC - te same próby, które ocenia log_likelihood (bez pierwszej)
+        trial = np.arange(width)
+        scored = ((trial > 0) & (trial < human["lengths"][:, None]) & (human["deck"] < 4)).sum(axis=1)
+    fits = {}
+    for name in names:
+        model = create_model(name, planning_horizon=horizon)
+        with stage("fit"):
+            params, log_likelihood = fit_maximum_likelihood(
+                model, human["deck"], human["win"], human["loss"], human["lengths"],
+            )
+        fits[name] = (params, log_likelihood, information_criteria(log_likelihood, model.n_params, scored))
+
+    with stage("build"):
+        rows = []
+        for row, subject_index in enumerate(indices):
+            subject_fits = {
+                name: {
+                    "params": {param: round(float(values[row]), 4) for param, values in params.items()},
+                    "log_likelihood": round(float(log_likelihood[row]), 2),
+                    "aic": round(float(criteria["aic"][row]), 2), "bic": round(float(criteria["bic"][row]), 2),
+                }
+                for name, (params, log_likelihood, criteria) in fits.items()
+            }
+            rows.append({
+                "subject_index": subject_index, "source_study": DATA_STORE["meta"][subject_index],
+                "n_trials": int(scored[row]), "fits": subject_fits,
+                "best_model": min(subject_fits, key=lambda name: subject_fits[name]["bic"]),
+            })
+        return rows
+
+# --- EKSPORT STRUMIENIOWY ---
+
+@app.get("/analysis/export")
+async def export_comparisons(
+    format: Literal["ndjson", "sse"] = "ndjson",
+    start: int = Query(0, ge=0),
+    source_study: Optional[str] = None,
+    horizon: int = Query(2, ge=1, le=MAX_PLANNING_HORIZON),
+    metrics_only: bool = False,
+    chunk_size: int = Query(64, ge=1, le=1024),
+    output: Optional[str] = Query(None, pattern=r"^[\w.-]+$"),
+    last_event_id: Optional[int] = Header(None),
+):
+    """Porównania badanych od indeksu `start`, po jednym wierszu JSON na badanego.
+
+    Liczone partiami po `chunk_size` (następna partia liczy się, gdy bieżąca jest wysyłana),
+    więc w pamięci są najwyżej dwie partie. Wznowienie: `start` = ostatni subject_index + 1,
+    a dla SSE nagłówek Last-Event-ID. `output` dopisuje ten sam strumień do pliku w IGT_EXPORT_DIR.
+    """
+    await _require_data()
+    if last_event_id is not None: start = max(start, last_event_id + 1)
+    mask = np.ones(len(DATA_STORE["meta"]), dtype=bool) if source_study is None else _study_mask(source_study)
+    mask[:start] = False
+    indices = np.flatnonzero(mask).tolist()
+    chunks = [indices[i:i + chunk_size] for i in range(0, len(indices), chunk_size)]
+
+    path = None
+    if output is not None:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = os.path.join(EXPORT_DIR, output)
+        # Wznowienie dopisuje do istniejącego pliku, eksport od początku go nadpisuje
+        if start == 0 and os.path.exists(path): os.remove(path)
+
+    lines = _export_lines(chunks, horizon, metrics_only)
+    stream = _export_stream(lines, format, path, start)
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(stream, media_type=media_type, headers={"X-Export-Subjects": str(len(indices))})
+
+async def _export_chunk(indices: List[int], horizon: int, metrics_only: bool) -> List[Tuple[int, str]]:
+    if metrics_only:
+        rows = await _export_analysis(_batch_metrics_job, indices, horizon)
+        return [(row["subject_index"], json.dumps(row)) for row in rows]
+
+    keys = [_comparison_cache_key(i, horizon, "counts") for i in indices]
+    results = [RESULT_CACHE.get(key) for key in keys]
+    missing = [row for row, result in enumerate(results) if result is None]
+    if missing:
+        computed = await _export_analysis(_batch_comparison_job, [indices[row] for row in missing], horizon)
+        for row, result in zip(missing, computed):
+            results[row] = result
+            RESULT_CACHE.put(keys[row], result)
+    return [(i, payloads.dumps(payloads.row_layout(result)).decode()) for i, result in zip(indices, results)]
+
+async def _export_analysis(fn, *args):
+    # Eksport ustępuje zapytaniom interaktywnym: przy pełnej kolejce czeka zamiast zwracać 429
+    while True:
+        try:
+            return await _run_analysis(fn, *args)
+        except HTTPException as e:
+            if e.status_code != 429: raise
+            await asyncio.sleep(EXPORT_RETRY_DELAY)
+
+async def _export_lines(chunks: List[List[int]], horizon: int, metrics_only: bool):
+    """(subject_index, json) kolejnych badanych; następna partia liczy się w tle."""
+    pending = None
+    try:
+        for n, chunk in enumerate(chunks):
+            current = pending or asyncio.create_task(_export_chunk(chunk, horizon, metrics_only))
+            pending = None
+            if n + 1 < len(chunks):
+                pending = asyncio.create_task(_export_chunk(chunks[n + 1], horizon, metrics_only))
+            for line in await current:
+                yield line
+    finally:
+        if pending is not None: pending.cancel()
+
+async def _export_stream(lines, format: str, path: Optional[str], start: int):
+    out = open(path, "a") if path else None
+    resume_from = start
+    try:
+        async for subject_index, line in lines:
+            if out is not None: out.write(line + "\n")
+            resume_from = subject_index + 1
+            yield f"id: {subject_index}\ndata: {line}\n\n" if format == "sse" else line + "\n"
+    except HTTPException as e:
+        # Nagłówki już wysłane - błąd trafia do strumienia razem z miejscem wznowienia
+        error = json.dumps({"error": e.detail, "status": e.status_code, "resume_from": resume_from})
+        yield f"event: error\ndata: {error}\n\n" if format == "sse" else error + "\n"
+    finally:
+        if out is not None: out.close()
+
+def _warm_result_cache(fingerprint: str, chunk_size: int = 128):
+    """Prekomputacja porównań (domyślne parametry) wszystkich badanych w puli analiz."""
+    total = len(DATA_STORE["meta"])
+    for start in range(0, total, chunk_size):
+        if DATA_STORE["fingerprint"] != fingerprint: return
+        indices = [i for i in range(start, min(start + chunk_size, total))
+                   if _comparison_cache_key(i, 2, "counts") not in RESULT_CACHE]
+        if not indices: continue
+        for subject_index, result in zip(indices, ANALYSIS_POOL.submit(_batch_comparison_job, indices, 2).result()):
+            RESULT_CACHE.put(_comparison_cache_key(subject_index, 2, "counts"), result)
+    print(f"Cache rozgrzany: {total} badanych.")
+
+# --- DOPASOWANIE PARAMETRÓW (zadania asynchroniczne) ---
+
+@app.post("/fitting/jobs", response_model=FitJobStatus, status_code=202)
+async def create_fit_job(request: FitJobRequest):
+    await _require_data()
+    active = sum(1 for job in FIT_JOBS.values() if job.status in ("queued", "running"))
+    if active >= FIT_MAX_JOBS:
+        raise HTTPException(429, "Zbyt wiele aktywnych zadań dopasowania", headers={"Retry-After": "30"})
+    if request.successive_halving and request.objective != "likelihood":
+        # Zgodność swobodnej symulacji na krótkich prefiksach prawie nie różnicuje kandydatów
+        raise HTTPException(400, "successive_halving wymaga objective=likelihood")
+    indices = _select_subjects(request.indices, request.source_study)
+
+    job = FitJobStatus(job_id=str(uuid.uuid4()), status="queued", request=request, total=len(indices), created_at=time.time())
+    FIT_JOBS[job.job_id] = job
+    _persist_fit_job(job)
+    task = asyncio.create_task(_run_fit_job(job, indices))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return job
+
+@app.get("/fitting/jobs", response_model=List[FitJobSummary])
+async def list_fit_jobs():
+    jobs = {job.job_id: job for job in map(_read_fit_job_summary, _persisted_fit_job_ids())}
+    jobs.update((job_id, FitJobSummary(**job.model_dump(include=FIT_SUMMARY_FIELDS))) for job_id, job in FIT_JOBS.items())
+    return sorted(jobs.values(), key=lambda job: job.created_at)
+
+@app.get("/fitting/jobs/{job_id}", response_model=FitJobStatus)
+async def get_fit_job(job_id: str):
+    job = FIT_JOBS.get(job_id)
+    if job is None:
+        if job_id not in _persisted_fit_job_ids(): raise HTTPException(404, "Nie ma takiego zadania")
+        job = _read_fit_job(job_id)
+    return job
+
+async def _run_fit_job(job: FitJobStatus, indices: List[int], chunk_size: int = 4):
+    job.status = "running"
+    config = job.request.model_dump()
+    futures = [
+        asyncio.wrap_future(FIT_POOL.submit(_fit_subjects_job, indices[start:start + chunk_size], config))
+        for start in range(0, len(indices), chunk_size)
+    ]
+    last_persist = time.monotonic()
+    try:
+        for next_chunk in asyncio.as_completed(futures):
+            job.results.extend(SubjectFit(**fit) for fit in await next_chunk)
+            job.completed = len(job.results)
+            if time.monotonic() - last_persist > 1.0:
+                _persist_fit_job(job)
+                last_persist = time.monotonic()
+        job.results.sort(key=lambda fit: fit.subject_index)
+        job.status = "finished"
+    except Exception as e:
+        for future in futures: future.cancel()
+        job.status = "failed"
+        job.error = str(e)
+    job.finished_at = time.time()
+    _persist_fit_job(job)
+
+def _fit_subjects_job(indices: List[int], config: dict) -> List[dict]:
+    _ensure_data_loaded()
+    return [{"subject_index": i, **fit_subject(_subject_trials(i), config)} for i in indices]
+
+def _subject_trials(subject_index: int) -> SubjectTrials:
+    # Te same próby co w porównaniu: wszystkie ważne, także z nieznaną talią (4)
+    c_row, w_row, l_row = _subject_rows(subject_index)
+    human = _human_trial_arrays(c_row[None], w_row[None], l_row[None])
+    n = int(human["lengths"][0])
+    first = int(c_row[0]) - 1 if len(c_row) and c_row[0] in (1, 2, 3, 4) else 0
+    return SubjectTrials(
+        decks=np.asarray(DATA_STORE["replay_decks"][subject_index]),
+        choices=human["deck"][0, :n].astype(np.intp),
+        nets=human["net"][0, :n],
+        first_action=first,
     )
 
-def _create_live_game_decks() -> Dict[DeckId, List[Tuple[int, int]]]:
-    # Dla trybu gry na żywo używamy tego samego schematu co dla symulacji
-    decks = {}
-    for d in ["A", "B", "C", "D"]:
-        # Generujemy 200 kart (zapas) wg schematu Bechary
-        decks[d] = _get_standard_scheme_cards(d, 0, 200)
-    return decks
+FIT_SUMMARY_FIELDS = {"job_id", "status", "total", "completed", "created_at"}
+
+def _persist_fit_job(job: FitJobStatus):
+    # Pełny stan (z wynikami) i osobno krótkie podsumowanie - lista zadań czyta tylko podsumowania
+    os.makedirs(FIT_DIR, exist_ok=True)
+    _write_fit_file(f"{job.job_id}.json", job.model_dump_json())
+    _write_fit_file(f"{job.job_id}.summary.json", job.model_dump_json(include=FIT_SUMMARY_FIELDS))
+
+def _write_fit_file(name: str, content: str):
+    path = os.path.join(FIT_DIR, name)
+    with open(f"{path}.tmp", "w") as f:
+        f.write(content)
+    os.replace(f"{path}.tmp", path)
+
+def _persisted_fit_job_ids() -> List[str]:
+    if not os.path.isdir(FIT_DIR): return []
+    return [
+        name[:-len(".json")] for name in os.listdir(FIT_DIR)
+        if name.endswith(".json") and not name.endswith(".summary.json")
+    ]
+
+def _read_fit_job(job_id: str) -> FitJobStatus:
+    with open(os.path.join(FIT_DIR, f"{job_id}.json")) as f:
+        job = FitJobStatus.model_validate(json.load(f))
+    return _mark_interrupted(job)
+
+def _read_fit_job_summary(job_id: str) -> FitJobSummary:
+    try:
+        with open(os.path.join(FIT_DIR, f"{job_id}.summary.json")) as f:
+            summary = FitJobSummary.model_validate(json.load(f))
+    except FileNotFoundError:
+        # Zadanie zapisane bez podsumowania (starsza wersja) - czytamy całość raz i dopisujemy je
+        job = _read_fit_job(job_id)
+        _write_fit_file(f"{job_id}.summary.json", job.model_dump_json(include=FIT_SUMMARY_FIELDS))
+        return FitJobSummary(**job.model_dump(include=FIT_SUMMARY_FIELDS))
+    return _mark_interrupted(summary)
+
+def _mark_interrupted(job):
+    # Zadanie z poprzedniego uruchomienia serwera, które nie zdążyło się skończyć
+    if job.status in ("queued", "running") and job.job_id not in FIT_JOBS:
+        job.status = "interrupted"
+    return job
 
-def _get_game_state_response(session: GameSession) -> GameStateResponse:
+def _get_game_state_response(session: SessionState) -> GameStateResponse:
     """Konwertuje wewnętrzny stan sesji na odpowiedź API."""
+    last_move = session.last_move()
     return GameStateResponse(
         session_id=session.session_id,
         score=session.score,
         turn=session.turn,
-        last_move=session.last_move,
+        last_move=LastMove(deck=last_move[0], gain=last_move[1], loss=last_move[2], net=last_move[1] + last_move[2]) if last_move else None,
         is_game_ended=session.is_game_ended,
     )
 
 # --- START GRY (LIVE) ---
-def _create_live_game_decks() -> Dict[DeckId, List[Tuple[int, int]]]:
-    # Dla trybu gry na żywo używamy tego samego schematu co dla symulacji
-    decks = {}
-    for d in ["A", "B", "C", "D"]:
-        # Generujemy 200 kart (zapas) wg schematu Bechary
-        decks[d] = _get_standard_scheme_cards(d, 0, 200)
-    return decks
-
 @app.post("/game/start", response_model=GameStateResponse)
 async def start_new_game():
-    sid = str(uuid.uuid4())
-    game_sessions[sid] = GameSession(session_id=sid, decks=_create_live_game_decks())
-    return _get_game_state_response(game_sessions[sid])
+    session = SessionState(session_id=str(uuid.uuid4()))
+    await _session_call(SESSION_STORE.put, session)
+    return _get_game_state_response(session)
 
 @app.post("/game/choose", response_model=GameStateResponse)
 async def choose_deck(choice: ChoiceRequest):
-    s = game_sessions.get(choice.session_id)
-    if not s or s.is_game_ended: raise HTTPException(400, "Err")
-    d = choice.deck_id
-    idx = s.deck_counters[d]
-    if idx >= len(s.decks[d]): idx = 0 # loop
-    
-    gain, loss = s.decks[d][idx]
-    s.score += (gain + loss)
-    s.turn += 1
-    s.deck_counters[d] += 1
-    s.last_move = LastMove(deck=d, gain=gain, loss=loss, net=gain+loss)
-    if s.turn >= 100: s.is_game_ended = True
+    s = await _play_move(choice.session_id, choice.deck_id, "http")
+    if s is None: raise HTTPException(400, "Err")
     return _get_game_state_response(s)
 
+async def _session_call(fn, *args):
+    # SQLite może czekać na blokadę innego workera (busy timeout) - wtedy nie w pętli zdarzeń
+    if SESSION_STORE.blocking:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+async def _play_move(session_id: str, deck_id: str, transport: str) -> Optional[SessionState]:
+    """Ruch gracza (atomowo w magazynie sesji) + wpis do dziennika prób; None, gdy sesji nie ma."""
+    def play(session: SessionState) -> SessionState:
+        if session.is_game_ended: raise HTTPException(400, "Err")
+        return session.choose(deck_id)
+
+    s = await _session_call(SESSION_STORE.update, session_id, play)
+    if s is None: return None
+    GAME_MOVES.inc(transport)
+    if TRIAL_LOG is not None:
+        # Tylko bufor w pamięci - zapis na dysk robi _flush_trial_log
+        _, gain, loss = s.last_move()
+        if TRIAL_LOG.append(s.session_id, s.turn, s.last_deck + 1, gain, loss, s.is_game_ended):
+            _TRIAL_LOG_FULL.set()
+    return s
+
+# --- GRA PRZEZ WEBSOCKET ---
+# Jedno połączenie = jedna sesja. Klient wysyła samą literę talii ("A".."D", albo {"deck_id": "A"}),
+# serwer odsyła stan gry jako JSON (pola jak GameStateResponse), a przy `opponent=true` także ruch
+# agenta MPC grającego równolegle na tych samych taliach (pole "ai").
+
+@app.websocket("/game/ws")
+async def game_socket(
+    websocket: WebSocket,
+    session_id: Optional[str] = None,
+    opponent: bool = False,
+    horizon: int = Query(2, ge=1, le=MAX_PLANNING_HORIZON),
+):
+    await websocket.accept()
+    if session_id is None:
+        session = SessionState(session_id=str(uuid.uuid4()))
+        await _session_call(SESSION_STORE.put, session)
+    else:
+        session = await _session_call(SESSION_STORE.get, session_id)
+        if session is None:
+            await websocket.close(code=4404, reason="Sesja nie istnieje lub wygasła")
+            return
+    ai = LiveOpponent(planning_horizon=horizon) if opponent else None
+    if ai is not None:
+        # Odtworzenie po ponownym połączeniu to do 100 decyzji planera - poza pętlą zdarzeń
+        await asyncio.to_thread(ai.catch_up, session.turn)
+    GAME_SOCKETS.inc()
+    try:
+        await websocket.send_text(_game_state_message(session, ai))
+        while True:
+            message = (await websocket.receive_text()).strip()
+            deck_id = _socket_deck_id(message)
+            if deck_id is None:
+                await websocket.send_text(json.dumps({"error": "Zła talia"}))
+                continue
+            try:
+                moved = await _play_move(session.session_id, deck_id, "ws")
+            except HTTPException:
+                await websocket.send_text(json.dumps({"error": "Gra zakończona"}))
+                continue
+            if moved is None:
+                await websocket.close(code=4404, reason="Sesja nie istnieje lub wygasła")
+                return
+            session = moved
+            if ai is not None:
+                await asyncio.to_thread(ai.catch_up, session.turn)
+            await websocket.send_text(_game_state_message(session, ai))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        GAME_SOCKETS.dec()
+
+def _socket_deck_id(message: str) -> Optional[str]:
+    if message.startswith("{"):
+        try:
+            message = json.loads(message).get("deck_id", "")
+        except (ValueError, AttributeError):
+            return None
+    return message if message in DECK_IDS else None
+
+def _game_state_message(session: SessionState, ai: Optional[LiveOpponent] = None) -> str:
+    # Słownik + json.dumps zamiast modelu pydantic - to koszt każdego ruchu
+    payload = _move_payload(session)
+    payload["session_id"] = session.session_id
+    payload["is_game_ended"] = session.is_game_ended
+    if ai is not None:
+        payload["ai"] = _move_payload(ai.state)
+    return json.dumps(payload)
+
+def _move_payload(state: SessionState) -> dict:
+    last_move = state.last_move()
+    return {
+        "score": state.score, "turn": state.turn,
+        "last_move": {"deck": last_move[0], "gain": last_move[1], "loss": last_move[2], "net": last_move[1] + last_move[2]}
+        if last_move else None,
+    }
+
+_TRIAL_LOG_FULL = asyncio.Event()
+
+async def _flush_trial_log():
+    """Zapis bufora dziennika prób co TRIAL_LOG_INTERVAL sekund albo od razu po zapełnieniu paczki."""
+    while True:
+        try:
+            await asyncio.wait_for(_TRIAL_LOG_FULL.wait(), TRIAL_LOG_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _TRIAL_LOG_FULL.clear()
+        try:
+            await asyncio.to_thread(TRIAL_LOG.flush)
+        except OSError as e:
+            print(f"Błąd zapisu dziennika prób: {e}")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,78 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+# --- METRYKI PODOBIEŃSTWA CZŁOWIEK vs AI (operacje tablicowe) ---
+#
+# Wejście: kody talii (0..3 = A..D, inne wartości = nieznana talia "?"), wynik netto
+# i kapitał po każdej próbie. Tablice 1-D (jeden badany) albo 2-D (badani x próby);
+# próby ułożone od lewej, `lengths` mówi ile jest ważnych w każdym wierszu.
+
+BAD_DECKS = (0, 1)  # A, B
+METRIC_FIELDS = (
+    "exact_match_ratio", "good_bad_match_ratio", "capital_rmse",
+    "human_entropy", "ai_entropy", "cumulative_regret", "wsls_ratio",
+)
+
+def _deck_entropy(decks: np.ndarray, valid: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """Entropia Shannona (bity) rozkładu wyborów A-D; p liczone względem wszystkich n prób."""
+    entropy = np.zeros(decks.shape[:-1])
+    safe_n = np.maximum(n, 1)
+    for d in range(4):
+        p = ((decks == d) & valid).sum(axis=-1) / safe_n
+        entropy = entropy - np.where(p > 0, p * np.log2(np.where(p > 0, p, 1)), 0)
+    return np.where(n > 0, entropy, 0)
+
+def _wsls_followed(decks: np.ndarray, nets: np.ndarray) -> np.ndarray:
+    """Czy próba t (od drugiej) jest zgodna z Win-Stay / Lose-Shift względem próby t-1."""
+    stayed = decks[..., 1:] == decks[..., :-1]
+    won = nets[..., :-1] >= 0
+    return (won & stayed) | (~won & ~stayed)
+
+def similarity_metrics(
+    human_decks, human_nets, human_totals,
+    ai_decks, ai_nets, ai_totals,
+    lengths: Optional[np.ndarray] = None,
+) -> Dict[str, np.ndarray]:
+    """Wszystkie pola SimilarityMetrics (niezaokrąglone) dla jednego lub wielu badanych."""
+    human_decks, ai_decks = np.asarray(human_decks), np.asarray(ai_decks)
+    human_nets, ai_nets = np.asarray(human_nets, dtype=np.int64), np.asarray(ai_nets, dtype=np.int64)
+    human_totals, ai_totals = np.asarray(human_totals, dtype=np.int64), np.asarray(ai_totals, dtype=np.int64)
+
+    trials = human_decks.shape[-1]
+    if lengths is None:
+        n = np.full(human_decks.shape[:-1], trials)
+    else:
+        n = np.asarray(lengths)
+    valid = np.arange(trials) < n[..., None]
+    safe_n = np.maximum(n, 1)
+
+    matches = ((human_decks == ai_decks) & valid).sum(axis=-1)
+    human_bad = np.isin(human_decks, BAD_DECKS)
+    ai_bad = np.isin(ai_decks, BAD_DECKS)
+    good_bad = ((human_bad == ai_bad) & valid).sum(axis=-1)
+    squared = (np.where(valid, human_totals - ai_totals, 0) ** 2).sum(axis=-1)
+    regret = np.where(valid, ai_nets - human_nets, 0).sum(axis=-1)
+
+    # WSLS: zgodność "człowiek zastosował regułę" z "AI zastosowało regułę", od drugiej próby
+    wsls_valid = valid[..., 1:]
+    wsls_agree = (_wsls_followed(human_decks, human_nets) == _wsls_followed(ai_decks, ai_nets)) & wsls_valid
+    wsls_matches = wsls_agree.sum(axis=-1)
+    opportunities = wsls_valid.sum(axis=-1)
+
+    return {
+        "exact_match_ratio": np.where(n > 0, (matches / safe_n) * 100, 0),
+        "good_bad_match_ratio": np.where(n > 0, (good_bad / safe_n) * 100, 0),
+        "capital_rmse": np.where(n > 0, (squared / safe_n) ** 0.5, 0),
+        "human_entropy": _deck_entropy(human_decks, valid, n),
+        "ai_entropy": _deck_entropy(ai_decks, valid, n),
+        "cumulative_regret": regret,
+        "wsls_ratio": np.where(opportunities > 0, (wsls_matches / np.maximum(opportunities, 1)) * 100, 0),
+    }
+
+def rounded_metrics(values: Dict[str, np.ndarray], row=()) -> dict:
+    """Pola gotowe dla SimilarityMetrics: zaokrąglenie do 2 miejsc jak w API (round z Pythona)."""
+    fields = {name: float(values[name][row]) for name in METRIC_FIELDS}
+    rounded = {name: round(value, 2) for name, value in fields.items()}
+    rounded["cumulative_regret"] = int(values["cumulative_regret"][row])
+    return rounded
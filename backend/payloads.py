@@ -0,0 +1,172 @@
+import itertools
+import json
+import struct
+from typing import Dict, List, Literal, Optional
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# --- FORMATY ODPOWIEDZI PORÓWNAŃ ---
+#
+# Porównanie (człowiek vs AI) przechowujemy kolumnowo: dla każdej strony ("subject", "mpc")
+# jedna lista na pole próby. Tak trafia do cache i z tego kodujemy odpowiedź - bez budowania
+# i walidacji obiektów Pydantic dla każdej próby (dane buduje serwer, nie trzeba ich sprawdzać).
+#   json    - dotychczasowy układ ComparisonResponse (lista obiektów TrialData)
+#   columns - to samo kolumnowo: {"subject": {"trial": [...], "deck": [...], ...}, "mpc": {...}}
+#   binary  - spakowane tablice little-endian (PACKED_MAGIC, nagłówek JSON, kolumny), patrz decode_packed
+#   arrow   - strumień Arrow IPC (tylko z zainstalowanym pyarrow)
+
+ResponseFormat = Literal["json", "columns", "binary", "arrow"]
+MEDIA_TYPES: Dict[str, str] = {
+    "json": "application/json",
+    "columns": "application/vnd.igt.columns+json",
+    "binary": "application/vnd.igt.packed",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+TRIAL_FIELDS = ("trial", "deck", "win", "loss", "net", "total_score")
+SIDES = ("subject", "mpc")
+DECK_LETTERS = "ABCD?"
+
+PACKED_MAGIC = b"IGTP"
+PACKED_VERSION = 1
+PACKED_DTYPES = {"trial": "<i4", "deck": "u1", "win": "<i4", "loss": "<i4", "net": "<i4", "total_score": "<i4"}
+_DECK_CODES = bytes.maketrans(DECK_LETTERS.encode(), bytes(range(len(DECK_LETTERS))))
+
+def dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+def trial_columns(arrays: Dict[str, np.ndarray], row: int, n: int) -> Dict[str, list]:
+    """Pierwsze `n` prób wiersza `row` macierzy (badani x próby); talia jako litera A-D / "?"."""
+    columns = {name: arrays[name][row, :n].tolist() for name in TRIAL_FIELDS}
+    columns["deck"] = [DECK_LETTERS[deck] for deck in columns["deck"]]
+    return columns
+
+def comparison(subject_index: int, source_study: str, subject: Dict[str, list], mpc: Dict[str, list], metrics: dict) -> dict:
+    return {"subject_index": subject_index, "source_study": source_study, "subject": subject, "mpc": mpc, "metrics": metrics}
+
+def load_comparison(payload: bytes) -> dict:
+    """Wpis cache z dysku; inny układ (np. ze starszej wersji) traktujemy jak brak wpisu."""
+    value = json.loads(payload)
+    if not isinstance(value, dict) or any(key not in value for key in ("subject_index",) + SIDES):
+        raise ValueError("Nieznany format wpisu")
+    return value
+
+def negotiate(format: Optional[str], accept: Optional[str]) -> str:
+    """Format z parametru zapytania, a bez niego - pierwszy znany typ z nagłówka Accept."""
+    if format is not None:
+        return format
+    by_media_type = {media_type: name for name, media_type in MEDIA_TYPES.items()}
+    by_media_type["application/octet-stream"] = "binary"
+    for entry in (accept or "").split(","):
+        media_type = entry.split(";")[0].strip().lower()
+        if media_type in by_media_type:
+            return by_media_type[media_type]
+    return "json"
+
+def _history(columns: Dict[str, list]) -> List[dict]:
+    return [dict(zip(TRIAL_FIELDS, values)) for values in zip(*(columns[name] for name in TRIAL_FIELDS))]
+
+def row_layout(result: dict) -> dict:
+    """Układ ComparisonResponse (obiekt na próbę)."""
+    return {
+        "subject_data": {
+            "subject_index": result["subject_index"], "source_study": result["source_study"],
+            "history": _history(result["subject"]),
+        },
+        "mpc_data": _history(result["mpc"]),
+        "metrics": result["metrics"],
+    }
+
+def encode(results: List[dict], format: str, batch: bool) -> bytes:
+    """Treść odpowiedzi; `batch` - układ BatchComparisonResponse ({"total", "results"}) zamiast jednego wyniku."""
+    if format == "binary":
+        return encode_packed(results)
+    if format == "arrow":
+        return encode_arrow(results)
+    items = [row_layout(result) for result in results] if format == "json" else results
+    return dumps({"total": len(items), "results": items} if batch else items[0])
+
+def encode_packed(results: List[dict]) -> bytes:
+    """PACKED_MAGIC, u32 długość nagłówka, nagłówek JSON (badani, metryki, liczby prób, typy kolumn),
+    dopełnienie do 8 bajtów, potem dla każdej strony i pola - wartości wszystkich badanych po kolei."""
+    header = dumps({
+        "version": PACKED_VERSION, "sides": list(SIDES), "fields": [[name, PACKED_DTYPES[name]] for name in TRIAL_FIELDS],
+        "subjects": [
+            {
+                "subject_index": result["subject_index"], "source_study": result["source_study"],
+                "metrics": result["metrics"], "trials": [len(result[side]["trial"]) for side in SIDES],
+            }
+            for result in results
+        ],
+    })
+    parts = [PACKED_MAGIC, struct.pack("<I", len(header)), header, b"\0" * (-(len(header) + 8) % 8)]
+    for side in SIDES:
+        total = sum(len(result[side]["trial"]) for result in results)
+        for name in TRIAL_FIELDS:
+            if name == "deck":
+                letters = "".join("".join(result[side]["deck"]) for result in results)
+                parts.append(letters.encode().translate(_DECK_CODES))
+            else:
+                values = itertools.chain.from_iterable(result[side][name] for result in results)
+                parts.append(np.fromiter(values, dtype=PACKED_DTYPES[name], count=total).tobytes())
+    return b"".join(parts)
+
+def decode_packed(payload: bytes) -> List[dict]:
+    """Odwrotność encode_packed (np. dla klientów w Pythonie)."""
+    if payload[:4] != PACKED_MAGIC:
+        raise ValueError("To nie jest odpowiedź w formacie binary")
+    size = struct.unpack_from("<I", payload, 4)[0]
+    header = json.loads(payload[8:8 + size])
+    offset = 8 + size + (-(size + 8) % 8)
+    counts = np.array([subject["trials"] for subject in header["subjects"]], dtype=np.int64).reshape(-1, len(SIDES))
+    results = [
+        {key: subject[key] for key in ("subject_index", "source_study", "metrics")} for subject in header["subjects"]
+    ]
+    for s, side in enumerate(header["sides"]):
+        bounds = np.concatenate([[0], np.cumsum(counts[:, s])])
+        for name, dtype in header["fields"]:
+            values = np.frombuffer(payload, dtype=dtype, count=int(bounds[-1]), offset=offset)
+            offset += values.nbytes
+            for result, start, end in zip(results, bounds[:-1], bounds[1:]):
+                column = values[start:end].tolist()
+                result.setdefault(side, {})[name] = [DECK_LETTERS[d] for d in column] if name == "deck" else column
+    return results
+
+def encode_arrow(results: List[dict]) -> bytes:
+    """Jedna tabela Arrow (wiersz = próba) z kolumnami subject_index i side; metryki w metadanych schematu."""
+    if pa is None:
+        raise RuntimeError("Format arrow wymaga pakietu pyarrow")
+    columns: Dict[str, list] = {"subject_index": [], "side": []}
+    for name in TRIAL_FIELDS:
+        columns[name] = []
+    for result in results:
+        for side in SIDES:
+            n = len(result[side]["trial"])
+            columns["subject_index"].extend([result["subject_index"]] * n)
+            columns["side"].extend([side] * n)
+            for name in TRIAL_FIELDS:
+                columns[name].extend(result[side][name])
+    metadata = {
+        "subjects": dumps([
+            {key: result[key] for key in ("subject_index", "source_study", "metrics")} for result in results
+        ]),
+    }
+    table = pa.table(
+        {name: pa.array(values).dictionary_encode() if name in ("side", "deck") else pa.array(values, pa.int32())
+         for name, values in columns.items()},
+    ).replace_schema_metadata(metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+# --- CACHE WYNIKÓW (LRU w pamięci + opcjonalny magazyn na dysku) ---
+
+class ResultCache:
+    """Dwupoziomowy cache deterministycznych wyników.
+
+    Poziom 1: LRU w pamięci procesu, ograniczone liczbą wpisów i/lub bajtami.
+    Poziom 2 (opcjonalny): pliki w `disk_dir/<namespace>/`, współdzielone przez workery.
+    Namespace to odcisk zbioru danych - po zmianie danych stare wpisy przestają pasować.
+    `set_namespace` czyści pamięć, a z dysku usuwa tylko katalogi nieużywane od `namespace_ttl`
+    sekund: workery mogą jeszcze działać na poprzedniej wersji danych i korzystać z jej wpisów.
+    """
+
+    def __init__(
+        self,
+        dumps: Callable[[Any], bytes],
+        loads: Callable[[bytes], Any],
+        max_entries: int = 1024,
+        max_bytes: Optional[int] = None,
+        disk_dir: Optional[str] = None,
+        namespace_ttl: float = 3600,
+    ):
+        self._dumps = dumps
+        self._loads = loads
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.namespace_ttl = namespace_ttl
+        self.namespace = "default"
+
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def set_namespace(self, namespace: str):
+        with self._lock:
+            if namespace == self.namespace:
+                return
+            self.namespace = namespace
+            self._entries.clear()
+            self._bytes = 0
+        if not self.disk_dir:
+            return
+        # Czas modyfikacji katalogu = ostatnie użycie (nowe wpisy też go zmieniają)
+        current = os.path.join(self.disk_dir, namespace)
+        os.makedirs(current, exist_ok=True)
+        os.utime(current)
+        cutoff = time.time() - self.namespace_ttl
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            try:
+                stale = name != namespace and os.path.getmtime(path) < cutoff
+            except OSError:
+                continue
+            if stale:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        path = self._disk_path(key)
+        if path and os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    payload = f.read()
+                value = self._loads(payload)
+            except (OSError, ValueError):
+                value = None
+            if value is not None:
+                self._remember(key, value, len(payload))
+                with self._lock:
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: Any):
+        payload = self._dumps(value) if (self.disk_dir or self.max_bytes) else None
+        self._remember(key, value, len(payload) if payload is not None else 0)
+
+        path = self._disk_path(key)
+        if path and payload is not None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Zapis atomowy: inne workery nigdy nie widzą połowy pliku
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            if key in self._entries:
+                return True
+        path = self._disk_path(key)
+        return bool(path) and os.path.exists(path)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remember(self, key: Hashable, value: Any, size: int):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def _disk_path(self, key: Hashable) -> Optional[str]:
+        if not self.disk_dir:
+            return None
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.disk_dir, self.namespace, f"{digest}.json")
@@ -0,0 +1,260 @@
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, NamedTuple, Optional, Tuple
+
+from simulation import StochasticMPCAgent, _get_standard_scheme_cards
+
+# --- SESJE GRY NA ŻYWO ---
+#
+# Talie są wspólne dla wszystkich sesji (jedna niezmienna tabela), a sesja to tylko
+# kilka liczb: wynik, tura, cztery liczniki kart i ostatnio wybrana talia.
+# Ostatni ruch (wygrana/strata) odczytujemy z tabeli talii, więc nie trzeba go przechowywać.
+
+DECK_IDS = ("A", "B", "C", "D")
+LIVE_DECK_SIZE = 200  # zapas kart wg schematu Bechary
+GAME_TRIALS = 100
+START_SCORE = 2000
+
+LIVE_DECKS: Tuple[Tuple[Tuple[int, int], ...], ...] = tuple(
+    tuple(_get_standard_scheme_cards(d, 0, LIVE_DECK_SIZE)) for d in DECK_IDS
+)
+
+def live_card(deck: int, counter: int) -> Tuple[int, int]:
+    # Po wyczerpaniu zapasu wracamy do pierwszej karty (jak dotychczas)
+    return LIVE_DECKS[deck][counter if counter < LIVE_DECK_SIZE else 0]
+
+class SessionState(NamedTuple):
+    session_id: str
+    score: int = START_SCORE
+    turn: int = 0
+    counters: Tuple[int, int, int, int] = (0, 0, 0, 0)
+    last_deck: int = -1  # -1 = jeszcze bez ruchu
+
+    @property
+    def is_game_ended(self) -> bool:
+        return self.turn >= GAME_TRIALS
+
+    def last_move(self) -> Optional[Tuple[str, int, int]]:
+        """(talia, wygrana, strata) ostatniego ruchu albo None."""
+        if self.last_deck < 0:
+            return None
+        gain, loss = live_card(self.last_deck, self.counters[self.last_deck] - 1)
+        return DECK_IDS[self.last_deck], gain, loss
+
+    def choose(self, deck_id: str) -> "SessionState":
+        deck = DECK_IDS.index(deck_id)
+        gain, loss = live_card(deck, self.counters[deck])
+        counters = list(self.counters)
+        counters[deck] += 1
+        return self._replace(score=self.score + gain + loss, turn=self.turn + 1, counters=tuple(counters), last_deck=deck)
+
+class LiveOpponent:
+    """Agent MPC grający obok gracza na tych samych taliach (własne liczniki kart i wynik).
+
+    Ruchy agenta nie zależą od ruchów gracza, więc po ponownym połączeniu wystarczy
+    rozegrać tyle tur, ile ma sesja (`catch_up`), żeby odtworzyć jego stan.
+    """
+
+    def __init__(self, planning_horizon: int = 2, **params):
+        self.agent = StochasticMPCAgent(strategy="human", planning_horizon=planning_horizon, **params)
+        self.state = SessionState(session_id="")
+
+    def play(self) -> SessionState:
+        deck_id = self.agent.select_action()
+        self.state = self.state.choose(deck_id)
+        _, gain, loss = self.state.last_move()
+        self.agent.update_model(deck_id, gain + loss)
+        return self.state
+
+    def catch_up(self, turn: int):
+        while self.state.turn < turn:
+            self.play()
+
+class SessionStore(ABC):
+    """Interfejs magazynu sesji. Sesje wygasają po `ttl` sekundach bez ruchu,
+    a powyżej `max_sessions` usuwane są najdawniej używane.
+
+    `blocking` - operacje mogą czekać na dysk lub blokadę innego procesu, więc z pętli
+    zdarzeń wołamy je w wątku.
+    """
+
+    blocking = False
+
+    def __init__(self, max_sessions: int = 10000, ttl: Optional[float] = 3600):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[SessionState]: ...
+
+    @abstractmethod
+    def put(self, state: SessionState): ...
+
+    @abstractmethod
+    def update(self, session_id: str, fn: Callable[[SessionState], SessionState]) -> Optional[SessionState]:
+        """Atomowo zastępuje stan wynikiem `fn(stan)`; None, gdy sesji nie ma lub wygasła."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Liczba aktywnych sesji - tylko odczyt, wygasłe usuwają operacje zapisu."""
+
+    def _expired(self, touched_at: float, now: float) -> bool:
+        return self.ttl is not None and now - touched_at > self.ttl
+
+class MemorySessionStore(SessionStore):
+    """Sesje w pamięci procesu (jeden worker uvicorn)."""
+
+    def __init__(self, max_sessions: int = 10000, ttl: Optional[float] = 3600):
+        super().__init__(max_sessions, ttl)
+        self._sessions: "OrderedDict[str, Tuple[SessionState, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[SessionState]:
+        with self._lock:
+            return self._get(session_id, time.time())
+
+    def put(self, state: SessionState):
+        with self._lock:
+            self._store(state, time.time())
+
+    def update(self, session_id: str, fn: Callable[[SessionState], SessionState]) -> Optional[SessionState]:
+        with self._lock:
+            now = time.time()
+            state = self._get(session_id, now)
+            if state is None:
+                return None
+            state = fn(state)
+            self._store(state, now)
+            return state
+
+    def __len__(self) -> int:
+        with self._lock:
+            now = time.time()
+            # Kolejność = ostatni ruch - liczymy wygasłe z początku, nic nie usuwając
+            expired = 0
+            for _, touched_at in self._sessions.values():
+                if not self._expired(touched_at, now):
+                    break
+                expired += 1
+            return len(self._sessions) - expired
+
+    def _get(self, session_id: str, now: float) -> Optional[SessionState]:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        if self._expired(entry[1], now):
+            del self._sessions[session_id]
+            return None
+        return entry[0]
+
+    def _store(self, state: SessionState, now: float):
+        self._sessions[state.session_id] = (state, now)
+        self._sessions.move_to_end(state.session_id)
+        self._evict(now)
+
+    def _evict(self, now: float):
+        # Kolejność = ostatni ruch, więc wygasłe sesje są zawsze na początku
+        while self._sessions:
+            session_id, (_, touched_at) = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and not self._expired(touched_at, now):
+                break
+            del self._sessions[session_id]
+
+class SQLiteSessionStore(SessionStore):
+    """Sesje w lokalnej bazie SQLite (WAL) - wspólne dla wszystkich workerów na jednej maszynie."""
+
+    blocking = True
+
+    def __init__(self, path: str, max_sessions: int = 10000, ttl: Optional[float] = 3600):
+        super().__init__(max_sessions, ttl)
+        self.path = path
+        self._local = threading.local()
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, score INTEGER, turn INTEGER,"
+                " a INTEGER, b INTEGER, c INTEGER, d INTEGER, last_deck INTEGER, touched_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_touched ON sessions (touched_at)")
+
+    def get(self, session_id: str) -> Optional[SessionState]:
+        with self._transaction() as conn:
+            return self._get(conn, session_id, time.time())
+
+    def put(self, state: SessionState):
+        with self._transaction() as conn:
+            now = time.time()
+            self._store(conn, state, now)
+            self._evict(conn, now)
+
+    def update(self, session_id: str, fn: Callable[[SessionState], SessionState]) -> Optional[SessionState]:
+        # BEGIN IMMEDIATE - dwa workery nie zagrają tej samej tury jednocześnie
+        with self._transaction(immediate=True) as conn:
+            now = time.time()
+            state = self._get(conn, session_id, now)
+            if state is None:
+                return None
+            state = fn(state)
+            self._store(conn, state, now)
+            return state
+
+    def __len__(self) -> int:
+        since = time.time() - self.ttl if self.ttl is not None else float("-inf")
+        return self._connection().execute("SELECT COUNT(*) FROM sessions WHERE touched_at >= ?", (since,)).fetchone()[0]
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self, immediate: bool = False):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _get(self, conn: sqlite3.Connection, session_id: str, now: float) -> Optional[SessionState]:
+        row = conn.execute(
+            "SELECT score, turn, a, b, c, d, last_deck, touched_at FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None or self._expired(row[7], now):
+            return None
+        return SessionState(session_id, row[0], row[1], tuple(row[2:6]), row[6])
+
+    def _store(self, conn: sqlite3.Connection, state: SessionState, now: float):
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (state.session_id, state.score, state.turn, *state.counters, state.last_deck, now),
+        )
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        if self.ttl is not None:
+            conn.execute("DELETE FROM sessions WHERE touched_at < ?", (now - self.ttl,))
+        conn.execute(
+            "DELETE FROM sessions WHERE session_id IN (SELECT session_id FROM sessions"
+            " ORDER BY touched_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,),
+        )
+
+def create_session_store(backend: str, path: str, max_sessions: int, ttl: Optional[float]) -> SessionStore:
+    if backend == "memory":
+        return MemorySessionStore(max_sessions, ttl)
+    if backend == "sqlite":
+        return SQLiteSessionStore(path, max_sessions, ttl)
+    raise ValueError(f"Nieznany magazyn sesji: {backend}")
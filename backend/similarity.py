@@ -0,0 +1,157 @@
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+from metrics import _deck_entropy, _wsls_followed
+
+# --- PODOBNI BADANI: SYGNATURY ZACHOWANIA I INDEKS NAJBLIŻSZYCH SĄSIADÓW ---
+#
+# Sygnatura badanego to wektor stałej długości liczony przy ładowaniu danych:
+# udział talii A-D w SIGNATURE_BLOCKS blokach (względnych - badani mają różną liczbę prób),
+# odsetek ruchów zgodnych z Win-Stay / Lose-Shift, entropia wyborów i kapitał w
+# CAPITAL_POINTS równo rozłożonych punktach gry. Wejście jak w metrics.py.
+
+SIGNATURE_BLOCKS = 5
+CAPITAL_POINTS = 10
+CAPITAL_SCALE = 2000.0  # kapitał względem startowych 2000
+SIGNATURE_SIZE = 4 * SIGNATURE_BLOCKS + 2 + CAPITAL_POINTS
+
+def behaviour_signatures(decks: np.ndarray, nets: np.ndarray, totals: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """(badani, SIGNATURE_SIZE) float32; badany bez prób ma wektor zerowy."""
+    n_subjects, trials = decks.shape
+    valid = np.arange(trials) < lengths[:, None]
+    safe_n = np.maximum(lengths, 1)
+
+    # Blok próby t: t * SIGNATURE_BLOCKS // liczba prób badanego
+    block = (np.arange(trials) * SIGNATURE_BLOCKS) // safe_n[:, None]
+    rows = np.broadcast_to(np.arange(n_subjects)[:, None], decks.shape)
+    index = ((rows * SIGNATURE_BLOCKS + block) * 5 + np.minimum(decks, 4))[valid]
+    counts = np.bincount(index, minlength=n_subjects * SIGNATURE_BLOCKS * 5).reshape(n_subjects, SIGNATURE_BLOCKS, 5)
+    proportions = counts[..., :4] / np.maximum(counts.sum(axis=-1, keepdims=True), 1)
+
+    wsls_valid = valid[:, 1:]
+    wsls = (_wsls_followed(decks, nets) & wsls_valid).sum(axis=1) / np.maximum(wsls_valid.sum(axis=1), 1)
+    entropy = _deck_entropy(decks, valid, lengths) / 2  # maks. 2 bity przy 4 taliach
+
+    points = np.ceil(np.arange(1, CAPITAL_POINTS + 1) / CAPITAL_POINTS * safe_n[:, None]).astype(np.int64) - 1
+    capital = (np.take_along_axis(totals, np.minimum(points, max(trials - 1, 0)), axis=1) - 2000) / CAPITAL_SCALE \
+        if trials else np.zeros((n_subjects, CAPITAL_POINTS))
+
+    signatures = np.concatenate(
+        [proportions.reshape(n_subjects, -1), wsls[:, None], entropy[:, None], capital], axis=1,
+    ).astype(np.float32)
+    signatures[lengths == 0] = 0
+    return signatures
+
+class SignatureIndex:
+    """Indeks najbliższych sąsiadów (odległość euklidesowa) aktualizowany przyrostowo.
+
+    Do `flat_below` wektorów - przeszukanie wszystkich jedną operacją tablicową. Powyżej -
+    IVF: k-means dzieli wektory na ~sqrt(N) list, zapytanie przegląda tylko `n_probe` list
+    o najbliższych centroidach. Wektory leżą w pamięci posortowane wg list, więc lista to
+    ciągły wycinek. Nowe i zmienione wektory przypisujemy do istniejących centroidów;
+    k-means liczymy od nowa dopiero, gdy zbiór urośnie `retrain_growth` razy.
+    """
+
+    def __init__(self, flat_below: int = 4096, n_probe: int = 8, retrain_growth: float = 2.0, seed: int = 0):
+        self.flat_below = flat_below
+        self.n_probe = n_probe
+        self.retrain_growth = retrain_growth
+        self.seed = seed
+        self.vectors = np.zeros((0, SIGNATURE_SIZE), dtype=np.float32)
+        self.assignment = np.zeros(0, dtype=np.int64)
+        self.centroids: Optional[np.ndarray] = None
+        self._trained_size = 0
+        # (kolejność, wektory wg list, początki list, centroidy) - podmieniane jednym przypisaniem,
+        # więc zapytania w trakcie aktualizacji widzą poprzednią albo nową wersję w całości
+        self._layout: Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]] = (
+            np.zeros(0, dtype=np.int64), self.vectors, np.zeros(1, dtype=np.int64), None,
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._layout[0])
+
+    @property
+    def method(self) -> str:
+        return "flat" if self._layout[3] is None else "ivf"
+
+    def sync(self, vectors: np.ndarray) -> int:
+        """Dopasowuje indeks do pełnej tablicy wektorów; zwraca liczbę dodanych lub zmienionych.
+
+        Wiersze to indeksy badanych - nowi badani są zawsze dopisywani na końcu zbioru.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            known = len(self.vectors)
+            if len(vectors) < known:
+                # Zbiór przebudowany od zera - indeks też
+                known, self.centroids, self._trained_size = 0, None, 0
+            changed = np.flatnonzero((self.vectors[:known] != vectors[:known]).any(axis=1))
+            rows = np.concatenate([changed, np.arange(known, len(vectors))])
+            if not len(rows):
+                return 0
+            self.vectors = vectors.copy()
+            self.assignment = np.resize(self.assignment, len(vectors))
+
+            if len(vectors) < self.flat_below:
+                self.centroids = None
+            elif self.centroids is None or len(vectors) > self.retrain_growth * self._trained_size:
+                self._train()
+            else:
+                self.assignment[rows] = self._nearest_centroid(self.vectors[rows])
+            self._publish()
+            return len(rows)
+
+    def search(self, query: np.ndarray, k: int, exclude: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(indeksy, odległości) `k` najbliższych wektorów, rosnąco; `exclude` - pomijany wiersz."""
+        order, vectors, offsets, centroids = self._layout
+        if centroids is None:
+            ids, block = order, vectors
+        else:
+            distances = ((centroids - query) ** 2).sum(axis=1)
+            probes = np.argsort(distances)[:self.n_probe]
+            ids = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in probes])
+            block = np.concatenate([vectors[offsets[c]:offsets[c + 1]] for c in probes])
+
+        distances = ((block - query) ** 2).sum(axis=1)
+        if exclude is not None:
+            distances[ids == exclude] = np.inf
+        k = min(k, int(np.isfinite(distances).sum()))
+        best = np.argpartition(distances, k - 1)[:k] if k else np.zeros(0, dtype=np.int64)
+        best = best[np.argsort(distances[best], kind="stable")]
+        return ids[best], np.sqrt(distances[best])
+
+    def _train(self, iterations: int = 10):
+        rng = np.random.default_rng(self.seed)
+        n_lists = max(1, int(np.sqrt(len(self.vectors))))
+        self.centroids = self.vectors[rng.choice(len(self.vectors), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            self.assignment = self._nearest_centroid(self.vectors)
+            sizes = np.bincount(self.assignment, minlength=n_lists)
+            sums = np.stack([
+                np.bincount(self.assignment, weights=self.vectors[:, d], minlength=n_lists) for d in range(SIGNATURE_SIZE)
+            ], axis=1)
+            # Pusta lista zostaje przy starym centroidzie
+            filled = sizes > 0
+            self.centroids[filled] = (sums[filled] / sizes[filled, None]).astype(np.float32)
+        self.assignment = self._nearest_centroid(self.vectors)
+        self._trained_size = len(self.vectors)
+
+    def _nearest_centroid(self, vectors: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+        # |x - c|^2 = |x|^2 - 2 x.c + |c|^2; |x|^2 nie wpływa na wybór centroidu
+        norms = (self.centroids ** 2).sum(axis=1)
+        return np.concatenate([
+            np.argmin(norms - 2 * vectors[start:start + chunk_size] @ self.centroids.T, axis=1)
+            for start in range(0, len(vectors), chunk_size)
+        ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+    def _publish(self):
+        if self.centroids is None:
+            order = np.arange(len(self.vectors))
+            offsets = np.array([0, len(order)])
+        else:
+            order = np.argsort(self.assignment, kind="stable")
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(self.assignment, minlength=len(self.centroids)))])
+        self._layout = (order, self.vectors[order], offsets, None if self.centroids is None else self.centroids.copy())
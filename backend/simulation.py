@@ -0,0 +1,517 @@
+import itertools
+from functools import lru_cache
+from typing import Dict, List, Literal, Optional, Tuple
+
+import numpy as np
+
+# --- SYMULACJA (schemat Bechary, środowisko, agent MPC) ---
+
+MAX_TRIALS = 150
+DECK_IDS = ("A", "B", "C", "D")
+
+def _build_scheme() -> np.ndarray:
+    """Schemat Bechary: tablica (4, 40, 2) [gain, loss] dla talii A-D."""
+    # Deck A Losses (40 trials sequence)
+    # T3=-150, T5=-300, T7=-200, T9=-250, T10=-350, T12=-350, T14=-250, T15=-200
+    # T17=-300, T18=-150, T22=-300, T24=-350, T26=-200, T27=-250, T28=-150
+    # T31=-350, T32=-200, T33=-250, T37=-150, T38=-300
+    A_losses = [0] * 40
+    for idx, val in [
+        (3, -150), (5, -300), (7, -200), (9, -250), (10, -350), 
+        (12, -350), (14, -250), (15, -200), (17, -300), (18, -150),
+        (22, -300), (24, -350), (26, -200), (27, -250), (28, -150),
+        (31, -350), (32, -200), (33, -250), (37, -150), (38, -300)
+    ]:
+        A_losses[idx-1] = val 
+
+    # Deck B Losses (40 trials sequence)
+    # T9=-1250, T14=-1250, T21=-1250, T32=-1250
+    B_losses = [0] * 40
+    for idx, val in [(9, -1250), (14, -1250), (21, -1250), (32, -1250)]:
+        B_losses[idx-1] = val
+
+    # Deck C Losses (40 trials sequence)
+    # T3=-50, T5=-50, T7=-50, T9=-50, T10=-50, T12=-25, T13=-75, T17=-25, T18=-75
+    # T20=-50, T24=-50, T25=-25, T26=-50, T29=-75, T30=-50, T34=-25, T35=-25
+    # T37=-75, T39=-50, T40=-75
+    C_losses = [0] * 40
+    for idx, val in [
+        (3, -50), (5, -50), (7, -50), (9, -50), (10, -50), (12, -25), (13, -75),
+        (17, -25), (18, -75), (20, -50), (24, -50), (25, -25), (26, -50),
+        (29, -75), (30, -50), (34, -25), (35, -25), (37, -75), (39, -50), (40, -75)
+    ]:
+        C_losses[idx-1] = val
+
+    # Deck D Losses (40 trials sequence)
+    # T10=-250, T20=-250, T29=-250, T35=-250
+    D_losses = [0] * 40
+    for idx, val in [(10, -250), (20, -250), (29, -250), (35, -250)]:
+        D_losses[idx-1] = val
+
+    scheme = np.array([
+        [(100, l) for l in A_losses],
+        [(100, l) for l in B_losses],
+        [(50, l) for l in C_losses],
+        [(50, l) for l in D_losses],
+    ], dtype=np.int16)
+    scheme.setflags(write=False)
+    return scheme
+
+# Budowane raz przy imporcie, tylko do odczytu
+BECHARA_SCHEME = _build_scheme()
+SCHEME_LENGTH = BECHARA_SCHEME.shape[1]
+# Schemat powtórzony cyklicznie do MAX_TRIALS kart - karta nr p talii to SCHEME_TABLE[d, p]
+SCHEME_TABLE = BECHARA_SCHEME[:, np.arange(MAX_TRIALS) % SCHEME_LENGTH]
+SCHEME_TABLE.setflags(write=False)
+_SCHEME_CARDS = {d: tuple(map(tuple, BECHARA_SCHEME[i].tolist())) for i, d in enumerate(DECK_IDS)}
+
+def _get_standard_scheme_cards(deck_id: str, start_index: int, count: int) -> List[Tuple[int, int]]:
+    source_seq = _SCHEME_CARDS.get(deck_id, ((0, 0),))
+    seq_len = len(source_seq)
+    return [source_seq[(start_index + i) % seq_len] for i in range(count)]
+
+def build_replay_decks(choices, wins, losses, chunk_size: int = 4096) -> np.ndarray:
+    """Odtworzone talie wielu badanych: tablica (N, 4, MAX_TRIALS, 2) [gain, loss].
+
+    Talia d zawiera najpierw karty, które badany faktycznie wyciągnął z d (w kolejności prób),
+    a dalej karty schematu Bechary od tej samej pozycji - czyli SCHEME_TABLE[d, p].
+    """
+    choices = np.asarray(choices)
+    wins, losses = np.asarray(wins), np.asarray(losses)
+    dtype = np.result_type(wins.dtype, losses.dtype, np.int16)
+    decks = np.empty((len(choices), 4, MAX_TRIALS, 2), dtype=dtype)
+    decks[:] = SCHEME_TABLE
+
+    # Partiami - pozycje w taliach (N, T, 4) dla dużych kohort nie mieszczą się naraz
+    for start in range(0, len(choices), chunk_size):
+        c = choices[start:start + chunk_size].astype(np.intp) - 1
+        valid = (c >= 0) & (c < 4)
+        deck = np.where(valid, c, 0)
+        # Pozycja karty w talii = ile razy badany wybrał już tę talię
+        drawn = np.cumsum(valid[..., None] & (deck[..., None] == np.arange(4)), axis=1, dtype=np.int32)
+        position = np.take_along_axis(drawn, deck[..., None], axis=2)[..., 0] - 1
+        rows, cols = np.nonzero(valid & (position < MAX_TRIALS))
+        target = (start + rows, deck[rows, cols], position[rows, cols])
+        decks[target + (0,)] = wins[start + rows, cols]
+        decks[target + (1,)] = losses[start + rows, cols]
+    return decks
+
+def _reconstruct_environment_from_human(c_row, w_row, l_row) -> np.ndarray:
+    """Talie (4, MAX_TRIALS, 2) jednego badanego - patrz `build_replay_decks`."""
+    return build_replay_decks(np.asarray(c_row)[None], np.asarray(w_row)[None], np.asarray(l_row)[None])[0]
+
+class ReplayedEnvironment:
+    """Talie jednego badanego (4, MAX_TRIALS, 2), np. wycinek prekomputowanego tensora."""
+
+    def __init__(self, reconstructed_decks):
+        # Listy Pythona - step() zwraca zwykłe int, a indeksowanie list jest szybsze niż tablic
+        self.decks = dict(zip(DECK_IDS, np.asarray(reconstructed_decks).tolist()))
+        self.counters = {"A": 0, "B": 0, "C": 0, "D": 0}
+        
+    def step(self, deck_id):
+        idx = self.counters[deck_id]
+        if idx >= len(self.decks[deck_id]):
+            idx = 0
+        gain, loss = self.decks[deck_id][idx]
+        self.counters[deck_id] += 1
+        return gain, loss, gain + loss
+
+PlannerName = Literal["counts", "enumerate"]
+
+MAX_PLANNING_HORIZON = 12
+MAX_ENUMERATE_HORIZON = 6  # 4^6 = 4096 ścieżek na ruch
+
+# Do tego horyzontu oceniamy wszystkie 4^H ścieżek (wektorowo) tą samą arytmetyką
+# co enumerator - przy remisach o wyborze decyduje kolejność dodawania floatów.
+EXACT_TIEBREAK_HORIZON = 3
+
+@lru_cache(maxsize=None)
+def _horizon_compositions(horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Wszystkie rozkłady `horizon` ciągnięć na 4 talie i pierwsza talia ścieżki.
+
+    Kompozycje są posortowane wg najmniejszej talii o niezerowej liczbie ciągnięć,
+    czyli pierwszego ruchu leksykograficznie najmniejszej ścieżki z danego multizbioru.
+    """
+    comps = [c for c in itertools.product(range(horizon + 1), repeat=4) if sum(c) == horizon]
+    comps.sort(key=lambda c: next(i for i, k in enumerate(c) if k > 0))
+    comps_arr = np.array(comps, dtype=np.intp)
+    first = np.argmax(comps_arr > 0, axis=1)
+    comps_arr.setflags(write=False)
+    first.setflags(write=False)
+    return comps_arr, first
+
+@lru_cache(maxsize=None)
+def _horizon_paths(horizon: int) -> np.ndarray:
+    paths = np.array(list(itertools.product(range(4), repeat=horizon)), dtype=np.intp)
+    paths.setflags(write=False)
+    return paths
+
+def _plan_path_values(means, variances, counts, info_weight, horizon: int) -> np.ndarray:
+    """Wartości wszystkich multizbiorów ścieżek o długości `horizon`.
+
+    Użyteczność ścieżki zależy tylko od tego, ile razy ciągniemy każdą talię:
+    j-te (od zera) ciągnięcie talii d daje mean_d + w * sqrt(var_d * (n_d + 1) / (n_d + 1 + j)),
+    bo wariancja maleje teleskopowo o n / (n + 1) po każdym ciągnięciu.
+    Działa dla dowolnych wymiarów wiodących (..., 4).
+    """
+    comps, _ = _horizon_compositions(horizon)
+    means = np.asarray(means, dtype=float)
+    counts = np.asarray(counts, dtype=float)[..., None]
+    weight = np.asarray(info_weight, dtype=float)[..., None, None]
+    steps = np.arange(horizon)
+    step_values = means[..., None] + weight * np.sqrt(
+        np.asarray(variances, dtype=float)[..., None] * (counts + 1) / (counts + 1 + steps)
+    )
+    tables = np.zeros(step_values.shape[:-1] + (horizon + 1,))
+    np.cumsum(step_values, axis=-1, out=tables[..., 1:])
+    return sum(tables[..., d, comps[:, d]] for d in range(4))
+
+def _enumerated_path_values(means, variances, counts, info_weight, horizon: int) -> np.ndarray:
+    """Wartości wszystkich 4^H ścieżek, krok po kroku jak w `_select_action_enumerate`."""
+    paths = _horizon_paths(horizon)
+    rows = np.arange(len(paths))
+    means = np.asarray(means, dtype=float)
+    weight = np.asarray(info_weight, dtype=float)[..., None]
+    lead = means.shape[:-1] + (len(paths), 4)
+    sim_vars = np.broadcast_to(np.asarray(variances, dtype=float)[..., None, :], lead).copy()
+    sim_counts = np.broadcast_to(np.asarray(counts, dtype=float)[..., None, :], lead).copy()
+    cumulative = np.zeros(lead[:-1])
+    for step in range(horizon):
+        d = paths[:, step]
+        cumulative = cumulative + (means[..., d] + weight * np.sqrt(sim_vars[..., rows, d]))
+        sim_counts[..., rows, d] += 1
+        n = np.maximum(1, sim_counts[..., rows, d])
+        sim_vars[..., rows, d] *= n / (n + 1)
+    return cumulative
+
+def _first_deck_values(means, variances, counts, info_weight, horizon: int) -> np.ndarray:
+    """Wartość najlepszej ścieżki zaczynającej się od każdej talii: (..., 4)."""
+    values = _plan_path_values(means, variances, counts, info_weight, horizon)
+    comps, _ = _horizon_compositions(horizon)
+    return np.stack([np.where(comps[:, d] > 0, values, -np.inf).max(axis=-1) for d in range(4)], axis=-1)
+
+def _plan_first_deck(means, variances, counts, info_weight, horizon: int) -> np.ndarray:
+    """Indeks pierwszej talii najlepszej ścieżki dla stanu (..., 4)."""
+    if horizon <= EXACT_TIEBREAK_HORIZON:
+        values = _enumerated_path_values(means, variances, counts, info_weight, horizon)
+        return _horizon_paths(horizon)[np.argmax(values, axis=-1), 0]
+    # Remisy (z dokładnością do zaokrągleń) -> najmniejsza talia, jak w enumeratorze
+    values = _plan_path_values(means, variances, counts, info_weight, horizon)
+    best = values.max(axis=-1, keepdims=True)
+    winners = values >= best - 1e-9 * np.maximum(1.0, np.abs(best))
+    _, first = _horizon_compositions(horizon)
+    return first[np.argmax(winners, axis=-1)]
+
+def planner_evaluations(horizon: int, planner: PlannerName = "counts") -> int:
+    """Liczba ścieżek (albo multizbiorów) ocenianych przy jednej decyzji agenta."""
+    if planner == "enumerate" or horizon <= EXACT_TIEBREAK_HORIZON:
+        return 4 ** horizon
+    return len(_horizon_compositions(horizon)[0])
+
+PRIOR_VARIANCE = 1000
+VARIANCE_WINDOW = 20
+
+class _BeliefState:
+    """Przekonania agenta MPC o taliach dla stanu o kształcie (..., 4).
+
+    Wspólne dla pojedynczego agenta (kształt ()) i symulacji wsadowej (kształt (N,)),
+    dzięki czemu obie ścieżki wykonują dokładnie te same operacje zmiennoprzecinkowe.
+    """
+
+    def __init__(self, shape, strategy, loss_aversion=None, learning_rate=None, info_value_weight=None):
+        self.strategy = strategy
+
+        self.means = np.zeros(shape + (4,))
+        self.variances = np.ones(shape + (4,)) * PRIOR_VARIANCE
+        self.counts = np.zeros(shape + (4,))
+
+        # Statystyki bieżące zamiast pełnej historii (stała pamięć na agenta):
+        # Welford dla "optimal", bufor cykliczny ostatnich VARIANCE_WINDOW wyników dla "human"
+        if shape == ():
+            # Pojedynczy agent: statystyki w listach Pythona, aktualizowane przez _observe_one
+            self._m2 = [0.0] * 4
+            self._window = [[0.0] * VARIANCE_WINDOW for _ in range(4)]
+            self._window_len = [0] * 4
+            self._window_pos = [0] * 4
+            self._window_mean = [0.0] * 4
+            self._window_m2 = [0.0] * 4
+        else:
+            self._m2 = np.zeros(shape + (4,))
+            self._window = np.zeros(shape + (4, VARIANCE_WINDOW))
+            self._window_len = np.zeros(shape + (4,), dtype=int)
+            self._window_pos = np.zeros(shape + (4,), dtype=int)
+            self._window_mean = np.zeros(shape + (4,))
+            self._window_m2 = np.zeros(shape + (4,))
+
+        if loss_aversion is None:
+            loss_aversion = 4.9 if strategy == "human" else 1.0
+        if learning_rate is None:
+            learning_rate = 0.3 if strategy == "human" else None
+        if info_value_weight is None:
+            info_value_weight = 0.8 # ciekawosc
+        self.loss_aversion = loss_aversion
+        self.learning_rate = learning_rate
+        self.info_value_weight = info_value_weight
+
+        # self.loss_aversion = 0.9 if strategy == "human" else 1.0
+        # self.learning_rate = 0.3 if strategy == "human" else None
+        # self.info_value_weight = 2 # ciekawosc
+
+    def _observe(self, rows, deck_idx, net_result):
+        """Aktualizuje przekonania o talii `deck_idx` w wierszach `rows` (() dla agenta)."""
+        if rows == ():
+            self._observe_one(int(deck_idx), float(net_result))
+            return
+        key = rows + (deck_idx,)
+        self.counts[key] += 1
+        n = self.counts[key]
+
+        gain = np.where(deck_idx < 2, 100, 50)
+        real_loss = gain - net_result
+        utility = gain - (real_loss * np.asarray(self.loss_aversion)[rows])
+
+        if self.strategy == "optimal":
+            # Welford: średnia i wariancja (ddof=1) wszystkich dotychczasowych wyników
+            delta = utility - self.means[key]
+            self.means[key] += delta / n
+            self._m2[key] += delta * (utility - self.means[key])
+            variance = self._m2[key] / np.maximum(n - 1, 1)
+        else:
+            old_mean = self.means[key]
+            self.means[key] = old_mean + np.asarray(self.learning_rate)[rows] * (utility - old_mean)
+            self._push_window(key, utility)
+            variance = self._window_m2[key] / np.maximum(self._window_len[key] - 1, 1)
+        self.variances[key] = np.where(n > 1, variance, PRIOR_VARIANCE)
+
+    def _push_window(self, key, utility):
+        """Wariancja kroczącego okna w O(1): dodanie lub podmiana najstarszej wartości."""
+        pos = self._window_pos[key]
+        size = self._window_len[key]
+        mean = self._window_mean[key]
+        evicted = self._window[key + (pos,)]
+        full = size >= VARIANCE_WINDOW
+
+        new_size = np.where(full, size, size + 1)
+        diff = np.where(full, utility - evicted, utility - mean)
+        new_mean = mean + diff / new_size
+        m2 = self._window_m2[key] + np.where(
+            full, diff * (utility - new_mean + evicted - mean), diff * (utility - new_mean)
+        )
+        self._window_m2[key] = np.where(full, np.maximum(m2, 0.0), m2)
+
+        self._window[key + (pos,)] = utility
+        self._window_pos[key] = (pos + 1) % VARIANCE_WINDOW
+        self._window_len[key] = new_size
+        self._window_mean[key] = new_mean
+
+    def _observe_one(self, deck: int, net_result: float):
+        """_observe dla pojedynczego agenta: te same działania w tej samej kolejności, ale na
+        liczbach Pythona - narzut numpy na wartościach 0-d jest większy niż sam rachunek."""
+        n = self.counts.item(deck) + 1
+        self.counts[deck] = n
+
+        gain = 100 if deck < 2 else 50
+        utility = gain - (gain - net_result) * float(self.loss_aversion)
+
+        mean = self.means.item(deck)
+        if self.strategy == "optimal":
+            delta = utility - mean
+            mean += delta / n
+            self.means[deck] = mean
+            self._m2[deck] += delta * (utility - mean)
+            variance = self._m2[deck] / max(n - 1, 1)
+        else:
+            self.means[deck] = mean + float(self.learning_rate) * (utility - mean)
+            variance = self._push_window_one(deck, utility)
+        self.variances[deck] = variance if n > 1 else PRIOR_VARIANCE
+
+    def _push_window_one(self, deck: int, utility: float) -> float:
+        """_push_window dla pojedynczego agenta; zwraca wariancję okna (ddof=1)."""
+        pos = self._window_pos[deck]
+        size = self._window_len[deck]
+        mean = self._window_mean[deck]
+        window = self._window[deck]
+        evicted = window[pos]
+
+        if size >= VARIANCE_WINDOW:
+            diff = utility - evicted
+            new_mean = mean + diff / size
+            m2 = max(self._window_m2[deck] + diff * (utility - new_mean + evicted - mean), 0.0)
+        else:
+            size += 1
+            diff = utility - mean
+            new_mean = mean + diff / size
+            m2 = self._window_m2[deck] + diff * (utility - new_mean)
+
+        window[pos] = utility
+        self._window_pos[deck] = (pos + 1) % VARIANCE_WINDOW
+        self._window_len[deck] = size
+        self._window_mean[deck] = new_mean
+        self._window_m2[deck] = m2
+        return m2 / max(size - 1, 1)
+
+class StochasticMPCAgent(_BeliefState):
+    def __init__(
+        self,
+        strategy: str = "optimal",
+        planning_horizon: int = 2,
+        planner: PlannerName = "counts",
+        loss_aversion: float = None,
+        learning_rate: float = None,
+        info_value_weight: float = None,
+    ):
+        super().__init__((), strategy, loss_aversion, learning_rate, info_value_weight)
+        self.deck_ids = ["A", "B", "C", "D"]
+        self.planning_horizon = planning_horizon
+        self.planner = planner
+
+    def select_action(self):
+        if self.planner == "enumerate":
+            return self._select_action_enumerate()
+        return self._select_action_counts()
+
+    def _select_action_counts(self):
+        # Przeszukujemy multizbiory liczby ciągnięć zamiast 4^H ścieżek
+        first = _plan_first_deck(
+            self.means, self.variances, self.counts, self.info_value_weight, self.planning_horizon
+        )
+        return self.deck_ids[int(first)]
+
+    def _select_action_enumerate(self):
+
+        best_first_action = self.deck_ids[0]
+        best_path_value = -float('inf')
+
+        trajectories = itertools.product(range(4), repeat=self.planning_horizon)
+
+        for path in trajectories:
+            sim_means = self.means.copy()
+            sim_vars = self.variances.copy()
+            sim_counts = self.counts.copy()
+            
+            cumulative_utility = 0
+            
+            for deck_idx in path:
+                expected_reward = sim_means[deck_idx]
+                
+                info_gain = np.sqrt(sim_vars[deck_idx])
+                
+                step_value = expected_reward + (self.info_value_weight * info_gain)
+                cumulative_utility += step_value
+                
+                sim_counts[deck_idx] += 1
+                n = max(1, sim_counts[deck_idx])
+                
+                sim_vars[deck_idx] *= (n / (n + 1)) 
+
+            if cumulative_utility > best_path_value:
+                best_path_value = cumulative_utility
+                best_first_action = self.deck_ids[path[0]]
+
+        return best_first_action
+
+    def update_model(self, deck_id, net_result):
+        self._observe((), self.deck_ids.index(deck_id), net_result)
+
+# --- SYMULACJA WSADOWA ---
+
+class BatchTrajectories:
+    """Wynik symulacji wsadowej; komórki poza `n_trials` mają deck = -1 i zera."""
+
+    def __init__(self, actions, gains, losses, n_trials):
+        self.actions = actions
+        self.gains = gains
+        self.losses = losses
+        self.nets = gains + losses
+        self.totals = 2000 + np.cumsum(self.nets, axis=1)
+        self.n_trials = n_trials
+
+class BatchSimulator(_BeliefState):
+    """Agent MPC dla N badanych naraz: stan (N, 4), talie (N, 4, MAX_TRIALS, 2).
+
+    Każdy krok wybiera i wykonuje ruch dla wszystkich aktywnych wierszy jedną operacją
+    tablicową; wiersze z mniejszą liczbą prób są maskowane. Wyniki są identyczne
+    z pętlą `StochasticMPCAgent` + `ReplayedEnvironment` (planer "counts").
+    Parametry agenta mogą być skalarami albo tablicami (N,), np. przy dopasowaniu.
+
+    Tryb stochastyczny (zespół przebiegów): `inverse_temperature` - ruch losowany z
+    softmax(beta * wartość najlepszej ścieżki od talii) zamiast argmax; `belief_noise` -
+    planowanie na średnich zaburzonych o belief_noise * odchylenie przekonań (jak w próbkowaniu
+    Thompsona). Losowanie z `rng`, więc ten sam seed daje te same przebiegi.
+    """
+
+    def __init__(
+        self,
+        decks: np.ndarray,
+        n_trials: np.ndarray,
+        first_actions: np.ndarray,
+        strategy: str = "human",
+        planning_horizon: int = 2,
+        loss_aversion=None,
+        learning_rate=None,
+        info_value_weight=None,
+        inverse_temperature=None,
+        belief_noise: float = 0.0,
+        rng: Optional[np.random.Generator] = None,
+    ):
+        n = len(decks)
+        super().__init__((n,), strategy, loss_aversion, learning_rate, info_value_weight)
+        self.loss_aversion = np.broadcast_to(np.asarray(self.loss_aversion, dtype=float), (n,))
+        if self.learning_rate is not None:
+            self.learning_rate = np.broadcast_to(np.asarray(self.learning_rate, dtype=float), (n,))
+        self.info_value_weight = np.broadcast_to(np.asarray(self.info_value_weight, dtype=float), (n,))
+        self.decks = decks
+        self.n_trials = np.asarray(n_trials, dtype=int)
+        self.first_actions = np.asarray(first_actions, dtype=int)
+        self.planning_horizon = planning_horizon
+        self.deck_counters = np.zeros((n, 4), dtype=int)
+        if inverse_temperature is not None:
+            inverse_temperature = np.broadcast_to(np.asarray(inverse_temperature, dtype=float), (n,))
+        self.inverse_temperature = inverse_temperature
+        self.belief_noise = belief_noise
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def run(self) -> BatchTrajectories:
+        n = len(self.decks)
+        horizon = int(self.n_trials.max(initial=0))
+        actions = np.full((n, horizon), -1, dtype=np.int8)
+        gains = np.zeros((n, horizon), dtype=np.int64)
+        losses = np.zeros((n, horizon), dtype=np.int64)
+
+        for t in range(horizon):
+            rows = np.flatnonzero(self.n_trials > t)
+            # Pierwszy ruch identyczny z ruchem człowieka
+            if t == 0:
+                action = self.first_actions[rows]
+            else:
+                action = self._select(rows)
+            gain, loss = self._step(rows, action)
+            self._observe((rows,), action, gain + loss)
+            actions[rows, t] = action
+            gains[rows, t] = gain
+            losses[rows, t] = loss
+
+        return BatchTrajectories(actions, gains, losses, self.n_trials)
+
+    def _select(self, rows):
+        means = self.means[rows]
+        if self.belief_noise:
+            means = means + self.belief_noise * np.sqrt(self.variances[rows]) * self.rng.standard_normal(means.shape)
+        if self.inverse_temperature is None:
+            return _plan_first_deck(
+                means, self.variances[rows], self.counts[rows], self.info_value_weight[rows], self.planning_horizon,
+            )
+        logits = self.inverse_temperature[rows, None] * _first_deck_values(
+            means, self.variances[rows], self.counts[rows], self.info_value_weight[rows], self.planning_horizon,
+        )
+        probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+        cumulative = np.cumsum(probs, axis=1)
+        draws = self.rng.random((len(rows), 1)) * cumulative[:, -1:]
+        return np.minimum((cumulative < draws).sum(axis=1), 3)
+
+    def _step(self, rows, action):
+        idx = self.deck_counters[rows, action]
+        idx = np.where(idx >= self.decks.shape[2], 0, idx)
+        self.deck_counters[rows, action] += 1
+        card = self.decks[rows, action, idx].astype(np.int64)
+        return card[:, 0], card[:, 1]
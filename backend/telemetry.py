@@ -0,0 +1,323 @@
+import bisect
+import collections
+import contextvars
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# --- TELEMETRIA: czasy etapów, metryki Prometheus, profiler próbkujący ---
+
+class StageTimer:
+    """Sumy czasów etapów jednego żądania (sekundy), np. do nagłówka Server-Timing.
+
+    Zwykły słownik - można go zwrócić z workera puli procesów i dołączyć w procesie głównym.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.samples: Dict[str, int] = {}  # stosy z profilera (format "folded")
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def merge(self, stages: Dict[str, float], samples: Optional[Dict[str, int]] = None):
+        for name, seconds in stages.items():
+            self.add(name, seconds)
+        for stack, count in (samples or {}).items():
+            self.samples[stack] = self.samples.get(stack, 0) + count
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()]
+        if total is not None:
+            entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
+
+_CURRENT_TIMER: contextvars.ContextVar[Optional[StageTimer]] = contextvars.ContextVar("igt_stage_timer", default=None)
+
+def current_timer() -> Optional[StageTimer]:
+    return _CURRENT_TIMER.get()
+
+@contextmanager
+def use_timer(timer: StageTimer):
+    token = _CURRENT_TIMER.set(timer)
+    try:
+        yield timer
+    finally:
+        _CURRENT_TIMER.reset(token)
+
+@contextmanager
+def fan_out(name: str):
+    """Równoległe zadania (np. asyncio.gather) jako jeden etap `name` o czasie rzeczywistym.
+
+    Etapy zadań nakładają się w czasie - ich suma byłaby dłuższa niż całe żądanie, więc
+    zbieramy je w osobnym liczniku i dołączamy tylko próbki profilera.
+    """
+    timer = _CURRENT_TIMER.get()
+    if timer is None:
+        yield
+        return
+    tasks = StageTimer()
+    with timer.stage(name), use_timer(tasks):
+        yield
+    timer.merge({}, tasks.samples)
+
+@contextmanager
+def stage(name: str):
+    """Mierzy etap w bieżącym żądaniu; poza żądaniem (np. rozgrzewanie cache) nic nie robi."""
+    timer = _CURRENT_TIMER.get()
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
+
+# --- METRYKI W FORMACIE TEKSTOWYM PROMETHEUS ---
+
+LabelValues = Tuple[str, ...]
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = collections.defaultdict(float)
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in items]
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, *label_values: str):
+        with self._lock:
+            self._values[label_values] = value
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def dec(self, *label_values: str, amount: float = 1.0):
+        self.inc(*label_values, amount=-amount)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in items]
+
+class CallbackMetric(_Metric):
+    """Wartości czytane w chwili odczytu /metrics, np. liczba sesji albo liczniki cache."""
+
+    def __init__(self, name: str, help: str, kind: str, fn: Callable[[], Iterable[Tuple[LabelValues, float]]],
+                 labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            items = list(self.fn())
+        except Exception:
+            return []
+        return self.header() + [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in items]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = collections.defaultdict(float)
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.setdefault(label_values, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self._sums[label_values] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v), self._sums[k]) for k, v in self._counts.items())
+        lines = self.header()
+        for label_values, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def callback(self, name: str, help: str, kind: str, fn, labels: Sequence[str] = ()) -> CallbackMetric:
+        return self.register(CallbackMetric(name, help, kind, fn, labels))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# --- PROFILER PRÓBKUJĄCY ---
+
+class SamplingProfiler:
+    """Co `interval` sekund zapisuje stos wskazanego wątku (sys._current_frames).
+
+    Działa w wątku pomocniczym, więc nie wymaga zmian w profilowanym kodzie; wynik
+    w formacie "folded" (ramka;ramka;... liczba) - wejście dla flamegraph.pl / speedscope.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005, prefix: str = ""):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.prefix = prefix
+        self.samples: Dict[str, int] = collections.defaultdict(int)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "SamplingProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="igt-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if self.prefix:
+                stack.append(self.prefix)
+            self._record(";".join(reversed(stack)))
+
+    def _record(self, stack: str):
+        self.samples[stack] += 1
+
+class WindowedSampler(SamplingProfiler):
+    """Profiler działający przez cały czas życia procesu; próbki z ostatnich `retention` sekund
+    zapamiętuje z czasem, a `between` zwraca te z okna jednego żądania.
+
+    Jeden wątek dla pętli zdarzeń zamiast profilera na żądanie: nakładające się żądania nie
+    mnożą wątków próbkujących, ale dzielą próbki ze wspólnej części swoich okien.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005, prefix: str = "", retention: float = 300.0):
+        super().__init__(thread_id, interval, prefix)
+        self.retention = retention
+        self._recent: Deque[Tuple[float, str]] = collections.deque()
+        self._lock = threading.Lock()
+
+    def _record(self, stack: str):
+        now = time.perf_counter()
+        with self._lock:
+            self._recent.append((now, stack))
+            while self._recent[0][0] < now - self.retention:
+                self._recent.popleft()
+
+    def between(self, start: float, end: float) -> Dict[str, int]:
+        """Próbki z przedziału [start, end] (czas time.perf_counter) w formacie "folded"."""
+        samples: Dict[str, int] = collections.defaultdict(int)
+        with self._lock:
+            # Okno żądania to zwykle koniec kolejki - przeglądamy od najnowszych próbek
+            for timestamp, stack in reversed(self._recent):
+                if timestamp < start:
+                    break
+                if timestamp <= end:
+                    samples[stack] += 1
+        return dict(samples)
+
+def write_profile(directory: str, name: str, samples: Dict[str, int], header: Dict[str, str]) -> str:
+    """Zapisuje profil (komentarze z metadanymi + linie "folded"); zwraca ścieżkę pliku."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{uuid.uuid4().hex[:6]}.folded")
+    with open(path, "w") as f:
+        for key, value in header.items():
+            f.write(f"# {key}: {value}\n")
+        for stack, count in sorted(samples.items(), key=lambda item: -item[1]):
+            f.write(f"{stack} {count}\n")
+    return path
@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+import uuid
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ingest import TrialMatrices, _tail_digest
+
+# --- DZIENNIK PRÓB GRY NA ŻYWO (tylko dopisywanie) ---
+#
+# Plik to ciąg rekordów RECORD po 32 bajty (bez nagłówka): sesja (UUID), czas, numer próby,
+# talia 1..4 (A..D), flagi, wygrana, strata. Ruchy trafiają do bufora w pamięci, a zadanie
+# w tle zapisuje je paczkami jednym write() na pliku otwartym z O_APPEND, więc kilka workerów
+# może dopisywać do tego samego pliku. Przy awarii giną co najwyżej ruchy z ostatniego bufora.
+# Ukończone gry (rekord z flagą FINISHED) dołączamy do zbioru danych jako badanych.
+# Paczka z ukończoną grą dopisuje też do pliku `finished_marker(path)` offset końca dziennika -
+# tylko ten plik obserwujemy jako źródło danych, więc ruchy niedokończonych gier nie
+# unieważniają załadowanego zbioru.
+
+RECORD = np.dtype([
+    ("session", "S16"), ("time", "<f8"), ("trial", "<u2"), ("deck", "u1"), ("flags", "u1"),
+    ("gain", "<i2"), ("loss", "<i2"),
+])
+FINISHED = 1  # ostatni ruch gry
+MARKER = np.dtype("<u8")
+
+def finished_marker(path: str) -> str:
+    return path + ".finished"
+
+class TrialLog:
+    def __init__(self, path: str, batch_size: int = 4096):
+        self.path = path
+        self.batch_size = batch_size
+        self.written = 0
+        self._buffer: List[tuple] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def append(self, session_id: str, trial: int, deck: int, gain: int, loss: int, finished: bool = False) -> bool:
+        """Dodaje ruch do bufora (bez I/O); True, gdy bufor osiągnął `batch_size` i warto go zapisać."""
+        record = (uuid.UUID(session_id).bytes, time.time(), trial, deck, FINISHED if finished else 0, gain, loss)
+        with self._lock:
+            self._buffer.append(record)
+            return len(self._buffer) >= self.batch_size
+
+    def flush(self) -> int:
+        """Zapisuje bufor jedną paczką; zwraca liczbę zapisanych rekordów."""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+        records = np.array(batch, dtype=RECORD)
+        with self._write_lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            end = _append(self.path, records.tobytes())
+            if (records["flags"] & FINISHED).any():
+                _append(finished_marker(self.path), np.array([end], dtype=MARKER).tobytes())
+            self.written += len(batch)
+        return len(batch)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+def _append(path: str, data: bytes) -> int:
+    """Dopisuje `data` (O_APPEND); zwraca offset końca dopisanych danych."""
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        return os.lseek(fd, 0, os.SEEK_CUR)
+    finally:
+        os.close(fd)
+
+def read_records(path: str, start: int = 0) -> np.ndarray:
+    """Pełne rekordy od bajtu `start` (niedopisana końcówka jest pomijana)."""
+    count = max(0, os.path.getsize(path) - start) // RECORD.itemsize
+    return np.fromfile(path, dtype=RECORD, count=count, offset=start)
+
+def ingest_trial_log(
+    path: str, label: str, matrices: TrialMatrices, state: Optional[dict] = None, abandon_after: float = 3600,
+) -> Optional[dict]:
+    """Dopisuje do `matrices` gry ukończone od poprzedniego wywołania; zwraca nowy stan.
+
+    Czytamy od pierwszego rekordu najstarszej niedokończonej gry (`pending`), więc gra zawsze
+    trafia do zbioru w całości. Gry bez ruchu od `abandon_after` sekund (licząc od najnowszego
+    rekordu) uznajemy za porzucone i przestajemy na nie czekać. None = plik skrócono albo
+    nadpisano - trzeba przebudować cały zbiór.
+    """
+    state = dict(state or {"pending": 0, "end": 0, "tail": "", "subjects": {}})
+    subjects = dict(state["subjects"])
+    if not os.path.exists(path):
+        return None if subjects else state
+    if os.path.getsize(path) < state["end"] or (state["end"] and _tail_digest(path, state["end"]) != state["tail"]):
+        return None
+
+    records = read_records(path, state["pending"])
+    end = state["pending"] + len(records) * RECORD.itemsize
+    if not len(records):
+        return state
+
+    codes, sessions = pd.factorize(records["session"])
+    position = np.arange(len(records))
+    finished_at = np.full(len(sessions), len(records))
+    np.minimum.at(finished_at, codes[records["flags"] & FINISHED > 0], position[records["flags"] & FINISHED > 0])
+    first = np.full(len(sessions), len(records))
+    np.minimum.at(first, codes, position)
+    last_time = np.zeros(len(sessions))
+    np.maximum.at(last_time, codes, records["time"])
+
+    keys = [uuid.UUID(bytes=bytes(session).ljust(16, b"\0")) for session in sessions]
+    finished = finished_at < len(records)
+    new = [i for i in np.argsort(finished_at, kind="stable") if finished[i] and keys[i].hex not in subjects]
+    rows = np.full(len(sessions), -1, dtype=np.int64)
+    for i in new:
+        rows[i] = subjects[keys[i].hex] = matrices.add_subject(f"{label} {keys[i]}")
+    take = (rows[codes] >= 0) & (records["trial"] >= 1)
+    matrices.scatter(
+        rows[codes[take]], records["trial"][take].astype(np.int64) - 1,
+        records["deck"][take], records["gain"][take], records["loss"][take],
+    )
+    if new:
+        print(f" -> {path}: {len(new)} ukończonych gier ({label}).")
+
+    alive = ~finished & (last_time >= records["time"].max() - abandon_after)
+    pending = state["pending"] + int(first[alive].min()) * RECORD.itemsize if alive.any() else end
+    return {"pending": pending, "end": end, "tail": _tail_digest(path, end), "subjects": subjects}
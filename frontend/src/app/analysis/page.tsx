@@ -77,6 +77,24 @@ type ComparisonResponse = {
   metrics: SimilarityMetrics;
 };
 
+// Układ kolumnowy (?format=columns) - jedna tablica na pole próby
+type TrialColumns = {
+  trial: number[];
+  deck: TrialData["deck"][];
+  win: number[];
+  loss: number[];
+  net: number[];
+  total_score: number[];
+};
+
+type ComparisonColumns = {
+  subject_index: number;
+  source_study: string;
+  subject: TrialColumns;
+  mpc: TrialColumns;
+  metrics: SimilarityMetrics;
+};
+
 type SubjectListElement = {
   index: number;
   source_study: string;
@@ -93,6 +111,8 @@ const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
 const getGroupName = (source: string) => {
   if (source.startsWith("Study")) return `Standard IGT (${source})`;
   if (source.includes("Cannabis")) return "Cannabis Users (Marihuana)";
+  if (source.startsWith("Healthy Control")) return "Healthy Controls (HC)";
+  if (source.startsWith("Live Game")) return "Live Games";
   if (source === "csv_import") return "Import CSV";
   return "Inne";
 };
@@ -136,26 +156,35 @@ export default function AnalysisPage() {
       setIsLoadingDetails(true);
       try {
         const res = await fetch(
-          `${API_URL}/analysis/compare/${selectedSubjectId}`
+          `${API_URL}/analysis/compare/${selectedSubjectId}?format=columns`
         );
         if (res.ok) {
-          const data: ComparisonResponse = await res.json();
-
-          // Mapowanie danych z dodaniem x i y dla wygody Recharts
-          const mapTrial = (t: TrialData, src: "human" | "ai") => ({
-            ...t,
-            x: t.trial,
-            y: t.deck === "A" ? 4 : t.deck === "B" ? 3 : t.deck === "C" ? 2 : 1,
-            deck_label: t.deck,
-            source: src,
+          const data: ComparisonColumns = await res.json();
+
+          // Wiersze prób z kolumn, z dodaniem x i y dla wygody Recharts
+          const toTrials = (c: TrialColumns, src: "human" | "ai"): TrialData[] =>
+            c.trial.map((trial, i) => ({
+              trial,
+              deck: c.deck[i],
+              win: c.win[i],
+              loss: c.loss[i],
+              net: c.net[i],
+              total_score: c.total_score[i],
+              x: trial,
+              y: c.deck[i] === "A" ? 4 : c.deck[i] === "B" ? 3 : c.deck[i] === "C" ? 2 : 1,
+              deck_label: c.deck[i],
+              source: src,
+            }));
+
+          setComparisonData({
+            subject_data: {
+              subject_index: data.subject_index,
+              source_study: data.source_study,
+              history: toTrials(data.subject, "human"),
+            },
+            mpc_data: toTrials(data.mpc, "ai"),
+            metrics: data.metrics,
           });
-
-          data.subject_data.history = data.subject_data.history.map((t) =>
-            mapTrial(t, "human")
-          );
-          data.mpc_data = data.mpc_data.map((t) => mapTrial(t, "ai"));
-
-          setComparisonData(data);
         }
       } catch (e) {
         console.error(e);